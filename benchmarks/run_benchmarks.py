@@ -0,0 +1,207 @@
+"""
+Benchmarks for the page analysis and the whole workbook run against a local stub server.
+
+Run from the repository root:
+
+    python -m benchmarks.run_benchmarks --rows 1000,10000 --save-baseline baseline.json
+    python -m benchmarks.run_benchmarks --rows 1000,10000 --baseline baseline.json
+
+Every case runs in its own process, so its peak RSS is its own; the stub server
+runs in another process so it does not compete for the GIL.
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+
+# Metrics where a higher value is better; for the others lower is better
+HIGHER_IS_BETTER = ('rows_per_sec', 'pages_per_sec')
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _run_case(target, args, results):
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        result = target(*args)
+    result['peak_rss_mb'] = peak_rss_mb()
+    results.put(result)
+
+
+def run_isolated(target, *args):
+    """
+    Run target(*args) in a fresh process and return its result dict with peak RSS added.
+    """
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_run_case, args=(target, args, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def bench_parse_fast(page_count):
+    from benchmarks.synthetic import make_app_ids, make_page
+    from page_extractor import analyze_page
+
+    pages = [make_page(app_id) for app_id in make_app_ids(page_count)]
+    started = time.perf_counter()
+    for html in pages:
+        analyze_page(html)
+    elapsed = time.perf_counter() - started
+    return {'us_per_page': elapsed / page_count * 1e6, 'pages_per_sec': page_count / elapsed}
+
+
+def bench_parse_bs4(page_count):
+    from bs4 import BeautifulSoup
+
+    import helpers
+    from benchmarks.synthetic import make_app_ids, make_page
+
+    pages = [make_page(app_id) for app_id in make_app_ids(page_count)]
+    started = time.perf_counter()
+    for html in pages:
+        helpers.analyzeFullApplication(BeautifulSoup(html, "html.parser"))
+    elapsed = time.perf_counter() - started
+    return {'us_per_page': elapsed / page_count * 1e6, 'pages_per_sec': page_count / elapsed}
+
+
+def bench_workbook(workbook_path, rows, base_url, options):
+    import excel_processor_dynamic
+
+    output_path = workbook_path.replace('.xlsx', '_processed.xlsx')
+    started = time.perf_counter()
+    excel_processor_dynamic.process_excel_with_dynamic_fetch(
+        workbook_path, output_path, base_url=base_url, cache_path=None, archive_path=None, store_path=None,
+        resume=False, checkpoint_interval=0, **options)
+    elapsed = time.perf_counter() - started
+    return {'seconds': elapsed, 'rows_per_sec': rows / elapsed}
+
+
+def _serve_stub(latency, jitter, failure_rate, ready):
+    from benchmarks.stub_server import StubServer
+
+    server = StubServer(latency, jitter, failure_rate).start()
+    ready.put(server.base_url)
+    while True:
+        time.sleep(3600)
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print each metric against the baseline and return the names of the regressions.
+    """
+    regressions = []
+    for case, metrics in results.items():
+        for metric, value in metrics.items():
+            base = baseline.get(case, {}).get(metric)
+            if value is None or not base:
+                continue
+            change = (value - base) / base
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            mark = ''
+            if worse > tolerance:
+                mark = '  REGRESSION'
+                regressions.append(f'{case}.{metric}')
+            print(f"  {case}.{metric}: {base:.1f} -> {value:.1f} ({change * 100:+.1f}%){mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Page analysis and workbook benchmarks against a stub server")
+    parser.add_argument('--rows', default='1000,10000', help="workbook sizes, comma separated (e.g. 1000,500000)")
+    parser.add_argument('--pages', type=int, default=500, help="pages for the parse benchmarks")
+    parser.add_argument('--latency', type=float, default=0.01, help="stub server latency, seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="extra random stub latency, seconds")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="share of stub requests answered with 503")
+    parser.add_argument('--mirrors', type=int, default=1,
+                        help="stub servers to balance over (the failure rate applies to the last one only)")
+    parser.add_argument('--balance', default='least_outstanding', help="balancing strategy with --mirrors")
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--rps', type=float, default=5000)
+    parser.add_argument('--parallel-analysis', action='store_true')
+    parser.add_argument('--streaming', action='store_true', help="also run the streaming workbook mode")
+    parser.add_argument('--skip-bs4', action='store_true', help="skip the BeautifulSoup parse benchmark")
+    parser.add_argument('--baseline', help="JSON results to compare against")
+    parser.add_argument('--save-baseline', help="write the results to this JSON file")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="allowed slowdown before a regression")
+    args = parser.parse_args()
+
+    results = {}
+
+    print(f"Parse: {args.pages} synthetic pages")
+    results['parse_fast'] = run_isolated(bench_parse_fast, args.pages)
+    print(f"  page_extractor.analyze_page: {results['parse_fast']['us_per_page']:.0f} us/page")
+    if not args.skip_bs4:
+        results['parse_bs4'] = run_isolated(bench_parse_bs4, args.pages)
+        print(f"  helpers.analyzeFullApplication: {results['parse_bs4']['us_per_page']:.0f} us/page")
+
+    context = multiprocessing.get_context('spawn')
+    ready = context.Queue()
+    stubs = []
+    base_urls = []
+    for number in range(max(args.mirrors, 1)):
+        failure_rate = args.failure_rate if number == args.mirrors - 1 else 0.0
+        stub = context.Process(target=_serve_stub, args=(args.latency, args.jitter, failure_rate, ready),
+                               daemon=True)
+        stub.start()
+        stubs.append(stub)
+        base_urls.append(ready.get())
+    base_url = base_urls[0]
+
+    from benchmarks.synthetic import make_workbook
+
+    options = dict(max_workers=args.workers, requests_per_second=args.rps, adaptive_rate=False,
+                   parallel_analysis=args.parallel_analysis)
+    if len(base_urls) > 1:
+        options.update(endpoints=base_urls, balance=args.balance)
+    modes = [('workbook', {})]
+    if args.streaming:
+        modes.append(('streaming', {'streaming': True}))
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for rows in [int(value) for value in args.rows.split(',') if value.strip()]:
+                workbook_path = os.path.join(directory, f'bench_{rows}.xlsx')
+                make_workbook(workbook_path, rows)
+                for mode, mode_options in modes:
+                    case = f'{mode}_{rows}'
+                    results[case] = run_isolated(bench_workbook, workbook_path, rows, base_url,
+                                                 dict(options, **mode_options))
+                    result = results[case]
+                    print(f"{case}: {result['rows_per_sec']:.0f} rows/s, {result['seconds']:.1f} s, "
+                          f"peak RSS {result['peak_rss_mb'] or 0:.0f} MB")
+    finally:
+        for stub in stubs:
+            stub.terminate()
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+        print(f"Results saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+        print(f"Against {args.baseline}:")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"Regressions beyond {args.tolerance * 100:.0f}%: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
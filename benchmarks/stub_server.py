@@ -0,0 +1,118 @@
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.synthetic import make_page
+
+
+PAGE_PATH = '/csp/iiscon/isc.util.About.cls'
+
+
+class StubServer:
+    """
+    Local stand-in for the About.cls server, serving synthetic pages by appId.
+    Every request waits latency seconds (plus up to jitter more) and fails with a
+    503 with probability failure_rate. Use as a context manager; base_url is the
+    value for BASE_URL / FetchEngine(base_url=...), several servers stand in for
+    mirrors in FetchEngine(endpoints=[...]).
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, host='127.0.0.1', port=0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self.failures = 0
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._pages = {}
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{PAGE_PATH}?Action=4&appId="
+
+    def page(self, app_id):
+        body = self._pages.get(app_id)
+        if body is None:
+            body = make_page(app_id).encode('utf-8')
+            with self._lock:
+                self._pages[app_id] = body
+        return body
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                app_id = parse_qs(url.query).get('appId', [''])[0]
+                with stub._lock:
+                    stub.requests += 1
+                    delay = stub.latency + stub._rng.random() * stub.jitter
+                    failed = stub._rng.random() < stub.failure_rate
+                    if failed:
+                        stub.failures += 1
+
+                if delay:
+                    time.sleep(delay)
+                if url.path != PAGE_PATH or not app_id:
+                    self._send(404, b'')
+                elif failed:
+                    self._send(503, b'')
+                else:
+                    self._send(200, stub.page(app_id))
+
+            def _send(self, code, body):
+                self.send_response(code)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Stub About.cls server with synthetic pages")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    with StubServer(args.latency, args.jitter, args.failure_rate, port=args.port) as server:
+        print(f"Stub server: {server.base_url}<appId>")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
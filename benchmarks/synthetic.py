@@ -0,0 +1,125 @@
+import random
+from datetime import datetime, timedelta
+
+from openpyxl import Workbook
+
+
+# Status histories seen in practice, from a single ACCEPTED to long served applications
+HISTORY_SHAPES = [
+    ['ACCEPTED'],
+    ['ACCEPTED', 'ACCEPTED'],
+    ['ACCEPTED', 'ACCEPTED', 'LAUNCHED'],
+    ['ACCEPTED', 'LAUNCHED'],
+    ['ACCEPTED', 'LAUNCHED', 'ACCEPTED'],
+    ['ACCEPTED', 'LAUNCHED', 'STARTED'],
+    ['ACCEPTED', 'LAUNCHED', 'STARTED', 'FINISHED'],
+    ['ACCEPTED', 'LAUNCHED', 'STARTED', 'READY', 'HANDED'],
+    ['ACCEPTED', 'CANCELED'],
+    ['ACCEPTED', 'LAUNCHED', 'RETURNED', 'LAUNCHED', 'STARTED', 'FINISHED'],
+]
+
+QUEUE_ERRORS = [
+    "Ошибка при отправке уведомления: Connection refused",
+    "Таймаут ожидания ответа от ГБД ФЛ",
+    "ERROR #5002: ObjectScript error: <UNDEFINED>zSend+12^isc.kzcon.ens.MsgQueue.1",
+    "Сервис ЕСЭДО недоступен",
+    "Неверная подпись ЭЦП",
+]
+
+FILLER_ROW = '<tr><td>{name}</td><td>{value}</td><td>{note}</td></tr>'
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def _timestamp(moment):
+    return moment.strftime(TIME_FORMAT)[:-3]
+
+
+def make_page(app_id, seed=None, max_history=30, error_rate=0.3, filler_rows=60):
+    """
+    Build a synthetic isc.util.About.cls page for app_id, deterministic for a seed
+    (default: app_id). It has the layout the extractors rely on: the
+    "Основные свойства заявки" table with a Deadline, the status history as the
+    fifth table, and the MsgQueue table, padded with filler tables to a realistic size.
+    """
+    rng = random.Random(seed if seed is not None else app_id)
+
+    statuses = list(rng.choice(HISTORY_SHAPES))
+    # Long histories: repeated intermediate statuses before the final ones
+    while len(statuses) < max_history and rng.random() < 0.15:
+        statuses.insert(rng.randint(1, len(statuses)), rng.choice(['LAUNCHED', 'ACCEPTED', 'SENT', 'RECEIVED']))
+
+    started = datetime(2025, 4, 1) + timedelta(minutes=rng.randint(0, 30 * 24 * 60))
+    deadline = started + timedelta(days=rng.randint(1, 15))
+    moment = started
+    history_rows = []
+    for number, status in enumerate(statuses):
+        moment += timedelta(minutes=rng.randint(1, 3 * 24 * 60), milliseconds=rng.randint(0, 999))
+        history_rows.append(
+            f'<tr><td>{number + 1}</td><td>{app_id}</td><td>{_timestamp(moment)}</td><td>system</td>'
+            f'<td>{rng.randint(100, 999)}</td><td>{statuses[number - 1] if number else ""}</td>'
+            f'<td> {status} </td><td>комментарий &laquo;{number}&raquo;</td></tr>'
+        )
+
+    queue_rows = []
+    if rng.random() < error_rate:
+        for _ in range(rng.randint(1, 3)):
+            queue_rows.append(f'<tr><td>{rng.randint(1, 99999)}</td><td>{rng.choice(["1", "2", "3", "4"])}</td>'
+                              f'<td>{rng.choice(QUEUE_ERRORS)}</td></tr>')
+    else:
+        queue_rows.append('<tr><td>1</td><td>1</td><td></td></tr>')
+
+    def filler_table(title):
+        rows = ''.join(FILLER_ROW.format(name=f'Свойство{i}', value=rng.randint(0, 10 ** 9),
+                                         note='<i>значение</i> &amp; описание') for i in range(filler_rows))
+        return f'<b>{title}</b><table border="1">{rows}</table>\n'
+
+    return (
+        '<html><head><title>isc.util.About</title>'
+        '<style>td { font-size: 10pt; } table { border-collapse: collapse; }</style>'
+        '<script>function toggle(id) { var e = document.getElementById(id); }</script></head><body>\n'
+        '<table><tr><td><img src="logo.png"></td><td>Информация о заявке</td></tr></table>\n'
+        + filler_table('Служебные данные')
+        + '<b>Основные свойства заявки</b><table border="1">'
+        f'<tr><th>appId</th><th>Услуга</th><th>Deadline</th><th>Регион</th></tr>'
+        f'<tr><td>{app_id}</td><td>Услуга {rng.randint(1, 500)}</td><td>{_timestamp(deadline)}</td>'
+        f'<td>Павлодарская область</td></tr></table>\n'
+        + filler_table('Участники')
+        + '<b>История статусов</b><table border="1"><tr><th>#</th><th>appId</th><th>createDate</th>'
+        '<th>user</th><th>code</th><th>oldStatus</th><th>newStatus</th><th>comment</th></tr>'
+        + ''.join(history_rows) + '</table>\n'
+        + filler_table('Документы')
+        + '<br><b>Очередь уведомлений isc.kzcon.ens.MsgQueue</b><table border="1">'
+        '<tr><th>ID</th><th>QueueType</th><th>LastError</th></tr>' + ''.join(queue_rows) + '</table>\n'
+        '<!-- generated page -->\n</body></html>'
+    )
+
+
+def make_app_ids(count, start=2270000000):
+    return [str(start + i).zfill(12) for i in range(count)]
+
+
+def make_workbook(path, rows, duplicate_ratio=0.1, empty_ratio=0.01, seed=0):
+    """
+    Write a workbook shaped like the regional exports: a header row with the
+    identifier column and rows of 12-digit application IDs (some repeated, some empty).
+    Returns the number of unique application IDs in it.
+    """
+    rng = random.Random(seed)
+    unique = max(1, int(rows * (1 - duplicate_ratio)))
+    app_ids = make_app_ids(unique)
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Лист1')
+    header = ['№', 'Регион', 'Идентификатор заявки', 'Наименование услуги', 'Комментарий АО НИТ']
+    ws.append(header)
+    for number in range(rows):
+        if rng.random() < empty_ratio:
+            app_id = None
+        elif number < unique:
+            app_id = app_ids[number]
+        else:
+            app_id = rng.choice(app_ids)
+        ws.append([number + 1, 'Павлодарская область', app_id, f'Услуга {number % 500}', None])
+    wb.save(path)
+    return unique
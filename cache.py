@@ -0,0 +1,192 @@
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+
+# Seconds a connection waits for another process's write lock before giving up
+BUSY_TIMEOUT = 30.0
+
+
+class ResponseCache:
+    """
+    On-disk SQLite cache of fetched About.cls pages and their conclusions, keyed by appId.
+
+    Entries expire after ttl seconds, except terminal applications (served, finished,
+    canceled), whose page can no longer change and is kept forever.
+    Every conclusion is stored with the version of the rules that produced it
+    (page_extractor.analysis_version()); one of another version is not served,
+    but the page of a terminal entry is kept to be analyzed again (see lookup()).
+    When the stored pages exceed max_bytes, the least recently used pages are evicted:
+    non-terminal entries are deleted, terminal ones only lose their page and keep
+    their conclusion. Eviction runs every evict_every writes and on close().
+
+    Several processes may share the file: every write is committed at once, so the
+    write lock is only held for one statement, and a busy file is waited for up to
+    BUSY_TIMEOUT seconds. Cache hits do not write; their access times are collected
+    and written in one statement every touch_every hits.
+    """
+
+    def __init__(self, path, ttl=3600, max_bytes=512 * 1024 * 1024, touch_every=200, evict_every=1000, version=''):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.touch_every = touch_every
+        self.evict_every = evict_every
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+        self._lock = threading.Lock()
+        self._touched = {}  # app_id -> access time not written yet
+        self._writes_since_evict = 0
+        self._conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " app_id TEXT PRIMARY KEY,"
+            " fetched_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL,"
+            " html BLOB,"
+            " size INTEGER NOT NULL DEFAULT 0,"
+            " conclusion TEXT,"
+            " terminal INTEGER NOT NULL DEFAULT 0,"
+            " version TEXT NOT NULL DEFAULT '')"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(pages)")]
+        if 'version' not in columns:
+            # Cache files of earlier runs: their conclusions count as another version
+            try:
+                self._conn.execute("ALTER TABLE pages ADD COLUMN version TEXT NOT NULL DEFAULT ''")
+            except sqlite3.OperationalError as e:
+                # Another process sharing the file added it first
+                if 'duplicate column' not in str(e):
+                    raise
+        self._conn.execute("CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed_at)")
+        self._conn.commit()
+
+    def lookup(self, app_id):
+        """
+        Return (page, conclusion) for app_id, like a pipeline fetch stage: (None,
+        conclusion) for a valid entry of the current version, (page, None) for a
+        terminal page whose conclusion is of another version and has to be analyzed
+        again, and (None, None) otherwise (missing or expired, a non-terminal entry
+        of another version, or a terminal one that lost its page to eviction).
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fetched_at, conclusion, terminal, version FROM pages WHERE app_id = ?", (app_id,)
+            ).fetchone()
+
+            if row is None or (not row[2] and now - row[0] > self.ttl):
+                self.misses += 1
+                return None, None
+
+            if row[1] is not None and row[3] == self.version:
+                self._touched[app_id] = now
+                if len(self._touched) >= self.touch_every:
+                    self._write_touches()
+                self.hits += 1
+                return None, row[1]
+
+            blob = None
+            if row[2]:
+                blob = self._conn.execute("SELECT html FROM pages WHERE app_id = ?", (app_id,)).fetchone()[0]
+            if blob is None:
+                self.misses += 1
+                return None, None
+            self.stale += 1
+        return zlib.decompress(blob).decode('utf-8'), None
+
+    def get_conclusion(self, app_id):
+        """
+        Return the cached conclusion for app_id, or None if it is missing, expired or
+        of another version.
+        """
+        return self.lookup(app_id)[1]
+
+    def get_html(self, app_id):
+        """
+        Return the cached page for app_id regardless of age, or None.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT html FROM pages WHERE app_id = ?", (app_id,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return zlib.decompress(row[0]).decode('utf-8')
+
+    def put(self, app_id, html, conclusion, terminal=False):
+        now = time.time()
+        blob = zlib.compress(html.encode('utf-8')) if html is not None else None
+        size = len(blob) if blob is not None else 0
+
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO pages"
+                    " (app_id, fetched_at, accessed_at, html, size, conclusion, terminal, version)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (app_id, now, now, blob, size, conclusion, 1 if terminal else 0, self.version),
+                )
+            self._touched.pop(app_id, None)
+            self._writes_since_evict += 1
+            due = self.evict_every and self._writes_since_evict >= self.evict_every
+        if due:
+            self.evict()
+
+    def is_terminal(self, app_id):
+        with self._lock:
+            row = self._conn.execute("SELECT terminal FROM pages WHERE app_id = ?", (app_id,)).fetchone()
+        return bool(row and row[0])
+
+    def evict(self):
+        """
+        Drop expired entries and shrink the stored pages below max_bytes.
+        """
+        now = time.time()
+        with self._lock:
+            self._write_touches()
+            self._writes_since_evict = 0
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+            evicted = []
+            if total > self.max_bytes:
+                # Pick the victims first, then write them in one short transaction
+                rows = self._conn.execute(
+                    "SELECT app_id, size, terminal FROM pages WHERE size > 0 ORDER BY accessed_at"
+                ).fetchall()
+                for app_id, size, terminal in rows:
+                    if total <= self.max_bytes:
+                        break
+                    evicted.append((app_id, terminal))
+                    total -= size
+
+            with self._conn:
+                self._conn.execute("DELETE FROM pages WHERE terminal = 0 AND fetched_at < ?", (now - self.ttl,))
+                self._conn.executemany("UPDATE pages SET html = NULL, size = 0 WHERE app_id = ?",
+                                       [(app_id,) for app_id, terminal in evicted if terminal])
+                self._conn.executemany("DELETE FROM pages WHERE app_id = ?",
+                                       [(app_id,) for app_id, terminal in evicted if not terminal])
+
+    def close(self):
+        try:
+            self.evict()
+        except sqlite3.Error as e:
+            print(f"Предупреждение: не удалось очистить кэш ({e})")
+        with self._lock:
+            self._conn.close()
+
+    def _write_touches(self):
+        # Callers hold self._lock
+        if self._touched:
+            with self._conn:
+                self._conn.executemany("UPDATE pages SET accessed_at = ? WHERE app_id = ?",
+                                       [(accessed_at, app_id) for app_id, accessed_at in self._touched.items()])
+            self._touched = {}
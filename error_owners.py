@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+from collections import deque
+
+import helpers
+
+
+UNKNOWN_OWNER = "Неизвестно"
+
+# Raise when the automaton tables saved by load_error_owner_matcher change shape or meaning
+AUTOMATON_FORMAT = 1
+
+
+class ErrorOwnerMatcher:
+    """
+    Aho–Corasick automaton over every error text of the owner mapping, so one scan
+    of a LastError message finds all mapping entries it contains.
+
+    By default the entry that comes first in the mapping wins, like the linear scan
+    in helpers.find_error_owner; with longest=True the longest matching text wins.
+    """
+
+    def __init__(self, mapping):
+        self.patterns = list(mapping.keys())
+        self.owners = list(mapping.values())
+
+        goto = [{}]
+        outputs = [[]]
+        for index, pattern in enumerate(self.patterns):
+            node = 0
+            for char in pattern:
+                next_node = goto[node].get(char)
+                if next_node is None:
+                    next_node = len(goto)
+                    goto[node][char] = next_node
+                    goto.append({})
+                    outputs.append([])
+                node = next_node
+            outputs[node].append(index)
+
+        # Failure links in breadth-first order; each node also inherits the best
+        # match of its failure node, so a search only looks at the current node
+        fail = [0] * len(goto)
+        first = [min(indexes) if indexes else None for indexes in outputs]
+        longest = [self._longest(indexes) for indexes in outputs]
+
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fallback = goto[state].get(char, 0)
+                fail[child] = fallback if fallback != child else 0
+                queue.append(child)
+
+            inherited = fail[node]
+            first[node] = self._earlier(first[node], first[inherited])
+            longest[node] = self._longer(longest[node], longest[inherited])
+
+        self._goto = goto
+        self._fail = fail
+        self._first = first
+        self._longest_match = longest
+
+    def to_tables(self):
+        """
+        The compiled automaton as plain lists, for from_tables.
+        """
+        return {
+            'patterns': self.patterns,
+            'owners': self.owners,
+            'goto': self._goto,
+            'fail': self._fail,
+            'first': self._first,
+            'longest': self._longest_match,
+        }
+
+    @classmethod
+    def from_tables(cls, tables):
+        """
+        Rebuild a matcher from to_tables() output, e.g. read back from JSON; raises
+        ValueError if the tables do not fit together.
+        """
+        matcher = cls.__new__(cls)
+        matcher.patterns = [str(pattern) for pattern in tables['patterns']]
+        matcher.owners = [str(owner) for owner in tables['owners']]
+        matcher._goto = [{str(char): int(node) for char, node in edges.items()} for edges in tables['goto']]
+        matcher._fail = [int(node) for node in tables['fail']]
+        matcher._first = [None if index is None else int(index) for index in tables['first']]
+        matcher._longest_match = [None if index is None else int(index) for index in tables['longest']]
+
+        nodes = len(matcher._goto)
+        if not nodes or len(matcher.patterns) != len(matcher.owners) or \
+                not len(matcher._fail) == len(matcher._first) == len(matcher._longest_match) == nodes:
+            raise ValueError("inconsistent automaton tables")
+        if any(not 0 <= node < nodes for edges in matcher._goto for node in edges.values()) or \
+                any(not 0 <= node < nodes for node in matcher._fail) or \
+                any(index is not None and not 0 <= index < len(matcher.patterns)
+                    for index in matcher._first + matcher._longest_match):
+            raise ValueError("automaton tables point outside themselves")
+        return matcher
+
+    @property
+    def version(self):
+        """
+        Digest of the mapping, which changes whenever an error text or owner does.
+        """
+        entries = repr(list(zip(self.patterns, self.owners)))
+        return hashlib.sha1(entries.encode('utf-8')).hexdigest()[:12]
+
+    def _longest(self, indexes):
+        best = None
+        for index in indexes:
+            best = self._longer(best, index)
+        return best
+
+    def _earlier(self, a, b):
+        if a is None:
+            return b
+        if b is None:
+            return a
+        return min(a, b)
+
+    def _longer(self, a, b):
+        if a is None:
+            return b
+        if b is None:
+            return a
+        la, lb = len(self.patterns[a]), len(self.patterns[b])
+        if la != lb:
+            return a if la > lb else b
+        return min(a, b)
+
+    def match(self, message, longest=False):
+        """
+        Return the index of the winning mapping entry contained in message, or None.
+        """
+        goto = self._goto
+        fail = self._fail
+        best_at = self._longest_match if longest else self._first
+        pick = self._longer if longest else self._earlier
+
+        node = 0
+        best = best_at[0]
+        for char in message:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            candidate = best_at[node]
+            if candidate is not None and candidate != best:
+                best = pick(best, candidate)
+        return best
+
+    def find_owner(self, message, longest=False):
+        index = self.match(message, longest)
+        return self.owners[index] if index is not None else UNKNOWN_OWNER
+
+
+def load_error_owner_matcher(mapping_path):
+    """
+    Build the matcher for a "error text - owner" mapping file, reusing the compiled
+    automaton saved next to it by an earlier run while the file is unchanged.
+    The automaton is saved as plain JSON tables under AUTOMATON_FORMAT and the
+    digest of the mapping; any other file in its place is ignored and replaced.
+    """
+    with open(mapping_path, 'rb') as file:
+        digest = hashlib.sha1(file.read()).hexdigest()
+
+    cache_path = mapping_path + '.automaton'
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as file:
+            cached = json.load(file)
+        if cached.get('format') == AUTOMATON_FORMAT and cached.get('digest') == digest:
+            return ErrorOwnerMatcher.from_tables(cached['tables'])
+    except Exception:
+        pass
+
+    matcher = ErrorOwnerMatcher(helpers.load_error_mapping(mapping_path))
+    try:
+        temp_path = cache_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump({'format': AUTOMATON_FORMAT, 'digest': digest, 'tables': matcher.to_tables()}, file,
+                      ensure_ascii=False)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        print(f"Не удалось сохранить автомат ответственных: {e}")
+    return matcher
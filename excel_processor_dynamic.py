@@ -3,81 +3,110 @@ import requests
 from bs4 import BeautifulSoup
 import time
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 import helpers
-from openpyxl import load_workbook
+from fetcher import (create_session, RateLimiter, AdaptiveRateLimiter, Fetcher, RetryPolicy, CircuitBreaker,
+                     EndpointPool, BudgetExpired)
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import PatternFill, Font, Border, Side, Alignment
+import argparse
 import copy
+import glob
+import itertools
+import multiprocessing
+import os
+import secrets
+import socket
+import sys
+from cache import ResponseCache
+from page_archive import PageArchive
+from result_store import ResultStore
+from journal import ProgressJournal
+import page_extractor
+from page_extractor import analyze_page, analyze_page_timed
+from metrics import RunMetrics, conclusion_category
+from error_owners import load_error_owner_matcher
+from pipeline import run_pipeline, BudgetEvent
+from sharding import ShardCoordinator, serve_coordinator, CoordinatorClient, Heartbeat
+import workbook_io
+from workbook_io import CommentWorkbook, COMMENT_HEADER, find_columns, save_workbook_atomic
+from profiling import Profiler, PROFILE_ENV, profile_dir_from_env
 
 
-def fetch_html_with_timeout(url, timeout=5):
+# Base URL template
+BASE_URL = "http://192.168.130.100/csp/iiscon/isc.util.About.cls?Action=4&appId="
+
+# Number of concurrent fetch workers and the global request rate they share
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_REQUESTS_PER_SECOND = 10
+
+# Capacity of the queues between the fetch, analysis and writer stages
+DEFAULT_QUEUE_SIZE = 64
+
+# Rows held in memory at a time in streaming mode
+DEFAULT_CHUNK_SIZE = 5000
+
+# Persistent cache of fetched pages and conclusions shared between runs
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".nitec_monitoring", "cache.sqlite3")
+DEFAULT_CACHE_TTL = 3600
+DEFAULT_ARCHIVE_PATH = os.path.join(os.path.expanduser('~'), '.nitec_monitoring', 'archive')
+
+# Local history of every analyzed application, for reports without the network
+DEFAULT_STORE_PATH = os.path.join(os.path.expanduser('~'), '.nitec_monitoring', 'results.sqlite3')
+
+# Sharded runs: applications per shard, and how long a silent worker keeps its shard
+DEFAULT_COORDINATOR_PORT = 8770
+DEFAULT_SHARD_SIZE = 500
+DEFAULT_LEASE_TIMEOUT = 60
+# Shared token of a sharded run, when not given on the command line
+SHARD_TOKEN_ENV = 'NITEC_SHARD_TOKEN'
+
+# Seconds between checkpoint saves of the output workbook during a run
+DEFAULT_CHECKPOINT_INTERVAL = 120
+
+# Comment of rows whose application could not be fetched
+FETCH_FAILED_COMMENT = "Ошибка: не удалось получить данные"
+# Comment of rows left unprocessed because the run's time budget ran out
+UNPROCESSED_COMMENT = "Не обработано: истекло время запуска"
+# Put before the earlier conclusion of such rows, which is kept
+STALE_PREFIX = "Не обновлено (истекло время запуска): "
+
+# Fetch stage result of a request the time budget left no room for
+OUT_OF_TIME = object()
+
+
+def fetch_html_with_timeout(url, timeout=5, session=None, limiter=None):
     """
     Fetch HTML from URL with timeout. Returns HTML content or None if failed.
+    When a session is given, its keep-alive connection pool is reused.
+    When a limiter is given, the request waits for a slot under its rate cap and,
+    for adaptive limiters, reports its latency and whether the server struggled.
+    This is a single attempt; use fetcher.Fetcher for retries and the circuit breaker.
     """
-    try:
-        response = requests.get(url, timeout=timeout)
-        response.raise_for_status()
-        return response.text
-    except requests.exceptions.Timeout:
-        print(f"Timeout ({timeout}s) exceeded for URL: {url}")
-        return None
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching {url}: {e}")
-        return None
+    return Fetcher(session=session, limiter=limiter, timeout=timeout).fetch(url)
 
 
-def analyze_application_from_html(html_content):
+def analyze_application_from_html(html_content, fast=True):
     """
     Analyze HTML content and return conclusion based on status sequence and technical errors.
+    By default the page is read with the single-pass page_extractor; fast=False uses
+    the BeautifulSoup helpers instead.
     """
     try:
+        if fast:
+            return analyze_page(html_content)
+
         soup = BeautifulSoup(html_content, "html.parser")
 
         # Use the comprehensive analysis that includes both status and error checking
-        conclusion = helpers.analyzeFullApplication(soup)
+        conclusion = helpers.analyzeFullApplication(soup, page_extractor._error_owners)
         return conclusion
 
     except Exception as e:
         return f"Ошибка анализа: {str(e)}"
 
 
-def preserve_excel_formatting(original_file, output_file, df_updated):
-    """
-    Preserve original Excel formatting while updating the data.
-    """
-    try:
-        # Load the original workbook with formatting
-        wb = load_workbook(original_file)
-        # Always work with the first sheet (index 0)
-        ws = wb.worksheets[0]
-
-        # Find the comment column index in the worksheet
-        comment_col_index = None
-        for col_idx, cell in enumerate(ws[1], 1):  # Check first row (headers)
-            if cell.value and 'Комментарий АО НИТ' in str(cell.value):
-                comment_col_index = col_idx
-                break
-
-        if comment_col_index is None:
-            print("Warning: Could not find 'Комментарий АО НИТ' column in original file")
-            return False
-
-        # Update only the comment column data, preserving all formatting
-        for row_idx in range(2, len(df_updated) + 2):  # Start from row 2 (skip header)
-            df_row_idx = row_idx - 2  # Convert to DataFrame index
-            if df_row_idx < len(df_updated):
-                comment_value = df_updated.iloc[df_row_idx]['Комментарий АО НИТ']
-                if pd.notna(comment_value) and comment_value != '':
-                    ws.cell(row=row_idx, column=comment_col_index).value = comment_value
-
-        # Save the workbook with preserved formatting
-        wb.save(output_file)
-        return True
-
-    except Exception as e:
-        print(f"Error preserving formatting: {e}")
-        return False
-
-
 def get_id_with_leading_zeros(value):
     """
     Extract ID ensuring leading zeros are preserved, using the "00" + str approach.
@@ -113,120 +142,1285 @@ def get_id_with_leading_zeros(value):
 
 
 
-def process_excel_with_dynamic_fetch(excel_file_path, output_file_path=None):
+def normalize_identifiers(values):
+    """
+    Vectorized get_id_with_leading_zeros over a whole identifier column.
+    Returns a list with the canonical app_id of each value, or None for empty values.
+    Only values with an exponent or a decimal point take the scalar float round trip.
+    """
+    series = pd.Series(list(values), dtype=object)
+    missing = series.isna()
+    text = series.where(~missing, '').astype(str).str.strip()
+    empty = missing | (text == '') | (text == 'nan')
+
+    # 'E+' and 'e+' both need a '+', so two plain substring scans find every candidate
+    special = ~empty & (text.str.contains('.', regex=False) | text.str.contains('+', regex=False))
+    if special.any():
+        # .loc: plain [] assignment of a list is rejected by the pandas 3 string dtype
+        text.loc[special] = [get_id_with_leading_zeros(value) for value in text[special]]
+
+    return [None if is_empty else app_id for app_id, is_empty in zip(text.tolist(), empty.tolist())]
+
+
+def collect_tasks(identifiers):
+    """
+    Turn (row_number, raw identifier) pairs into (row_numbers, app_id) tasks with
+    one task per unique application ID, skipping empty identifiers.
+    Returns the tasks and how many duplicate rows were folded into them.
+    """
+    identifiers = list(identifiers)
+    app_ids = normalize_identifiers(raw for _, raw in identifiers)
+
+    rows_by_id = {}
+    for (row_number, _), app_id in zip(identifiers, app_ids):
+        if app_id is not None:
+            rows_by_id.setdefault(app_id, []).append(row_number)
+
+    tasks = [(tuple(row_numbers), app_id) for app_id, row_numbers in rows_by_id.items()]
+    duplicate_count = sum(len(row_numbers) - 1 for row_numbers, _ in tasks)
+    return tasks, duplicate_count
+
+
+def split_journaled(tasks, done_rows):
+    """
+    Split (row_numbers, app_id) tasks against the rows of a progress journal.
+    Returns ({row_number: conclusion} taken from the journal, tasks for the rows still left).
+    """
+    resumed = {}
+    remaining = []
+    for row_numbers, app_id in tasks:
+        left = []
+        for row_number in row_numbers:
+            journaled = done_rows.get(row_number)
+            if journaled is not None and journaled[0] == app_id:
+                resumed[row_number] = journaled[1]
+            else:
+                left.append(row_number)
+        if left:
+            remaining.append((tuple(left), app_id))
+    return resumed, remaining
+
+
+def region_from_path(excel_file_path):
+    """
+    Region of a regional workbook from its name, e.g. "Павлодарская область_Апрель_75.xlsx".
+    """
+    return os.path.splitext(os.path.basename(excel_file_path))[0].split('_')[0]
+
+
+def describe_rows(row_numbers):
+    if len(row_numbers) == 1:
+        return f"строка {row_numbers[0]}"
+    return f"строки {', '.join(str(row_number) for row_number in row_numbers)}"
+
+
+def previous_conclusion(comment):
+    """
+    The conclusion of an earlier run found in a comment cell, without the marks of
+    a run whose time budget ran out; None if there is none.
+    """
+    if not comment:
+        return None
+    comment = str(comment)
+    if comment == UNPROCESSED_COMMENT:
+        return None
+    if comment.startswith(STALE_PREFIX):
+        return comment[len(STALE_PREFIX):]
+    return comment
+
+
+def row_priority(comment):
+    """
+    Fetch order of a row by the comment it already has: 0 for no conclusion yet
+    (or an error), 1 for a conclusion that can still change, 2 for a final one.
+    """
+    conclusion = previous_conclusion(comment)
+    if conclusion is None or conclusion.startswith("Ошибка"):
+        return 0
+    if helpers.isTerminalConclusion(conclusion):
+        return 2
+    return 1
+
+
+def prioritize_tasks(tasks, task_comments):
+    """
+    Sort tasks so the most useful are fetched first (see row_priority), keeping the
+    sheet order within a priority. task_comments(task) yields the current comments
+    of the task's rows; a task counts by its most urgent row.
+    """
+    keyed = [(min((row_priority(comment) for comment in task_comments(task)), default=0), task) for task in tasks]
+    keyed.sort(key=lambda item: item[0])
+    counts = [0, 0, 0]
+    for priority, _ in keyed:
+        counts[priority] += 1
+    print(f"Порядок обработки: без заключения {counts[0]}, незавершенные {counts[1]}, завершенные {counts[2]}")
+    return [task for _, task in keyed]
+
+
+def unprocessed_comment(comment):
+    """
+    Comment for a row left unprocessed when the time budget ran out.
+    """
+    conclusion = previous_conclusion(comment)
+    return UNPROCESSED_COMMENT if conclusion is None else STALE_PREFIX + conclusion
+
+
+class FetchEngine:
+    """
+    Turns application IDs into conclusions. Owns the keep-alive session, the rate
+    limiter, the retrying fetcher with its circuit breaker, the response cache, the
+    page archive and the optional analysis process pool, so one engine can serve
+    several workbooks.
+
+    With replay, pages come only from the archive: no session is opened and the
+    cache is not used, so every conclusion is computed by the current rules.
+
+    Stage timings and counters are collected in self.metrics; with metrics_path they
+    are written as metrics_path.json and metrics_path.prom when the engine is closed.
+
+    Every analyzed page is saved to the result store at store_path (None disables
+    it) with its statuses, deadline, errors and conclusion; self.regions maps appIds
+    to the region stored with them. Conclusions served from the cache and replays
+    add nothing to the store. Setting self.deadlines to a dict makes every analyzed
+    page also record its deadline there by appId, with or without the store.
+
+    endpoints is a list of base URLs of server mirrors to use instead of base_url;
+    with more than one, requests are spread over them by balance (see
+    fetcher.EndpointPool), each mirror with its own connection pool and health checks.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, requests_per_second=DEFAULT_REQUESTS_PER_SECOND,
+                 adaptive_rate=True, max_retries=3, hedge_after=None, cache_path=DEFAULT_CACHE_PATH,
+                 cache_ttl=DEFAULT_CACHE_TTL, parallel_analysis=False, analysis_processes=None,
+                 queue_size=DEFAULT_QUEUE_SIZE, error_mapping_path=None, archive_path=DEFAULT_ARCHIVE_PATH,
+                 replay=False, replay_as_of=None, base_url=None, metrics_path=None,
+                 store_path=DEFAULT_STORE_PATH, endpoints=None, balance='least_outstanding'):
+        self.max_workers = max_workers
+        self.metrics = RunMetrics()
+        self.metrics_path = metrics_path
+        self.base_url = base_url or BASE_URL
+        self.endpoint_urls = list(endpoints) if endpoints else [self.base_url]
+        self.queue_size = queue_size
+        self.replay = replay
+        self.replay_as_of = replay_as_of.timestamp() if isinstance(replay_as_of, datetime) else replay_as_of
+
+        self.archive = None
+        if archive_path:
+            try:
+                self.archive = PageArchive(archive_path)
+            except Exception as e:
+                print(f"Предупреждение: архив страниц недоступен ({e})")
+
+        self.session = None
+        self.endpoints = None
+        self.limiter = None
+        self.fetcher = None
+        if replay:
+            if self.archive is None:
+                raise ValueError("Для режима повторного анализа нужен архив страниц (archive_path)")
+            print(f"Повторный анализ из архива {archive_path}, без обращений к серверу")
+            # Every conclusion has to come from the current rules, not from the cache
+            cache_path = None
+            parallel_analysis = True
+        else:
+            print(f"Потоков: {max_workers}, лимит запросов в секунду: {requests_per_second}"
+                  f"{' (адаптивный)' if adaptive_rate else ''}")
+
+            if adaptive_rate:
+                self.limiter = AdaptiveRateLimiter(requests_per_second)
+            else:
+                self.limiter = RateLimiter(requests_per_second)
+
+            if len(self.endpoint_urls) > 1:
+                # The rate limit stays global; each mirror gets its own connection pool
+                self.endpoints = EndpointPool(self.endpoint_urls, strategy=balance, pool_size=max_workers * 2,
+                                              metrics=self.metrics)
+                print(f"Серверов: {len(self.endpoints)}, распределение: {balance}")
+                self.fetcher = Fetcher(limiter=self.limiter, retry_policy=RetryPolicy(max_retries=max_retries),
+                                       hedge_after=hedge_after, timeout=5, hedge_workers=max_workers * 2,
+                                       metrics=self.metrics, endpoints=self.endpoints)
+            else:
+                self.base_url = self.endpoint_urls[0]
+                self.session = create_session(pool_size=max_workers)
+                self.fetcher = Fetcher(session=self.session, limiter=self.limiter,
+                                       retry_policy=RetryPolicy(max_retries=max_retries), breaker=CircuitBreaker(),
+                                       hedge_after=hedge_after, timeout=5, hedge_workers=max_workers * 2,
+                                       metrics=self.metrics)
+
+        self.regions = {}
+        self.deadlines = None
+        self.store = None
+        if store_path and not replay:
+            try:
+                self.store = ResultStore(store_path, source='fetch')
+            except Exception as e:
+                print(f"Предупреждение: хранилище результатов недоступно ({e})")
+
+        if error_mapping_path:
+            page_extractor.set_error_owners(load_error_owner_matcher(error_mapping_path))
+            print(f"Ответственные за ошибки: {error_mapping_path}")
+
+        # Cached conclusions are only served while the rules and the error mapping are unchanged
+        self.cache = None
+        if cache_path:
+            try:
+                self.cache = ResponseCache(cache_path, ttl=cache_ttl, version=page_extractor.analysis_version())
+            except Exception as e:
+                print(f"Предупреждение: кэш недоступен ({e}), все заявки будут загружены с сервера")
+
+        self.analysis_pool = None
+        self.analysis_workers = 1
+        if parallel_analysis:
+            self.analysis_workers = analysis_processes or os.cpu_count() or 1
+            if error_mapping_path:
+                self.analysis_pool = ProcessPoolExecutor(max_workers=self.analysis_workers,
+                                                         initializer=page_extractor.load_error_owners,
+                                                         initargs=(error_mapping_path,))
+            else:
+                self.analysis_pool = ProcessPoolExecutor(max_workers=self.analysis_workers)
+            print(f"Процессов анализа: {self.analysis_workers}")
+
+    def fetch_page(self, task, deadline=None):
+        """
+        Pipeline fetch stage: returns (page, None), (None, cached conclusion) or (None, None) on failure.
+        No retry or wait of the fetcher runs past deadline (time.monotonic()); a page
+        that could not be fetched before it gives (None, OUT_OF_TIME).
+        """
+        key, app_id = task
+        if self.replay:
+            html_content = self.archive.get_html(app_id, self.replay_as_of)
+            if html_content is None:
+                return None, "Ошибка: страница заявки отсутствует в архиве"
+            return html_content, None
+
+        if self.cache is not None:
+            cached_page, cached_conclusion = self.cache.lookup(app_id)
+            if cached_conclusion is not None:
+                self.metrics.count('cache_hits_total')
+                return None, cached_conclusion
+            if cached_page is not None:
+                # A final page cached under older rules: analyze it again instead of fetching
+                self.metrics.count('cache_reanalyzed_total')
+                return cached_page, None
+
+        try:
+            with self.metrics.timer('fetch_seconds'):
+                if self.endpoints is not None:
+                    html_content = self.fetcher.fetch(app_id, deadline)
+                else:
+                    html_content = self.fetcher.fetch(self.base_url + app_id, deadline)
+        except BudgetExpired:
+            return None, OUT_OF_TIME
+        if html_content is None:
+            self.metrics.count('fetch_failures_total')
+        elif self.archive is not None:
+            try:
+                with self.metrics.timer('archive_seconds'):
+                    self.archive.put(app_id, html_content)
+            except Exception as e:
+                print(f"Ошибка записи в архив для заявки {app_id}: {e}")
+        return html_content, None
+
+    def analyze_fetched(self, task, html_content):
+        """
+        Pipeline analysis stage.
+        """
+        key, app_id = task
+        if self.analysis_pool is not None:
+            # The analysis thread just waits here while a worker process does the parsing
+            conclusion, parse_time, analysis_time, record = self.analysis_pool.submit(analyze_page_timed,
+                                                                                      html_content).result()
+        else:
+            conclusion, parse_time, analysis_time, record = analyze_page_timed(html_content)
+
+        if self.deadlines is not None and record is not None:
+            self.deadlines[app_id] = record.deadline
+        if self.store is not None and record is not None:
+            try:
+                self.store.add(app_id, record, conclusion, region=self.regions.get(app_id))
+            except Exception as e:
+                print(f"Ошибка записи результата заявки {app_id}: {e}")
+
+        category = conclusion_category(conclusion)
+        self.metrics.observe('parse_seconds', parse_time, category=category)
+        self.metrics.observe('analysis_seconds', analysis_time, category=category)
+        if self.cache is not None and not conclusion.startswith("Ошибка"):
+            self.cache.put(app_id, html_content, conclusion, terminal=helpers.isTerminalConclusion(conclusion))
+        return conclusion
+
+    def run(self, tasks, requeue_failed=True, stop_event=None):
+        """
+        Yield ((key, app_id), conclusion) for each (key, app_id) task as results arrive.
+        Tasks whose page could not be fetched are requeued once after all the others
+        when requeue_failed is set; conclusion is None if they failed again.
+        Setting stop_event stops taking new tasks; results already in flight are still yielded.
+        With a time budget (stop_event is a pipeline.BudgetEvent) requests in flight give
+        up at its deadline too. Tasks the fetcher gave up on for lack of time expire
+        the budget; they, and tasks that failed after the stop, are neither requeued
+        nor yielded, so the caller treats them as unprocessed.
+        """
+        pending = tasks
+        passes = 2 if requeue_failed else 1
+        deadline = getattr(stop_event, 'deadline', None)
+
+        def fetch(task):
+            return self.fetch_page(task, deadline)
+
+        for pass_number in range(1, passes + 1):
+            last_pass = pass_number == passes
+            if pass_number > 1:
+                print(f"\nПовторная обработка заявок с ошибками: {len(pending)}")
+
+            failed = []
+            results = run_pipeline(pending, fetch, self.analyze_fetched, fetch_workers=self.max_workers,
+                                   analysis_workers=self.analysis_workers, queue_size=self.queue_size,
+                                   stop_event=stop_event)
+            for task, conclusion in results:
+                if conclusion is OUT_OF_TIME:
+                    # No later request fits before the deadline either
+                    stop_event.expire()
+                    continue
+                if conclusion is None and deadline is not None and stop_event.is_set():
+                    continue
+                if conclusion is None and not last_pass:
+                    failed.append(task)
+                    print(f"✗ Не удалось получить данные по заявке {task[1]}, она будет повторена в конце")
+                    continue
+                self.metrics.count('conclusions_total', category=conclusion_category(conclusion))
+                yield task, conclusion
+
+            pending = failed
+            if not pending or (stop_event is not None and stop_event.is_set()):
+                break
+
+    def close(self):
+        if self.analysis_pool is not None:
+            self.analysis_pool.shutdown()
+        if self.fetcher is not None:
+            self.fetcher.close()
+        if self.session is not None:
+            self.session.close()
+        if self.endpoints is not None:
+            for line in self.endpoints.summary():
+                print(line)
+            self.endpoints.close()
+        if self.archive is not None:
+            self.archive.close()
+        if self.store is not None:
+            self.store.close()
+        if self.cache is not None:
+            self.cache.close()
+            print(f"Из кэша: {self.cache.hits}, заново проанализировано из кэша: {self.cache.stale}, "
+                  f"загружено с сервера: {self.cache.misses}")
+
+        for line in self.metrics.summary():
+            print(line)
+        if self.metrics_path:
+            try:
+                self.metrics.write_reports(self.metrics_path)
+                print(f"Метрики сохранены: {self.metrics_path}.json, {self.metrics_path}.prom")
+            except Exception as e:
+                print(f"Ошибка сохранения метрик: {e}")
+
+
+def process_excel_with_dynamic_fetch(excel_file_path, output_file_path=None,
+                                     max_workers=DEFAULT_MAX_WORKERS,
+                                     requests_per_second=DEFAULT_REQUESTS_PER_SECOND,
+                                     adaptive_rate=True, max_retries=3, requeue_failed=True,
+                                     hedge_after=None, cache_path=DEFAULT_CACHE_PATH,
+                                     cache_ttl=DEFAULT_CACHE_TTL, resume=True,
+                                     checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL,
+                                     parallel_analysis=False, analysis_processes=None,
+                                     queue_size=DEFAULT_QUEUE_SIZE, streaming=False,
+                                     chunk_size=DEFAULT_CHUNK_SIZE, error_mapping_path=None,
+                                     archive_path=DEFAULT_ARCHIVE_PATH, replay=False, replay_as_of=None,
+                                     base_url=None, metrics_path=None, profile_dir=None, progress=None,
+                                     stop_event=None, store_path=DEFAULT_STORE_PATH, endpoints=None,
+                                     balance='least_outstanding', time_budget=None):
     """
     Process Excel file by fetching HTML for each application ID dynamically.
     Preserves original formatting and handles leading zeros correctly.
+    Identifiers are normalized in one vectorized pass and each unique application is
+    fetched and analyzed once, its conclusion going to every row that references it.
+    Rows are fetched by a bounded pool of max_workers threads sharing one keep-alive
+    session; requests_per_second caps the total request rate across all workers.
+    With adaptive_rate the cap is only the starting point and is tuned AIMD-style
+    from the observed latency and server errors.
+    Failed requests are retried up to max_retries times with backoff, a circuit breaker
+    pauses all workers while the server is down, and rows that still failed are
+    requeued once at the end of the run when requeue_failed is set. hedge_after
+    (seconds) sends a second request for slow tail requests.
+    Pages and conclusions are cached in cache_path (None disables the cache) for
+    cache_ttl seconds; applications that reached a final status are never fetched again.
+    The workbook is loaded once; identifiers are read from its first sheet and the
+    conclusions are written into its comment column in memory.
+    Every result is appended to a journal next to the output file and the output
+    workbook is saved atomically every checkpoint_interval seconds. With resume, a
+    restarted run takes the rows already in the journal and continues from there.
+    With parallel_analysis, pages are parsed and analyzed in a pool of
+    analysis_processes worker processes (default: one per CPU), so only the page
+    goes out and only the conclusion string comes back.
+    Fetching, analysis and writing run as pipeline stages joined by queues of at most
+    queue_size items; their depths are printed periodically.
+    With streaming, very large workbooks are processed chunk_size rows at a time in
+    roughly constant memory (see process_workbook_streaming).
+    error_mapping_path is an "error text - owner" file; when given, every MsgQueue
+    error in a conclusion names its owner.
+    Every fetched page is kept in the compressed archive at archive_path (None
+    disables it). With replay, nothing is fetched: the conclusions are recomputed in
+    parallel from the archived pages (as of the replay_as_of datetime, default the
+    latest), e.g. to apply changed rules to old workbooks.
+    Fetch, parse, analysis, write and save times are measured for every run and
+    summarized at the end; metrics_path also writes them as a JSON report and a
+    Prometheus text file (see FetchEngine).
+    profile_dir (or the NITEC_PROFILE environment variable) profiles the run's fetch,
+    parse, rules and save stages into that directory, see start_profiler.
+    progress(done_rows, total_rows) is called from the processing thread as rows are
+    done. Setting stop_event (a threading.Event) cancels the run cleanly: work in
+    flight is finished, the partial results are saved and the journal is kept, so a
+    later run resumes from there.
+    Each analyzed application is also added to the result store at store_path
+    (see result_store.ResultStore), from which fill_workbook_from_store can later
+    fill workbooks without the network.
+    endpoints lists the base URLs of several server mirrors to spread the requests
+    over instead of base_url, balanced by balance ('least_outstanding' or
+    'latency'); a failed request is retried on another mirror (see FetchEngine).
+    Rows are fetched most useful first: rows without a conclusion, then rows whose
+    earlier conclusion can still change, then final ones. time_budget (seconds)
+    limits the run: when it runs out no new rows are started, the work in flight is
+    finished and saved, and the rows left are marked in the comment column (their
+    earlier conclusion, if any, is kept after STALE_PREFIX); the journal is kept
+    as for a cancelled run.
     """
-    # Read Excel file with string dtype to preserve leading zeros
+    if output_file_path is None:
+        output_file_path = excel_file_path.replace('.xlsx', '_processed.xlsx')
+
+    profile_dir = profile_dir_from_env(profile_dir)
+    if profile_dir and parallel_analysis:
+        print("Профилирование: анализ выполняется в основном процессе")
+        parallel_analysis = False
+
+    engine = FetchEngine(max_workers=max_workers, requests_per_second=requests_per_second,
+                         adaptive_rate=adaptive_rate, max_retries=max_retries, hedge_after=hedge_after,
+                         cache_path=cache_path, cache_ttl=cache_ttl, parallel_analysis=parallel_analysis,
+                         analysis_processes=analysis_processes, queue_size=queue_size,
+                         error_mapping_path=error_mapping_path, archive_path=archive_path,
+                         replay=replay, replay_as_of=replay_as_of, base_url=base_url,
+                         metrics_path=metrics_path, store_path=store_path, endpoints=endpoints,
+                         balance=balance)
+    profiler = start_profiler(profile_dir, engine) if profile_dir else None
     try:
-        # First, try to read with original formatting preserved
-        df = pd.read_excel(excel_file_path, engine='openpyxl', dtype=str)
+        if streaming:
+            process_workbook_streaming(excel_file_path, output_file_path, engine, requeue_failed=requeue_failed,
+                                       resume=resume, chunk_size=chunk_size, progress=progress,
+                                       stop_event=stop_event, time_budget=time_budget)
+        else:
+            process_workbook(excel_file_path, output_file_path, engine, requeue_failed=requeue_failed,
+                             resume=resume, checkpoint_interval=checkpoint_interval, progress=progress,
+                             stop_event=stop_event, time_budget=time_budget)
+    finally:
+        engine.close()
+        if profiler is not None:
+            profiler.stop()
+
 
-        # Also read without dtype=str to get proper column detection
-        df_detect = pd.read_excel(excel_file_path, engine='openpyxl')
+def start_profiler(profile_dir, engine):
+    """
+    Start a profiling.Profiler writing to profile_dir, with the stages of a run wrapped:
+    fetch (engine.fetch_page), parse (page extraction), rules (status and error
+    analysis) and save (workbook saves). Only called when profiling is on, so
+    otherwise nothing is wrapped.
+    """
+    profiler = Profiler(profile_dir)
+    this_module = sys.modules[__name__]
+    profiler.patch(engine, 'fetch_page', 'fetch')
+    profiler.patch(this_module, 'analyze_application_from_html', 'parse')
+    profiler.patch(page_extractor, 'extract_application_record', 'parse')
+    profiler.patch(helpers, 'analyzeStatusSequence', 'rules')
+    profiler.patch(helpers, 'checkTechnicalErrors', 'rules')
+    profiler.patch(helpers, 'analyzeRecord', 'rules')
+    profiler.patch(workbook_io, 'save_workbook_atomic', 'save')
+    profiler.patch(this_module, 'save_workbook_atomic', 'save')
+    return profiler.start()
 
+
+def open_comment_workbook(excel_file_path):
+    """
+    Load a workbook for filling in its comment column, adding the column if it is
+    missing. Returns None, after saying why, when the file cannot be read or has no
+    application ID column.
+    """
+    try:
+        workbook = CommentWorkbook(excel_file_path)
     except Exception as e:
-        print(f"Error reading Excel file: {e}")
+        print(f"Error reading Excel file {excel_file_path}: {e}")
+        return None
+
+    if workbook.identifier_col is None:
+        print(f"Ошибка: в {excel_file_path} не найден столбец с идентификатором заявки")
+        print("Доступные столбцы:", workbook.headers)
+        return None
+    if workbook.comment_col is None:
+        print(f"Предупреждение: не найден столбец '{COMMENT_HEADER}', создаем новый")
+        workbook.add_comment_column()
+    return workbook
+
+
+class _WorkbookRun:
+    """
+    One workbook being filled in by a run: its journal, the applications still to
+    do and the counters of the results summary. workbook is the in-memory
+    CommentWorkbook; the streaming mode has none and passes its own comment
+    getters and setters instead.
+    """
+
+    def __init__(self, path, output_file_path, workbook=None):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.output_file_path = output_file_path
+        self.workbook = workbook
+        self.journal = ProgressJournal(output_file_path + '.journal')
+        self.row_count = 0
+        self.task_count = 0
+        self.successful_count = 0
+        self.failed_count = 0
+        self.resumed_count = 0
+        self.duplicate_count = 0
+        self.unprocessed = {}  # app_id -> row_numbers still to do
+        self.unprocessed_rows = 0
+        self.elapsed = None
+        self.saved = False
+
+    def load_journal(self, resume=True):
+        """
+        Rows finished by an interrupted run of the same file, {row_number: (app_id, conclusion)};
+        without resume the journal is dropped instead.
+        """
+        if resume:
+            return self.journal.load()
+        self.journal.remove()
+        return {}
+
+    def take_journaled(self, tasks, done_rows, set_comments=None):
+        """
+        Write the rows of tasks found in done_rows and return the tasks for the rows still left.
+        """
+        resumed, tasks = split_journaled(tasks, done_rows)
+        (set_comments or self.workbook.set_comments)(resumed)
+        self.resumed_count += len(resumed)
+        self.unprocessed = {app_id: row_numbers for row_numbers, app_id in tasks}
+        return tasks
+
+    def load_tasks(self, resume=True):
+        """
+        Collect the tasks of the workbook (see collect_tasks) and, with resume, take
+        the rows already in the journal. Returns the tasks left.
+        """
+        tasks, self.duplicate_count = collect_tasks(self.workbook.iter_identifiers())
+        self.task_count = len(tasks)
+        self.row_count = sum(len(row_numbers) for row_numbers, _ in tasks)
+        return self.take_journaled(tasks, self.load_journal(resume))
+
+    def record(self, row_numbers, app_id, conclusion, set_comment=None):
+        """
+        Fan one application's conclusion out to every row that references it and
+        journal it; a failed fetch (None) gets FETCH_FAILED_COMMENT instead.
+        """
+        set_comment = set_comment or self.workbook.set_comment
+        for row_number in row_numbers:
+            if conclusion is not None:
+                set_comment(row_number, conclusion)
+                self.journal.record(row_number, app_id, conclusion)
+                self.successful_count += 1
+            else:
+                set_comment(row_number, FETCH_FAILED_COMMENT)
+                self.failed_count += 1
+        self.unprocessed.pop(app_id, None)
+
+    def mark_unprocessed(self, get_comment=None, set_comment=None):
+        """
+        Mark the rows still to do when the time budget ran out (see unprocessed_comment).
+        """
+        get_comment = get_comment or self.workbook.get_comment
+        set_comment = set_comment or self.workbook.set_comment
+        for row_numbers in self.unprocessed.values():
+            for row_number in row_numbers:
+                set_comment(row_number, unprocessed_comment(get_comment(row_number)))
+            self.unprocessed_rows += len(row_numbers)
+        self.unprocessed = {}
+
+    def _write(self, metrics, write):
+        write = write or self.workbook.save
+        if metrics is None:
+            write(self.output_file_path)
+        else:
+            with metrics.timer('save_seconds'):
+                write(self.output_file_path)
+
+    def checkpoint(self, metrics=None):
+        """
+        Save the unfinished workbook; returns whether it worked.
+        """
+        try:
+            self._write(metrics, None)
+            return True
+        except Exception as e:
+            print(f"Ошибка промежуточного сохранения {self.output_file_path}: {e}")
+            return False
+
+    def save(self, metrics=None, keep_journal=False, write=None):
+        """
+        Save the workbook (with write(path), if given) and close the journal, which
+        is removed once the save succeeded unless keep_journal (the run did not
+        finish the workbook). Returns whether it was saved.
+        """
+        self.journal.close()
+        try:
+            self._write(metrics, write)
+        except Exception as e:
+            print(f"Ошибка сохранения файла {self.output_file_path}: {e}")
+            return False
+        self.saved = True
+        if not keep_journal:
+            self.journal.remove()
+        return True
+
+    def print_summary(self, note="✓ Оригинальное форматирование сохранено"):
+        print(f"\\n=== РЕЗУЛЬТАТЫ ===")
+        if self.resumed_count:
+            print(f"Взято из журнала прерванного запуска: {self.resumed_count}")
+        print(f"Успешно обработано: {self.successful_count}")
+        print(f"Ошибок: {self.failed_count}")
+        print(f"Повторяющихся строк без отдельного запроса: {self.duplicate_count}")
+        print(f"Результаты сохранены в: {self.output_file_path}")
+        print(note)
+
+
+def fill_workbook_from_store(excel_file_path, output_file_path=None, store_path=DEFAULT_STORE_PATH, until=None):
+    """
+    Fill the comment column from the latest stored result of each application
+    (checked before until, if given) instead of the network. Rows whose application
+    is not in the store are left as they are.
+    """
+    if output_file_path is None:
+        output_file_path = excel_file_path.replace('.xlsx', '_processed.xlsx')
+
+    workbook = open_comment_workbook(excel_file_path)
+    if workbook is None:
+        return
+
+    tasks, duplicate_count = collect_tasks(workbook.iter_identifiers())
+    store = ResultStore(store_path, start_run=False)
+    try:
+        latest = {row['app_id']: row['conclusion']
+                  for row in store.query(until=until, app_ids=[app_id for _, app_id in tasks], latest_only=True)}
+    finally:
+        store.close()
+
+    comments = {}
+    missing_count = 0
+    for row_numbers, app_id in tasks:
+        conclusion = latest.get(app_id)
+        if conclusion is None:
+            missing_count += len(row_numbers)
+            continue
+        for row_number in row_numbers:
+            comments[row_number] = conclusion
+    workbook.set_comments(comments)
+
+    try:
+        workbook.save(output_file_path)
+        print(f"Заполнено из хранилища: {len(comments)} строк, нет в хранилище: {missing_count}")
+        print(f"Результаты сохранены в: {output_file_path}")
+    except Exception as e:
+        print(f"Ошибка сохранения файла: {e}")
+
+
+def process_workbook(excel_file_path, output_file_path, engine, requeue_failed=True, resume=True,
+                     checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL, progress=None, stop_event=None,
+                     time_budget=None):
+    """
+    Fill the comment column of one workbook, keeping it in memory with all formatting.
+    Rows are fetched most useful first (see prioritize_tasks). With time_budget
+    (seconds), no new rows are started once it runs out; the rows left are marked
+    (UNPROCESSED_COMMENT, or STALE_PREFIX before their earlier conclusion).
+    """
+    # Load the workbook once; identifiers are read and comments written in place
+    workbook = open_comment_workbook(excel_file_path)
+    if workbook is None:
         return
 
-    # Find the required columns
-    identifier_col = None
-    comment_col = None
+    print(f"Найден столбец идентификатора: {workbook.headers[workbook.identifier_col - 1]}")
+    print(f"Найден столбец комментариев: {workbook.headers[workbook.comment_col - 1]}")
+    print(f"Всего строк для обработки: {workbook.row_count}")
+
+    # One task per unique application ID, less the rows finished by an interrupted run of the same file
+    run = _WorkbookRun(excel_file_path, output_file_path, workbook)
+    tasks = run.load_tasks(resume)
+    print(f"Уникальных заявок: {run.task_count}, повторяющихся строк объединено: {run.duplicate_count}")
+    if run.resumed_count:
+        print(f"Продолжение прерванного запуска: {run.resumed_count} строк уже обработано, осталось заявок {len(tasks)}")
+
+    tasks = prioritize_tasks(tasks, lambda task: (workbook.get_comment(row_number) for row_number in task[0]))
+    if time_budget:
+        stop_event = BudgetEvent(time_budget, stop_event)
+        print(f"Время запуска ограничено: {time_budget:.0f} с")
+
+    region = region_from_path(excel_file_path)
+    engine.regions.update((app_id, region) for _, app_id in tasks)
+
+    # Fetch and analysis stages run concurrently; this thread is the single writer
+    last_checkpoint = time.monotonic()
+    done_rows = run.resumed_count
+    if progress is not None:
+        progress(done_rows, run.row_count)
+
+    try:
+        for done, ((row_numbers, app_id), conclusion) in enumerate(engine.run(tasks, requeue_failed, stop_event), 1):
+            print(f"[{done}/{len(tasks)}] Заявка ID: {app_id} ({describe_rows(row_numbers)})")
+            with engine.metrics.timer('write_seconds'):
+                run.record(row_numbers, app_id, conclusion)
+
+            if conclusion is not None:
+                print(f"✓ Успешно: {conclusion}")
+            else:
+                print("✗ Не удалось получить данные")
+
+            done_rows += len(row_numbers)
+            if progress is not None:
+                progress(done_rows, run.row_count)
+
+            if checkpoint_interval and time.monotonic() - last_checkpoint >= checkpoint_interval:
+                if run.checkpoint(engine.metrics):
+                    print(f"Промежуточное сохранение: {output_file_path}")
+                last_checkpoint = time.monotonic()
+    finally:
+        run.journal.close()
 
-    for col in df.columns:
-        if 'Идентификатор заявки' in str(col) or 'Идентификатор' in str(col):
-            identifier_col = col
-        elif 'Комментарий АО НИТ' in str(col):
-            comment_col = col
+    # A cancelled run keeps the journal so the next run continues from here
+    cancelled = stop_event is not None and stop_event.is_set()
+    out_of_time = getattr(stop_event, 'expired', False)
+    if out_of_time:
+        run.mark_unprocessed()
+
+    if run.save(engine.metrics, keep_journal=cancelled):
+        run.print_summary()
+        if out_of_time:
+            print(f"Время запуска истекло: готово {done_rows} из {run.row_count} строк, "
+                  f"не обработано {run.unprocessed_rows} (отмечены в столбце комментариев)")
+        elif cancelled:
+            print(f"Обработка остановлена: готово {done_rows} из {run.row_count} строк")
+
+
+def process_workbook_streaming(excel_file_path, output_file_path, engine, requeue_failed=True, resume=True,
+                               chunk_size=DEFAULT_CHUNK_SIZE, progress=None, stop_event=None, time_budget=None):
+    """
+    Constant-memory variant of process_workbook for very large workbooks.
+    The input is read with openpyxl read_only iteration and processed chunk_size rows
+    at a time; each finished chunk is appended to a write-only output workbook, so peak
+    memory depends on chunk_size rather than on the number of rows.
+    Cell values are copied, but of the original formatting only the header row's is kept.
+    After stop_event is set, the remaining rows are copied to the output unprocessed.
+    Rows are prioritized and time_budget applies as in process_workbook, but only
+    within each chunk, since the whole sheet is never in memory.
+    """
+    try:
+        wb_in = load_workbook(excel_file_path, read_only=True)
+    except Exception as e:
+        print(f"Error reading Excel file {excel_file_path}: {e}")
+        return
+
+    ws_in = wb_in.worksheets[0]
+    header_cells = next(ws_in.iter_rows(max_row=1), ())
+    headers = [cell.value for cell in header_cells]
+    identifier_col, comment_col = find_columns(headers)
 
     if identifier_col is None:
-        print("Ошибка: не найден столбец с идентификатором заявки")
-        print("Доступные столбцы:", df.columns.tolist())
+        print(f"Ошибка: в {excel_file_path} не найден столбец с идентификатором заявки")
+        print("Доступные столбцы:", headers)
+        wb_in.close()
         return
 
+    wb_out = Workbook(write_only=True)
+    ws_out = wb_out.create_sheet(ws_in.title)
+    header_row = []
+    for cell in header_cells:
+        out_cell = WriteOnlyCell(ws_out, value=cell.value)
+        out_cell.font = copy.copy(cell.font)
+        out_cell.fill = copy.copy(cell.fill)
+        header_row.append(out_cell)
+
     if comment_col is None:
-        print("Предупреждение: не найден столбец 'Комментарий АО НИТ', создаем новый")
-        comment_col = 'Комментарий АО НИТ'
-        df[comment_col] = ''
+        print(f"Предупреждение: не найден столбец '{COMMENT_HEADER}', создаем новый")
+        header_row.append(COMMENT_HEADER)
+        comment_col = len(header_row)
+    ws_out.append(header_row)
 
-    print(f"Найден столбец идентификатора: {identifier_col}")
-    print(f"Найден столбец комментариев: {comment_col}")
-    print(f"Всего строк для обработки: {len(df)}")
+    print(f"Найден столбец идентификатора: {headers[identifier_col - 1]}")
+    print(f"Потоковый режим: по {chunk_size} строк")
 
-    # Base URL template
-    base_url = "http://192.168.130.100/csp/iiscon/isc.util.About.cls?Action=4&appId="
+    run = _WorkbookRun(excel_file_path, output_file_path)
+    done_rows = run.load_journal(resume)
+    if time_budget:
+        stop_event = BudgetEvent(time_budget, stop_event)
+        print(f"Время запуска ограничено: {time_budget:.0f} с")
 
-    # Process each row
-    successful_count = 0
-    failed_count = 0
+    width = len(header_row)
+    region = region_from_path(excel_file_path)
+    rows = enumerate(ws_in.iter_rows(min_row=2, values_only=True), 2)
+    written_count = 0
+    # The row count from the sheet dimensions, when the file has them
+    total_rows = max(0, (ws_in.max_row or 1) - 1)
+    processed_rows = 0
 
-    for index, row in df.iterrows():
-        # Get the application ID with proper leading zeros
-        app_id_raw = row[identifier_col]
+    try:
+        while True:
+            chunk = [(row_number, list(values) + [None] * (width - len(values)))
+                     for row_number, values in itertools.islice(rows, chunk_size)]
+            if not chunk:
+                break
 
-        # Skip if ID is empty or NaN
-        if pd.isna(app_id_raw) or str(app_id_raw).strip() == '' or str(app_id_raw).strip() == 'nan':
-            continue
+            # Conclusions of the chunk's rows, written into their comment cells when the chunk is done
+            conclusions = {}
+            chunk_values = dict(chunk)
+            chunk_tasks, chunk_duplicates = collect_tasks((row_number, values[identifier_col - 1])
+                                                          for row_number, values in chunk)
+            run.duplicate_count += chunk_duplicates
+            resumed_count = run.resumed_count
+            tasks = run.take_journaled(chunk_tasks, done_rows, conclusions.update)
+            for row_number, _ in chunk:
+                done_rows.pop(row_number, None)
 
-        # Convert to string, clean up, and add "00" prefix
-        app_id = get_id_with_leading_zeros(app_id_raw)
-        if app_id is None:
-            continue
+            processed_rows += run.resumed_count - resumed_count
+            tasks = prioritize_tasks(tasks, lambda task: (chunk_values[row_number][comment_col - 1]
+                                                          for row_number in task[0]))
+            pending = tasks
+            if stop_event is not None and stop_event.is_set():
+                pending = []
+            engine.regions.clear()
+            engine.regions.update((app_id, region) for _, app_id in pending)
+
+            for (row_numbers, app_id), conclusion in engine.run(pending, requeue_failed, stop_event):
+                processed_rows += len(row_numbers)
+                if progress is not None:
+                    progress(processed_rows, total_rows)
+                run.record(row_numbers, app_id, conclusion, conclusions.__setitem__)
+                if conclusion is None:
+                    print(f"✗ Не удалось получить данные по заявке {app_id} ({describe_rows(row_numbers)})")
 
-        url = base_url + app_id
+            if getattr(stop_event, 'expired', False):
+                run.mark_unprocessed(lambda row_number: chunk_values[row_number][comment_col - 1],
+                                     conclusions.__setitem__)
 
-        print(f"\\n[{index + 1}/{len(df)}] Обработка заявки ID: {app_id}")
+            with engine.metrics.timer('write_seconds'):
+                for row_number, values in chunk:
+                    if row_number in conclusions:
+                        values[comment_col - 1] = conclusions[row_number]
+                    ws_out.append(values)
+            written_count += len(chunk)
+            print(f"Записано строк: {written_count} (успешно {run.successful_count}, ошибок {run.failed_count})")
+    finally:
+        run.journal.close()
+        wb_in.close()
 
-        # Fetch HTML with timeout
-        html_content = fetch_html_with_timeout(url, timeout=5)
+    cancelled = stop_event is not None and stop_event.is_set()
+    if run.save(engine.metrics, keep_journal=cancelled, write=lambda path: save_workbook_atomic(wb_out, path)):
+        run.print_summary("⚠️ Потоковый режим: форматирование ячеек данных не сохраняется")
+        if getattr(stop_event, 'expired', False):
+            print(f"Время запуска истекло: готово {processed_rows} строк, "
+                  f"не обработано {run.unprocessed_rows} (отмечены в столбце комментариев)")
+        elif cancelled:
+            print(f"Обработка остановлена: готово {processed_rows} строк, остальные скопированы без обработки")
 
-        if html_content:
-            # Analyze the HTML and get conclusion
-            conclusion = analyze_application_from_html(html_content)
-            df.at[index, comment_col] = conclusion
-            successful_count += 1
-            print(f"✓ Успешно: {conclusion}")
+
+def find_workbooks(inputs):
+    """
+    Expand workbook files, directories and glob patterns into a list of input workbooks.
+    Directories and patterns skip outputs of earlier runs (*_processed.xlsx) and Excel lock files.
+    """
+    paths = []
+    seen = set()
+    for item in inputs:
+        if os.path.isfile(item):
+            candidates = [item]
         else:
-            df.at[index, comment_col] = "Ошибка: не удалось получить данные"
-            failed_count += 1
-            print("✗ Не удалось получить данные")
+            pattern = os.path.join(item, '*.xlsx') if os.path.isdir(item) else item
+            candidates = [path for path in sorted(glob.glob(pattern))
+                          if not os.path.basename(path).startswith('~$') and not path.endswith('_processed.xlsx')]
+        for path in candidates:
+            if os.path.abspath(path) not in seen:
+                seen.add(os.path.abspath(path))
+                paths.append(path)
+    return paths
+
+
+def output_path_for(excel_file_path, output_dir=None):
+    output_file_path = excel_file_path.replace('.xlsx', '_processed.xlsx')
+    if output_dir:
+        output_file_path = os.path.join(output_dir, os.path.basename(output_file_path))
+    return output_file_path
+
+
+def process_batch(inputs, output_dir=None, engine=None, requeue_failed=True, resume=True,
+                  checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL, profile_dir=None, time_budget=None,
+                  **engine_options):
+    """
+    Headless batch run over many workbooks, e.g. one per oblast for a month.
+    inputs are workbook files, directories or glob patterns (see find_workbooks).
+    The unique application IDs of all workbooks are fetched once through one shared
+    FetchEngine (built from engine_options unless engine is given), and each
+    conclusion is written to every row of every workbook that references it.
+    A workbook is saved to output_dir (default: next to it, as *_processed.xlsx) as
+    soon as all of its applications are done; each has its own resume journal.
+    Ends with a per-file and overall throughput summary. profile_dir profiles the
+    run as in process_excel_with_dynamic_fetch.
+    Applications are fetched most useful first across all workbooks; with
+    time_budget (seconds) the run stops taking new ones when it runs out and saves
+    every unfinished workbook with its remaining rows marked, as process_workbook does.
+    """
+    paths = find_workbooks(inputs)
+    if not paths:
+        print("Не найдено ни одной книги Excel для обработки")
+        return
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    print(f"Книг для обработки: {len(paths)}")
+    started = time.monotonic()
 
-        # Small delay to avoid overwhelming the server
-        time.sleep(0.5)
+    own_engine = engine is None
+    if own_engine:
+        engine = FetchEngine(**engine_options)
+    profile_dir = profile_dir_from_env(profile_dir)
+    profiler = start_profiler(profile_dir, engine) if profile_dir else None
+
+    def finish(run, keep_journal=False):
+        # Save the finished workbook and release it
+        run.elapsed = time.monotonic() - started
+        if run.save(engine.metrics, keep_journal):
+            print(f"✓ {run.name} готова: {run.output_file_path}")
+        run.workbook = None
+
+    runs = []
+    refs_by_id = {}  # app_id -> [(run index, row_numbers)]
+    for path in paths:
+        workbook = open_comment_workbook(path)
+        if workbook is None:
+            continue
+
+        run = _WorkbookRun(path, output_path_for(path, output_dir), workbook)
+        file_tasks = run.load_tasks(resume)
+        index = len(runs)
+        runs.append(run)
+        region = region_from_path(path)
+        for row_numbers, app_id in file_tasks:
+            engine.regions.setdefault(app_id, region)
+            refs_by_id.setdefault(app_id, []).append((index, row_numbers))
+
+        print(f"{run.name}: строк {run.row_count}, заявок {len(file_tasks)}"
+              f"{f', из журнала {run.resumed_count}' if run.resumed_count else ''}")
+        if not run.unprocessed:
+            finish(run)
+
+    tasks = [(tuple(refs), app_id) for app_id, refs in refs_by_id.items()]
+    shared_count = sum(1 for refs, _ in tasks if len({index for index, _ in refs}) > 1)
+    print(f"Уникальных заявок во всех книгах: {len(tasks)}, из них встречаются в нескольких книгах: {shared_count}")
+    tasks = prioritize_tasks(tasks, lambda task: (runs[index].workbook.get_comment(row_number)
+                                                  for index, row_numbers in task[0] for row_number in row_numbers))
+
+    stop_event = None
+    if time_budget:
+        stop_event = BudgetEvent(time_budget)
+        print(f"Время запуска ограничено: {time_budget:.0f} с")
+
+    last_checkpoint = time.monotonic()
+    try:
+        for done, ((refs, app_id), conclusion) in enumerate(engine.run(tasks, requeue_failed, stop_event), 1):
+            if conclusion is None:
+                print(f"✗ Не удалось получить данные по заявке {app_id}")
+
+            # One conclusion per application, fanned out to every workbook and row that references it
+            for index, row_numbers in refs:
+                run = runs[index]
+                with engine.metrics.timer('write_seconds'):
+                    run.record(row_numbers, app_id, conclusion)
+                if not run.unprocessed:
+                    finish(run)
+
+            if done % 100 == 0 or done == len(tasks):
+                print(f"[{done}/{len(tasks)}] заявок обработано")
+
+            if checkpoint_interval and time.monotonic() - last_checkpoint >= checkpoint_interval:
+                for run in runs:
+                    if run.workbook is not None:
+                        run.checkpoint(engine.metrics)
+                print("Промежуточное сохранение незавершенных книг")
+                last_checkpoint = time.monotonic()
+
+        if stop_event is not None and stop_event.expired:
+            for run in runs:
+                if run.workbook is not None:
+                    run.mark_unprocessed()
+                    finish(run, keep_journal=True)
+    finally:
+        for run in runs:
+            run.journal.close()
+        if own_engine:
+            engine.close()
+        if profiler is not None:
+            profiler.stop()
+
+    elapsed = time.monotonic() - started
+    print("\n=== ИТОГИ ПАКЕТА ===")
+    for run in runs:
+        if run.elapsed is None:
+            print(f"{run.name}: не завершена")
+            continue
+        rate = run.row_count / run.elapsed if run.elapsed > 0 else 0
+        print(f"{run.name}: строк {run.row_count}, успешно {run.successful_count}, "
+              f"ошибок {run.failed_count}, из журнала {run.resumed_count}, "
+              f"готова через {run.elapsed:.1f} с ({rate:.1f} строк/с)"
+              f"{f', не обработано {run.unprocessed_rows}' if run.unprocessed_rows else ''}"
+              f"{'' if run.saved else ', НЕ СОХРАНЕНА'}")
 
-    # Save results with preserved formatting
+    total_rows = sum(run.row_count for run in runs)
+    print(f"Всего: книг {len(runs)}, строк {total_rows}, уникальных заявок {len(tasks)} "
+          f"(общих для нескольких книг {shared_count}) за {elapsed:.1f} с")
+    if elapsed > 0:
+        print(f"Пропускная способность: {total_rows / elapsed:.1f} строк/с, {len(tasks) / elapsed:.1f} заявок/с")
+
+
+def process_excel_sharded(excel_file_path, output_file_path=None, host='127.0.0.1', port=DEFAULT_COORDINATOR_PORT,
+                          shard_size=DEFAULT_SHARD_SIZE, lease_timeout=DEFAULT_LEASE_TIMEOUT, local_workers=0,
+                          resume=True, checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL, token=None,
+                          idle_timeout=None, **engine_options):
+    """
+    Coordinator of a sharded run: the unique application IDs of the workbook are split
+    into shards of shard_size, which workers on other hosts (run_shard_worker) claim
+    over HTTP from host:port and return conclusions for. The conclusions are merged
+    into the original workbook as shards complete, with the same journal and
+    checkpoints as process_workbook.
+    A worker that stops sending heartbeats for lease_timeout seconds loses its shard
+    to the next worker. local_workers starts that many worker processes on this
+    machine with engine_options (FetchEngine arguments).
+    Workers must send the shared token (a random one is made and printed when not
+    given). The default host only lets in workers on this machine.
+    The run gives up, saving what it has and keeping the journal, when its local
+    workers have all exited and no worker has been in touch for lease_timeout
+    seconds, or (also without local workers) for idle_timeout seconds.
+    Returns True when every shard was completed.
+    """
     if output_file_path is None:
         output_file_path = excel_file_path.replace('.xlsx', '_processed.xlsx')
 
+    workbook = open_comment_workbook(excel_file_path)
+    if workbook is None:
+        return
+
+    run = _WorkbookRun(excel_file_path, output_file_path, workbook)
+    run.load_tasks(resume)
+    rows_by_id = dict(run.unprocessed)
+    coordinator = ShardCoordinator(list(rows_by_id), shard_size=shard_size, lease_timeout=lease_timeout)
+    if not token:
+        token = secrets.token_urlsafe(16)
+        print(f"Токен для исполнителей (--token или {SHARD_TOKEN_ENV}): {token}")
+    server = serve_coordinator(coordinator, token, host, port)
+    print(f"Координатор: http://{host if host not in ('0.0.0.0', '') else socket.gethostname()}:"
+          f"{server.server_address[1]}, заявок {len(rows_by_id)}, шардов {len(coordinator.shards)}")
+
+    workers = []
+    for number in range(local_workers):
+        worker = multiprocessing.Process(target=run_shard_worker,
+                                         args=(f"http://127.0.0.1:{server.server_address[1]}", token),
+                                         kwargs=dict(engine_options, worker_id=f"local-{number + 1}"))
+        worker.start()
+        workers.append(worker)
+
+    abandoned = False
+    last_checkpoint = time.monotonic()
+    last_report = time.monotonic()
     try:
-        # Try to preserve original formatting
-        formatting_preserved = preserve_excel_formatting(excel_file_path, output_file_path, df)
+        while not coordinator.finished or coordinator.completed:
+            if not coordinator.completed:
+                idle = coordinator.idle_seconds
+                if workers and not any(worker.is_alive() for worker in workers) and idle > lease_timeout:
+                    print("Ошибка: все локальные исполнители завершились, а другие исполнители не подключены")
+                    abandoned = True
+                    break
+                if idle_timeout and idle > idle_timeout:
+                    print(f"Ошибка: исполнители не выходили на связь {idle_timeout:.0f} с")
+                    abandoned = True
+                    break
+                time.sleep(0.5)
+                if time.monotonic() - last_report >= 30:
+                    status = coordinator.status()
+                    print(f"Шарды: готово {status['done']}/{status['shards']}, "
+                          f"в работе {status['leased']}, в очереди {status['pending']}")
+                    last_report = time.monotonic()
+                continue
 
-        if not formatting_preserved:
-            print("Warning: Could not preserve original formatting, saving as new file...")
-            # Fallback: save without formatting preservation
-            df.to_excel(output_file_path, index=False, engine='openpyxl')
+            shard, worker, results = coordinator.completed.popleft()
+            for app_id in coordinator.shards[shard]:
+                run.record(rows_by_id[app_id], app_id, results.get(app_id))
+            print(f"✓ Шард {shard + 1}/{len(coordinator.shards)} от {worker}: "
+                  f"успешно {run.successful_count}, ошибок {run.failed_count}")
 
-        print(f"\\n=== РЕЗУЛЬТАТЫ ===")
-        print(f"Успешно обработано: {successful_count}")
-        print(f"Ошибок: {failed_count}")
-        print(f"Результаты сохранены в: {output_file_path}")
+            if checkpoint_interval and time.monotonic() - last_checkpoint >= checkpoint_interval:
+                if run.checkpoint():
+                    print(f"Промежуточное сохранение: {output_file_path}")
+                last_checkpoint = time.monotonic()
+    finally:
+        run.journal.close()
+        # Local workers see "done" on their next claim and exit by themselves
+        for worker in workers:
+            worker.join(timeout=30)
+            if worker.is_alive():
+                worker.terminate()
+        server.shutdown()
 
-        if formatting_preserved:
-            print("✓ Оригинальное форматирование сохранено")
-        else:
-            print("⚠️ Форматирование не сохранено")
+    if run.save(keep_journal=abandoned):
+        run.print_summary()
+        if abandoned:
+            status = coordinator.status()
+            print(f"Обработка не завершена: готово шардов {status['done']} из {status['shards']}, "
+                  f"журнал сохранен для продолжения")
+    return not abandoned
+
+
+def run_shard_worker(coordinator_url, token, worker_id=None, **engine_options):
+    """
+    Worker of a sharded run: claim shards from the coordinator at coordinator_url
+    (authenticating with its shared token), fetch and analyze them with a local
+    FetchEngine and send the conclusions back, until the coordinator reports that
+    every shard is done.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    client = CoordinatorClient(coordinator_url, token)
+    engine = FetchEngine(**engine_options)
+    unreachable_since = None
+
+    try:
+        while True:
+            try:
+                reply = client.claim(worker_id)
+                unreachable_since = None
+            except requests.RequestException as e:
+                if unreachable_since is None:
+                    unreachable_since = time.monotonic()
+                elif time.monotonic() - unreachable_since > 60:
+                    print(f"[{worker_id}] Координатор недоступен, работа завершена: {e}")
+                    break
+                time.sleep(2)
+                continue
+
+            if reply.get('done'):
+                print(f"[{worker_id}] Все шарды обработаны")
+                break
+            if 'shard' not in reply:
+                time.sleep(1)
+                continue
+
+            shard = reply['shard']
+            tasks = [(None, app_id) for app_id in reply['app_ids']]
+            with Heartbeat(client, shard, worker_id, interval=max(1, reply['lease_timeout'] / 3)):
+                results = {app_id: conclusion for (_, app_id), conclusion in engine.run(tasks)}
+
+            try:
+                if not client.complete(shard, worker_id, results).get('ok'):
+                    print(f"[{worker_id}] Шард {shard + 1} отклонен: аренда истекла")
+            except requests.RequestException as e:
+                # The lease runs out and the shard goes to another worker
+                print(f"[{worker_id}] Не удалось отправить шард {shard + 1}: {e}")
+    finally:
+        engine.close()
+        client.close()
 
-    except Exception as e:
-        print(f"Ошибка сохранения файла: {e}")
 
 def main():
-    excel_file = "Павлодарская область_Апрель_75.xlsx"
-    output_file = "Павлодарская область_Апрель_75_processed.xlsx"
+    parser = argparse.ArgumentParser(description="Заполнение комментариев АО НИТ по заявкам из книг Excel")
+    parser.add_argument('inputs', nargs='*', default=["Павлодарская область_Апрель_75.xlsx"],
+                        help="книги Excel, папки или шаблоны (несколько книг обрабатываются одним пакетом)")
+    parser.add_argument('--output-dir', help="папка для результатов (по умолчанию рядом с исходными книгами)")
+    parser.add_argument('--workers', type=int, default=DEFAULT_MAX_WORKERS, help="потоков загрузки")
+    parser.add_argument('--rps', type=float, default=DEFAULT_REQUESTS_PER_SECOND, help="запросов в секунду")
+    parser.add_argument('--fixed-rate', action='store_true', help="не подстраивать скорость запросов")
+    parser.add_argument('--parallel-analysis', action='store_true', help="анализ страниц в отдельных процессах")
+    parser.add_argument('--no-cache', action='store_true', help="не использовать кэш страниц")
+    parser.add_argument('--fresh', action='store_true', help="не продолжать прерванный запуск")
+    parser.add_argument('--error-mapping', help="файл \"текст ошибки - ответственный\"")
+    parser.add_argument('--replay', action='store_true', help="повторный анализ из архива страниц, без сервера")
+    parser.add_argument('--streaming', action='store_true', help="потоковый режим для одной очень большой книги")
+    parser.add_argument('--metrics', metavar='PREFIX', help="сохранить метрики в PREFIX.json и PREFIX.prom")
+    parser.add_argument('--profile', metavar='DIR', help=f"профилировать запуск в папку DIR (или {PROFILE_ENV})")
+    parser.add_argument('--no-store', action='store_true', help="не сохранять результаты в хранилище")
+    parser.add_argument('--from-store', action='store_true',
+                        help="заполнить книги последними результатами из хранилища, без сервера")
+    parser.add_argument('--base-url', default=BASE_URL, help="адрес страницы заявки без appId")
+    parser.add_argument('--endpoint', action='append', metavar='URL',
+                        help="адрес зеркала сервера без appId; можно указать несколько раз вместо --base-url")
+    parser.add_argument('--balance', choices=EndpointPool.STRATEGIES, default='least_outstanding',
+                        help="распределение запросов между зеркалами")
+    parser.add_argument('--coordinator', action='store_true', help="раздавать шарды заявок исполнителям (--worker)")
+    parser.add_argument('--port', type=int, default=DEFAULT_COORDINATOR_PORT, help="порт координатора")
+    parser.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE, help="заявок в шарде")
+    parser.add_argument('--local-workers', type=int, default=0, help="исполнителей на этой машине")
+    parser.add_argument('--worker', metavar='URL', help="работать исполнителем координатора по адресу URL")
+    parser.add_argument('--host', default='127.0.0.1',
+                        help="адрес координатора (0.0.0.0, чтобы принимать исполнителей с других машин)")
+    parser.add_argument('--token', default=os.environ.get(SHARD_TOKEN_ENV),
+                        help=f"общий токен координатора и исполнителей (или {SHARD_TOKEN_ENV})")
+    parser.add_argument('--idle-timeout', type=float, metavar='SEC',
+                        help="координатору: остановиться, если исполнители не выходят на связь SEC секунд")
+    parser.add_argument('--watch', action='store_true',
+                        help="наблюдение: перепроверять незавершенные заявки по расписанию, пока не остановят")
+    parser.add_argument('--cycles', type=int, help="в режиме наблюдения: остановиться после N циклов проверки")
+    parser.add_argument('--time-budget', type=float, metavar='MIN',
+                        help="ограничить запуск MIN минутами: сначала важные строки, остальные отмечаются")
+    args = parser.parse_args()
+
+    engine_options = dict(max_workers=args.workers, requests_per_second=args.rps, adaptive_rate=not args.fixed_rate,
+                          parallel_analysis=args.parallel_analysis,
+                          cache_path=None if args.no_cache else DEFAULT_CACHE_PATH,
+                          error_mapping_path=args.error_mapping, replay=args.replay, base_url=args.base_url,
+                          metrics_path=args.metrics, store_path=None if args.no_store else DEFAULT_STORE_PATH,
+                          endpoints=args.endpoint, balance=args.balance)
+
+    time_budget = args.time_budget * 60 if args.time_budget else None
+
+    if args.worker:
+        if not args.token:
+            print(f"Ошибка: исполнителю нужен токен координатора (--token или {SHARD_TOKEN_ENV})")
+            return
+        run_shard_worker(args.worker, args.token, **engine_options)
+        return
 
     print("=== ОБРАБОТКА EXCEL С ДИНАМИЧЕСКИМ ПОЛУЧЕНИЕМ HTML ===")
-    process_excel_with_dynamic_fetch(excel_file, output_file)
+    paths = find_workbooks(args.inputs)
+    if args.from_store:
+        for path in paths:
+            fill_workbook_from_store(path, output_path_for(path, args.output_dir))
+    elif args.watch:
+        # watcher builds on this module, so it is imported only here
+        from watcher import watch_workbooks
+
+        try:
+            watch_workbooks(args.inputs, output_dir=args.output_dir, max_cycles=args.cycles, **engine_options)
+        except KeyboardInterrupt:
+            print("Наблюдение остановлено")
+    elif args.coordinator:
+        if len(paths) != 1:
+            print("Ошибка: координатор обрабатывает ровно одну книгу")
+            return
+        process_excel_sharded(paths[0], output_path_for(paths[0], args.output_dir), host=args.host, port=args.port,
+                              token=args.token, shard_size=args.shard_size, local_workers=args.local_workers,
+                              idle_timeout=args.idle_timeout, resume=not args.fresh, **engine_options)
+    elif len(paths) == 1:
+        output_file = output_path_for(paths[0], args.output_dir)
+        process_excel_with_dynamic_fetch(paths[0], output_file, resume=not args.fresh, streaming=args.streaming,
+                                          profile_dir=args.profile, time_budget=time_budget, **engine_options)
+    else:
+        process_batch(paths, output_dir=args.output_dir, resume=not args.fresh, profile_dir=args.profile,
+                      time_budget=time_budget, **engine_options)
 
 
 
@@ -0,0 +1,686 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import BYTES_BUCKETS
+
+
+def create_session(pool_size=10):
+    """
+    Create a requests.Session whose keep-alive connection pool is shared by all fetch workers.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class RateLimiter:
+    """
+    Global requests-per-second cap shared between worker threads.
+    Each call to acquire() reserves the next free send slot and sleeps until it comes;
+    with a deadline (time.monotonic()) it returns False instead of sleeping past it.
+    """
+
+    def __init__(self, requests_per_second):
+        self.requests_per_second = requests_per_second
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+
+    def acquire(self, deadline=None):
+        if not self.requests_per_second or self.requests_per_second <= 0:
+            return True
+
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_slot, now)
+            if deadline is not None and slot >= deadline:
+                return False
+            self._next_slot = slot + 1.0 / self.requests_per_second
+
+        wait = slot - now
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of a list of numbers (fraction is 0..1). Returns None for an empty list.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[rank]
+
+
+# Default ceiling of the adaptive rate
+DEFAULT_MAX_RATE = 50.0
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """
+    AIMD rate limiter: raises the rate by a fixed step while the server stays healthy
+    and cuts it by a factor as soon as it sees timeouts, 5xx responses or slow answers.
+    The current rate and recent p50/p95 latency are printed after every adjustment.
+    The rate never rises above max_rate, by default DEFAULT_MAX_RATE or the starting
+    rate if that is higher.
+    """
+
+    def __init__(self, requests_per_second, min_rate=1.0, max_rate=None,
+                 increase_step=1.0, decrease_factor=0.5, target_latency=1.0,
+                 adjust_interval=2.0, window_size=200):
+        super().__init__(requests_per_second)
+        self.min_rate = min_rate
+        self.max_rate = max_rate if max_rate is not None else max(DEFAULT_MAX_RATE, requests_per_second or 0)
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.target_latency = target_latency
+        self.adjust_interval = adjust_interval
+        self.window_size = window_size
+
+        self._latencies = deque(maxlen=window_size)
+        self._errors = 0
+        self._samples = 0
+        self._last_adjust = time.monotonic()
+
+    def observe(self, latency, failed=False):
+        """
+        Record the outcome of one request. failed should be True for timeouts,
+        connection errors and 5xx responses.
+        """
+        with self._lock:
+            if latency is not None:
+                self._latencies.append(latency)
+            self._samples += 1
+            if failed:
+                self._errors += 1
+
+            now = time.monotonic()
+            # Back off immediately on errors, otherwise adjust once per interval
+            if not failed and now - self._last_adjust < self.adjust_interval:
+                return
+            if failed and now - self._last_adjust < self.adjust_interval / 4:
+                return
+
+            p50 = percentile(self._latencies, 0.5)
+            p95 = percentile(self._latencies, 0.95)
+            old_rate = self.requests_per_second
+
+            if self._errors or (p95 is not None and p95 > self.target_latency):
+                new_rate = max(self.min_rate, old_rate * self.decrease_factor)
+                # Judge the next interval only by answers received at the new rate
+                self._latencies.clear()
+            else:
+                new_rate = min(self.max_rate, old_rate + self.increase_step)
+
+            errors = self._errors
+            samples = self._samples
+            self.requests_per_second = new_rate
+            self._errors = 0
+            self._samples = 0
+            self._last_adjust = now
+
+        p50_text = f"{p50 * 1000:.0f}" if p50 is not None else "-"
+        p95_text = f"{p95 * 1000:.0f}" if p95 is not None else "-"
+        print(f"Скорость: {new_rate:.1f} запр/с (было {old_rate:.1f}), "
+              f"задержка p50={p50_text} мс, p95={p95_text} мс, ошибок {errors}/{samples}")
+
+
+# Error classes that mean the server itself is in trouble
+SERVER_FAILURES = ('timeout', 'connection', 'server')
+
+
+def classify_error(error):
+    """
+    Sort a requests exception into a class the retry layer handles separately:
+    'timeout', 'connection', 'throttled' (429), 'server' (5xx), 'client' (other 4xx) or 'other'.
+    """
+    # ConnectTimeout is both a Timeout and a ConnectionError, so check timeouts first
+    if isinstance(error, requests.exceptions.Timeout):
+        return 'timeout'
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return 'connection'
+
+    response = getattr(error, 'response', None)
+    if response is not None:
+        if response.status_code == 429:
+            return 'throttled'
+        if response.status_code >= 500:
+            return 'server'
+        if response.status_code >= 400:
+            return 'client'
+    return 'other'
+
+
+class RetryPolicy:
+    """
+    Which error classes are retried, how many times, and how long to wait in between.
+    Waits grow exponentially with jitter; a Retry-After header from the server wins.
+    Timeouts are retried with a longer timeout each time.
+    """
+
+    def __init__(self, max_retries=3, backoff_base=0.5, backoff_max=30.0, timeout_growth=1.5,
+                 retry_on=('timeout', 'connection', 'server', 'throttled')):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout_growth = timeout_growth
+        self.retry_on = retry_on
+
+    def should_retry(self, kind, attempt):
+        return kind in self.retry_on and attempt < self.max_retries
+
+    def backoff(self, attempt, error=None):
+        response = getattr(error, 'response', None)
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return min(self.backoff_max, float(retry_after))
+
+        # "Equal jitter": half the exponential step is fixed, half is random
+        step = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        return step / 2 + random.uniform(0, step / 2)
+
+    def next_timeout(self, timeout):
+        return timeout * self.timeout_growth
+
+
+class CircuitBreaker:
+    """
+    Stops all workers from sending requests after failure_threshold consecutive server
+    failures. After reset_timeout seconds a single probe request is let through; if it
+    succeeds the breaker closes and everyone resumes, otherwise it stays open.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._condition = threading.Condition()
+
+    def wait(self, deadline=None):
+        """
+        Block until a request may be sent. Returns False if deadline (time.monotonic())
+        passes first.
+        """
+        with self._condition:
+            while True:
+                if self.state == 'closed':
+                    return True
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    return False
+                if self.state == 'open':
+                    remaining = self._opened_at + self.reset_timeout - now
+                    if remaining <= 0:
+                        # This caller becomes the probe
+                        self.state = 'half_open'
+                        print("Пробный запрос к серверу после паузы...")
+                        return True
+                else:
+                    # A probe is in flight, wait for its outcome
+                    remaining = self.reset_timeout
+                if deadline is not None:
+                    remaining = min(remaining, deadline - now)
+                self._condition.wait(remaining)
+
+    def record_success(self):
+        with self._condition:
+            if self.state != 'closed':
+                print("Сервер снова отвечает, обработка продолжается")
+            self.state = 'closed'
+            self._failures = 0
+            self._condition.notify_all()
+
+    def record_failure(self):
+        with self._condition:
+            self._failures += 1
+            if self.state == 'half_open' or (self.state == 'closed' and self._failures >= self.failure_threshold):
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+                print(f"Сервер не отвечает ({self._failures} ошибок подряд), "
+                      f"запросы приостановлены на {self.reset_timeout:.0f} с")
+            self._condition.notify_all()
+
+
+class Endpoint:
+    """
+    One mirror of the page server: its base URL (the page URL without the appId), its
+    own keep-alive connection pool and its health and load as seen by EndpointPool.
+    """
+
+    def __init__(self, base_url, pool_size=10, cooldown=10.0):
+        self.base_url = base_url
+        self.name = urlparse(base_url).netloc or base_url
+        self.session = create_session(pool_size=pool_size)
+        self.outstanding = 0
+        self.latency = None      # moving average of the answer time, seconds
+        self.failures = 0        # server failures in a row
+        self.down_until = 0.0
+        self.cooldown = cooldown
+        self.requests = 0
+        self.errors = 0
+
+    def available(self, now):
+        return self.down_until <= now
+
+
+class EndpointPool:
+    """
+    Spreads requests over several mirrors of the page server.
+
+    acquire() picks an available endpoint by strategy: 'least_outstanding' (fewest
+    requests in flight, then the faster one) or 'latency' (lowest moving-average
+    answer time scaled by the requests in flight). Every request reports back with
+    release().
+
+    Passive health check: failure_threshold server failures in a row take an endpoint
+    out for cooldown seconds, doubling up to max_cooldown while it keeps failing;
+    after that one request tries it again. Active health check: every
+    check_interval seconds (0 disables it) each endpoint's base URL is requested;
+    a failed check counts as a server failure, and any answer below 500 ends the
+    cooldown of a down endpoint early, so its trial request is sent at once.
+
+    When every endpoint is down, acquire() waits for the first one to come back,
+    like CircuitBreaker does for a single server.
+    """
+
+    STRATEGIES = ('least_outstanding', 'latency')
+
+    def __init__(self, base_urls, strategy='least_outstanding', pool_size=10, failure_threshold=3,
+                 cooldown=10.0, max_cooldown=120.0, check_interval=15.0, check_timeout=3.0,
+                 latency_smoothing=0.2, metrics=None):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown balancing strategy: {strategy}")
+        if not base_urls:
+            raise ValueError("EndpointPool needs at least one base URL")
+        self.endpoints = [Endpoint(base_url, pool_size, cooldown) for base_url in base_urls]
+        self.strategy = strategy
+        self.failure_threshold = failure_threshold
+        self.initial_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        self.latency_smoothing = latency_smoothing
+        self.metrics = metrics
+
+        self._condition = threading.Condition()
+        self._all_down = False
+        self._stop = threading.Event()
+        self._checker = None
+        if check_interval:
+            self._checker = threading.Thread(target=self._check_loop, daemon=True)
+            self._checker.start()
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    def _load(self, endpoint):
+        if self.strategy == 'latency':
+            return ((endpoint.latency or 0.0) * (endpoint.outstanding + 1), endpoint.outstanding)
+        return (endpoint.outstanding, endpoint.latency or 0.0)
+
+    def _pick(self, avoid):
+        # Callers hold self._condition
+        now = time.monotonic()
+        # An endpoint back from a cooldown gets a single trial request before the others follow
+        candidates = [endpoint for endpoint in self.endpoints if endpoint.available(now)
+                      and (endpoint.failures < self.failure_threshold or endpoint.outstanding == 0)]
+        if avoid is not None and len(candidates) > 1:
+            candidates = [endpoint for endpoint in candidates if endpoint is not avoid]
+        if not candidates:
+            return None
+        endpoint = min(candidates, key=self._load)
+        endpoint.outstanding += 1
+        endpoint.requests += 1
+        return endpoint
+
+    def acquire(self, avoid=None, deadline=None):
+        """
+        Reserve an endpoint for one request, other than avoid if another one is
+        available. Blocks while all endpoints are down, but returns None once
+        deadline (time.monotonic()) passes.
+        """
+        with self._condition:
+            while True:
+                endpoint = self._pick(avoid)
+                if endpoint is not None:
+                    if self._all_down:
+                        self._all_down = False
+                        print(f"Запросы продолжаются через {endpoint.name}")
+                    return endpoint
+                if not self._all_down:
+                    self._all_down = True
+                    print("Все серверы недоступны, запросы приостановлены")
+                # Woken by release() or a health check, or when the first cooldown ends
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    return None
+                wake_at = min(endpoint.down_until for endpoint in self.endpoints)
+                if deadline is not None:
+                    wake_at = min(wake_at, deadline)
+                self._condition.wait(max(wake_at - now, 0.05))
+
+    def try_acquire(self, avoid=None):
+        """
+        Like acquire(), but returns None instead of waiting, or when only avoid is available.
+        """
+        with self._condition:
+            endpoint = self._pick(avoid)
+            if endpoint is avoid and endpoint is not None:
+                endpoint.outstanding -= 1
+                endpoint.requests -= 1
+                return None
+            return endpoint
+
+    def release(self, endpoint, latency, failed):
+        """
+        Report the outcome of a request sent to endpoint: its answer time (None for
+        timeouts) and whether it was a server failure.
+        """
+        with self._condition:
+            endpoint.outstanding -= 1
+            self._record(endpoint, latency, failed)
+            self._condition.notify_all()
+
+    def _record(self, endpoint, latency, failed):
+        # Callers hold self._condition
+        if failed:
+            endpoint.errors += 1
+            endpoint.failures += 1
+            if endpoint.failures >= self.failure_threshold and endpoint.available(time.monotonic()):
+                endpoint.down_until = time.monotonic() + endpoint.cooldown
+                print(f"Сервер {endpoint.name} исключен на {endpoint.cooldown:.0f} с "
+                      f"({endpoint.failures} ошибок подряд)")
+                endpoint.cooldown = min(endpoint.cooldown * 2, self.max_cooldown)
+            return
+
+        if latency is not None:
+            if endpoint.latency is None:
+                endpoint.latency = latency
+            else:
+                endpoint.latency += self.latency_smoothing * (latency - endpoint.latency)
+        if endpoint.failures >= self.failure_threshold:
+            print(f"Сервер {endpoint.name} снова отвечает")
+        endpoint.failures = 0
+        endpoint.down_until = 0.0
+        endpoint.cooldown = self.initial_cooldown
+
+    def _check_loop(self):
+        while not self._stop.wait(self.check_interval):
+            for endpoint in self.endpoints:
+                self.check(endpoint)
+
+    def check(self, endpoint):
+        """
+        Active health check of one endpoint: request its base URL; any answer below 500 means it is alive.
+        """
+        started = time.monotonic()
+        try:
+            response = endpoint.session.get(endpoint.base_url, timeout=self.check_timeout)
+            failed = response.status_code >= 500
+            response.close()
+        except requests.exceptions.RequestException:
+            failed = True
+        latency = time.monotonic() - started
+        if self.metrics is not None:
+            self.metrics.count('health_checks_total', endpoint=endpoint.name, result='fail' if failed else 'ok')
+        with self._condition:
+            if failed:
+                self._record(endpoint, None, True)
+            elif not endpoint.available(time.monotonic()):
+                # The server answers again: end the cooldown early, the next request is its trial
+                endpoint.down_until = 0.0
+                self._condition.notify_all()
+        return not failed
+
+    def summary(self):
+        """
+        One line per endpoint: requests, errors, average answer time and state.
+        """
+        now = time.monotonic()
+        lines = []
+        for endpoint in self.endpoints:
+            latency = f"{endpoint.latency * 1000:.0f} мс" if endpoint.latency is not None else "-"
+            state = "доступен" if endpoint.available(now) else "исключен"
+            lines.append(f"{endpoint.name}: запросов {endpoint.requests}, ошибок {endpoint.errors}, "
+                         f"ответ {latency}, {state}")
+        return lines
+
+    def close(self):
+        self._stop.set()
+        if self._checker is not None:
+            self._checker.join()
+        for endpoint in self.endpoints:
+            endpoint.session.close()
+
+
+class BudgetExpired(Exception):
+    """
+    Raised by Fetcher.fetch when a request could not be sent or retried before its deadline.
+    """
+
+
+class Fetcher:
+    """
+    Fetches pages through a shared session, applying the rate limiter, retry policy,
+    circuit breaker and optional hedging. Without a retry policy a failed request is
+    given up after the first attempt.
+    If hedge_after is set, a second identical request is sent when the first has not
+    answered within that many seconds, and whichever answers first is used. The second
+    request waits for its own rate limiter slot and is skipped if none comes before
+    the first one would time out.
+    With metrics (metrics.RunMetrics), request latency, bytes received, errors by
+    kind and retries are recorded.
+    With endpoints (an EndpointPool), fetch() takes the URL part after the base URL
+    (the appId) and sends each attempt to an endpoint picked by the pool, using its
+    connection pool; a retry after a server failure goes straight to another endpoint,
+    and a hedge request goes to a different one when there is one. The pool's health
+    checks then take the place of a circuit breaker.
+    With a deadline, fetch() starts no attempt, retry or wait that would run past it
+    and raises BudgetExpired instead, so only a request already sent can outlast it
+    (by at most its timeout).
+    """
+
+    def __init__(self, session=None, limiter=None, retry_policy=None, breaker=None,
+                 hedge_after=None, timeout=5, hedge_workers=16, metrics=None, endpoints=None):
+        self.session = session if session is not None else requests
+        self.endpoints = endpoints
+        self.limiter = limiter
+        self.retry_policy = retry_policy
+        self.breaker = breaker
+        self.hedge_after = hedge_after
+        self.timeout = timeout
+        self.metrics = metrics
+        self._hedge_pool = ThreadPoolExecutor(max_workers=hedge_workers) if hedge_after else None
+
+    def fetch(self, url, deadline=None):
+        """
+        Fetch HTML from URL (with endpoints: from the part of the URL after the base
+        URL). Returns HTML content or None if all attempts failed; raises
+        BudgetExpired if deadline (time.monotonic()) came first.
+        """
+        observe = getattr(self.limiter, 'observe', None)
+        timeout = self.timeout
+        attempt = 0
+        endpoint = None
+
+        while True:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise self._out_of_time(url)
+            if self.breaker is not None and not self.breaker.wait(deadline):
+                raise self._out_of_time(url)
+            if self.limiter is not None and not self.limiter.acquire(deadline):
+                raise self._out_of_time(url)
+            if self.endpoints is not None:
+                endpoint = self.endpoints.acquire(avoid=endpoint, deadline=deadline)
+                if endpoint is None:
+                    raise self._out_of_time(url)
+
+            started = time.monotonic()
+            try:
+                text = self._get(url, timeout, endpoint, deadline)
+            except requests.exceptions.RequestException as e:
+                kind = classify_error(e)
+                if self.metrics is not None:
+                    self.metrics.count('request_errors_total', kind=kind)
+                if observe:
+                    latency = None if kind == 'timeout' else time.monotonic() - started
+                    observe(latency, failed=kind in SERVER_FAILURES or kind == 'throttled')
+                if self.breaker is not None:
+                    # Any answer from the server, even a 404, proves it is alive
+                    if kind in SERVER_FAILURES:
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.record_success()
+
+                if self.retry_policy is not None and self.retry_policy.should_retry(kind, attempt):
+                    if endpoint is not None and kind in SERVER_FAILURES and len(self.endpoints) > 1:
+                        # Fail over to another mirror at once instead of waiting for this one
+                        delay = 0.0
+                        print(f"Повтор {attempt + 1}/{self.retry_policy.max_retries} на другом сервере "
+                              f"({kind} от {endpoint.name}): {url}")
+                    else:
+                        delay = self.retry_policy.backoff(attempt, e)
+                        if deadline is not None and time.monotonic() + delay >= deadline:
+                            raise self._out_of_time(url)
+                        print(f"Повтор {attempt + 1}/{self.retry_policy.max_retries} через {delay:.1f} с "
+                              f"({kind}): {url}")
+                    if kind == 'timeout':
+                        timeout = self.retry_policy.next_timeout(timeout)
+                    if self.metrics is not None:
+                        self.metrics.count('retries_total')
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+
+                if kind == 'timeout':
+                    print(f"Timeout ({timeout}s) exceeded for URL: {url}")
+                else:
+                    print(f"Error fetching {url}: {e}")
+                return None
+
+            latency = time.monotonic() - started
+            if observe:
+                observe(latency)
+            if self.metrics is not None:
+                self.metrics.observe('request_seconds', latency)
+            if self.breaker is not None:
+                self.breaker.record_success()
+            return text
+
+    def _out_of_time(self, url):
+        print(f"Время запуска истекает, заявка не загружена: {url}")
+        if self.metrics is not None:
+            self.metrics.count('deadline_skips_total')
+        return BudgetExpired(url)
+
+    def close(self):
+        if self._hedge_pool is not None:
+            self._hedge_pool.shutdown(wait=False)
+
+    def _request(self, url, timeout, endpoint=None):
+        if endpoint is None:
+            response = self.session.get(url, timeout=timeout)
+        else:
+            response = self._endpoint_request(url, timeout, endpoint)
+        response.raise_for_status()
+        if self.metrics is not None:
+            size = len(response.content)
+            self.metrics.count('bytes_received_total', size)
+            self.metrics.observe('page_bytes', size, buckets=BYTES_BUCKETS)
+        return response.text
+
+    def _endpoint_request(self, url, timeout, endpoint):
+        """
+        Send one request to endpoint and report its outcome to the pool.
+        """
+        started = time.monotonic()
+        latency = None
+        failed = True
+        try:
+            response = endpoint.session.get(endpoint.base_url + url, timeout=timeout)
+            latency = time.monotonic() - started
+            failed = response.status_code >= 500
+            return response
+        except requests.exceptions.RequestException as e:
+            if classify_error(e) != 'timeout':
+                latency = time.monotonic() - started
+            raise
+        finally:
+            self.endpoints.release(endpoint, latency, failed)
+            if self.metrics is not None:
+                self.metrics.count('endpoint_requests_total', endpoint=endpoint.name)
+                if failed:
+                    self.metrics.count('endpoint_failures_total', endpoint=endpoint.name)
+                elif latency is not None:
+                    self.metrics.observe('endpoint_request_seconds', latency, endpoint=endpoint.name)
+
+    def _hedge_request(self, url, timeout, endpoint):
+        """
+        Send a hedge request and report its outcome to an adaptive limiter, which
+        sees the first request through fetch() but would otherwise miss this one.
+        """
+        observe = getattr(self.limiter, 'observe', None)
+        started = time.monotonic()
+        try:
+            text = self._request(url, timeout, endpoint)
+        except requests.exceptions.RequestException as e:
+            kind = classify_error(e)
+            if observe:
+                latency = None if kind == 'timeout' else time.monotonic() - started
+                observe(latency, failed=kind in SERVER_FAILURES or kind == 'throttled')
+            raise
+        if observe:
+            observe(time.monotonic() - started)
+        return text
+
+    def _get(self, url, timeout, endpoint=None, deadline=None):
+        if self._hedge_pool is None:
+            return self._request(url, timeout, endpoint)
+
+        started = time.monotonic()
+        primary = self._hedge_pool.submit(self._request, url, timeout, endpoint)
+        done, _ = wait([primary], timeout=self.hedge_after)
+        if done:
+            return primary.result()
+
+        # Slow tail request: race a second copy against it, on another mirror if there is one.
+        # The copy takes its own rate limiter slot, and is not sent if none comes before the
+        # first request times out anyway.
+        hedge_deadline = started + timeout
+        if deadline is not None:
+            hedge_deadline = min(hedge_deadline, deadline)
+        if time.monotonic() >= hedge_deadline:
+            return primary.result()
+        if self.limiter is not None and not self.limiter.acquire(hedge_deadline):
+            return primary.result()
+        if primary.done():
+            return primary.result()
+        hedge_endpoint = None
+        if endpoint is not None:
+            hedge_endpoint = (self.endpoints.try_acquire(avoid=endpoint)
+                              or self.endpoints.acquire(deadline=hedge_deadline))
+            if hedge_endpoint is None:
+                return primary.result()
+        if self.metrics is not None:
+            self.metrics.count('hedges_total')
+        hedge = self._hedge_pool.submit(self._hedge_request, url, timeout, hedge_endpoint)
+        last_error = None
+        for future in as_completed([primary, hedge]):
+            try:
+                return future.result()
+            except requests.exceptions.RequestException as e:
+                last_error = e
+        raise last_error
@@ -1,5 +1,7 @@
 from datetime import datetime
 
+import status_rules
+
 
 def checkChanges(historyTable):
     """Legacy function - prints all changes data."""
@@ -82,13 +84,17 @@ def load_error_mapping(filepath):
             if ' - ' in line:
                 error_text, owner = line.strip().split(' - ', 1)
                 error_mapping[error_text.strip()] = owner.strip()
-                print(error_text)
-                print(owner)
-                print(error_mapping)
     return error_mapping
 
 
 def find_error_owner(error_message, error_mapping):
+    """
+    Find the owner of an error. error_mapping is either the dict from load_error_mapping
+    (scanned entry by entry) or an error_owners.ErrorOwnerMatcher built from it.
+    """
+    if hasattr(error_mapping, 'find_owner'):
+        return error_mapping.find_owner(error_message)
+
     for error_text, owner in error_mapping.items():
         if error_text in error_message:
             return owner
@@ -141,25 +147,10 @@ def checkStatusDeadline(status_create_date, deadline):
     """
     Check if status was created before deadline.
     """
-    try:
-        if not status_create_date or not deadline:
-            return False
-
-        # Skip non-date entries like "currentState"
-        if not status_create_date.replace('-', '').replace(':', '').replace('.', '').replace(' ', '').isdigit():
-            return False
+    return status_rules.status_before_deadline(status_create_date, deadline)
 
-        # Parse both dates
-        status_date = datetime.strptime(status_create_date, "%Y-%m-%d %H:%M:%S.%f")
-        deadline_date = datetime.strptime(deadline, "%Y-%m-%d %H:%M:%S.%f")
 
-        return status_date <= deadline_date
-    except Exception as e:
-        print(f"Error checking status deadline: {e}")
-        return False
-
-
-def checkTechnicalErrors(soup):
+def checkTechnicalErrors(soup, owners=None):
     """
     Check for technical errors in the notification queue table.
     Returns a string with error information or empty string if no errors.
@@ -203,18 +194,28 @@ def checkTechnicalErrors(soup):
                 if queue_type in ['2', '4'] and last_error:
                     error_messages.append(last_error)
 
-        # Format error messages
-        if error_messages:
-            result = ". Однако ошибка - " + error_messages[0] + " ."
-            for additional_error in error_messages[1:]:
-                result += "А также ошибка - " + additional_error + " ."
-            return result
-
-        return ""
+        return formatTechnicalErrors(error_messages, owners)
     except Exception as e:
         return f"Ошибка при проверке технических ошибок: {e}"
 
 
+def formatTechnicalErrors(error_messages, owners=None):
+    """
+    Format LastError messages from the notification queue into the conclusion suffix.
+    With an owner matcher (error_owners.ErrorOwnerMatcher), each error names its owner.
+    """
+    if owners is not None:
+        error_messages = [f"{message} (ответственный: {owners.find_owner(message)})" for message in error_messages]
+
+    if error_messages:
+        result = ". Однако ошибка - " + error_messages[0] + " ."
+        for additional_error in error_messages[1:]:
+            result += "А также ошибка - " + additional_error + " ."
+        return result
+
+    return ""
+
+
 def analyzeStatusSequence(historyTable, soup):
     """
     Analyze the sequence of statuses and return appropriate conclusion text.
@@ -238,79 +239,24 @@ def analyzeStatusSequence(historyTable, soup):
     if not statuses:
         return "Нет данных о статусах"
 
-    # Count occurrences of each status type
-    accepted_count = statuses.count('ACCEPTED')
-    launched_count = statuses.count('LAUNCHED')
-
     # Get deadline from main table
     deadline = getDeadlineFromMainTable(soup)
 
-    # Check for priority statuses (STARTED, FINISHED, READY, HANDED, CANCELED)
-    # These override all previous logic
-    priority_statuses = ['STARTED', 'FINISHED', 'READY', 'HANDED', 'CANCELED']
-
-    # If any priority status is present, use that logic
-    for status in reversed(statuses):  # Check from last to first
-        if status in priority_statuses:
-            if status == 'STARTED':
-                return "ГУ на исполнении"
-            elif status in ['FINISHED', 'READY', 'HANDED']:
-                # Find the FIRST occurrence of any final status for deadline checking
-                first_final_index = -1
-                for i, s in enumerate(statuses):
-                    if s in ['FINISHED', 'READY', 'HANDED']:
-                        first_final_index = i
-                        break
+    return conclusionFromStatuses(statuses, status_dates, deadline)
 
-                if first_final_index != -1:
-                    status_create_date = status_dates[first_final_index] if first_final_index < len(
-                        status_dates) else ""
-
-                    if deadline and status_create_date:
-                        is_on_time = checkStatusDeadline(status_create_date, deadline)
-                        if is_on_time:
-                            return "ГУ оказана своевременно"
-                        else:
-                            return "ГУ оказана несвоевременно"
-                    else:
-                        return "ГУ завершена (не удалось проверить сроки)"
-                else:
-                    return "ГУ завершена"
-            elif status == 'CANCELED':
-                return "ГУ отменена"
-            break
-
-    # Logic for ACCEPTED and LAUNCHED statuses only
-    # (only applies if no priority statuses were found)
-
-    # NEW: Check for ACCEPTED -> LAUNCHED -> ACCEPTED pattern
-    if len(statuses) >= 3:
-        last_three = statuses[-3:]
-        if last_three == ['ACCEPTED', 'LAUNCHED', 'ACCEPTED']:
-            return "ГУ не доставлена до исполнителя"
-
-    # Case: Only one ACCEPTED status
-    if accepted_count == 1 and launched_count == 0:
-        return "ГУ принята от заявителя"
-
-    # Case: Two consecutive ACCEPTED statuses with no LAUNCHED
-    elif accepted_count == 2 and launched_count == 0:
-        return "Оператор цон не провел через накопитель Б"
-
-    # Case: Two ACCEPTED and one LAUNCHED afterwards
-    elif accepted_count == 2 and launched_count == 1:
-        return "ГУ на исполнении"
-
-    # Case: One ACCEPTED and one LAUNCHED
-    elif accepted_count == 1 and launched_count == 1:
-        return "Рассмотреть на SHEP"
-
-    # Default case for other combinations
-    else:
-        return f"Неопределенная последовательность статусов: {' -> '.join(statuses)}"
+
+def conclusionFromStatuses(statuses, status_dates, deadline, rules=None):
+    """
+    Turn the chronological list of statuses (with their create dates) and the
+    application deadline into the conclusion text.
+    The decision table lives in status_rules; rules can replace the default one.
+    """
+    if rules is None:
+        rules = status_rules.DEFAULT_RULES
+    return rules.evaluate(statuses, status_dates, deadline)
 
 
-def analyzeFullApplication(soup):
+def analyzeFullApplication(soup, owners=None):
     """
     Complete analysis including both status sequence and technical errors.
     Returns the final conclusion with error information if present.
@@ -325,37 +271,81 @@ def analyzeFullApplication(soup):
         basic_conclusion = analyzeStatusSequence(historyTable, soup)
 
         # Check for technical errors
-        error_info = checkTechnicalErrors(soup)
+        error_info = checkTechnicalErrors(soup, owners)
 
-        # Determine if we should add "Рассмотреть на стороне ГО."
-        # Only add if there are NO technical errors AND conclusion needs it
-        should_add_go_review = False
+        return buildFinalConclusion(basic_conclusion, error_info)
 
-        if not error_info:  # No technical errors
-            conclusions_needing_go_review = [
-                "ГУ принята от заявителя",
-                "ГУ на исполнении",
-                "ГУ оказана несвоевременно"
-            ]
+    except Exception as e:
+        return f"Ошибка анализа: {str(e)}"
+
+
+def buildFinalConclusion(basic_conclusion, error_info):
+    """
+    Combine the status conclusion with the technical error information.
+    """
+    # Determine if we should add "Рассмотреть на стороне ГО."
+    # Only add if there are NO technical errors AND conclusion needs it
+    should_add_go_review = False
+
+    if not error_info:  # No technical errors
+        conclusions_needing_go_review = [
+            "ГУ принята от заявителя",
+            "ГУ на исполнении",
+            "ГУ оказана несвоевременно"
+        ]
+
+        if basic_conclusion in conclusions_needing_go_review:
+            should_add_go_review = True
+
+    # Build final conclusion
+    final_conclusion = basic_conclusion
+
+    if should_add_go_review:
+        final_conclusion += ". Рассмотреть на стороне ГО."
+
+    # Add error information if present
+    final_conclusion += error_info
 
-            if basic_conclusion in conclusions_needing_go_review:
-                should_add_go_review = True
+    return final_conclusion
 
-        # Build final conclusion
-        final_conclusion = basic_conclusion
 
-        if should_add_go_review:
-            final_conclusion += ". Рассмотреть на стороне ГО."
+def analyzeRecord(record, rules=None, owners=None):
+    """
+    Same analysis as analyzeFullApplication, but over a record already extracted
+    from the page by page_extractor.extract_application_record.
+    """
+    try:
+        if record.table_count < 5:
+            return "Ошибка: недостаточно таблиц в HTML"
 
-        # Add error information if present
-        final_conclusion += error_info
+        basic_conclusion = conclusionFromStatuses(record.statuses, record.status_dates, record.deadline, rules)
+        error_info = formatTechnicalErrors(record.queue_errors, owners)
 
-        return final_conclusion
+        return buildFinalConclusion(basic_conclusion, error_info)
 
     except Exception as e:
         return f"Ошибка анализа: {str(e)}"
 
 
+# Conclusions produced by the final statuses (FINISHED, READY, HANDED, CANCELED)
+# in analyzeStatusSequence; an application with one of these will not change anymore
+TERMINAL_CONCLUSIONS = (
+    "ГУ оказана своевременно",
+    "ГУ оказана несвоевременно",
+    "ГУ завершена",
+    "ГУ отменена",
+)
+
+
+def isTerminalConclusion(conclusion):
+    """
+    Check if a conclusion from analyzeFullApplication means the application reached a final status.
+    """
+    if not conclusion:
+        return False
+    return conclusion.startswith(TERMINAL_CONCLUSIONS)
+
+
 def printStatusHistory(historyTable):
     """
     Print the status history for debugging purposes.
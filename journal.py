@@ -0,0 +1,76 @@
+import json
+import os
+
+
+class ProgressJournal:
+    """
+    Append-only journal of row -> conclusion results, written while the run goes.
+    Each line is a JSON object {"row": ..., "app_id": ..., "conclusion": ...}.
+    A restarted run loads it and skips the rows that are already done.
+    """
+
+    def __init__(self, path, fsync_every=50):
+        self.path = path
+        self.fsync_every = fsync_every
+        self._file = None
+        self._unsynced = 0
+
+    def load(self):
+        """
+        Return {row: (app_id, conclusion)} from an existing journal, or an empty dict.
+        A torn last line from a crash is ignored.
+        """
+        done = {}
+        if not os.path.exists(self.path):
+            return done
+
+        with open(self.path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                    done[entry['row']] = (entry['app_id'], entry['conclusion'])
+                except (ValueError, KeyError):
+                    continue
+        return done
+
+    def _open(self):
+        """
+        Open the journal for appending. If a crash left a torn last line,
+        end it first, so the next entry starts on a line of its own.
+        """
+        torn = False
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            with open(self.path, 'rb') as file:
+                file.seek(-1, os.SEEK_END)
+                torn = file.read(1) != b'\n'
+
+        self._file = open(self.path, 'a', encoding='utf-8')
+        if torn:
+            self._file.write('\n')
+
+    def record(self, row, app_id, conclusion):
+        if self._file is None:
+            self._open()
+
+        self._file.write(json.dumps({'row': row, 'app_id': app_id, 'conclusion': conclusion}, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        """
+        Delete the journal once the run has finished and its results are saved.
+        """
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
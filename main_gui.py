@@ -1,84 +1,295 @@
+import time
+
+# Taken before any other import, so the startup measurement covers them too
+STARTED = time.perf_counter()
+
 import tkinter as tk
-from tkinter import filedialog, messagebox, scrolledtext
-from PIL import Image, ImageTk
+from tkinter import filedialog, messagebox, scrolledtext, ttk
 import threading
+import multiprocessing
+import queue
 import sys
 import os
-from excel_processor_dynamic import process_excel_with_dynamic_fetch
+from collections import deque
+
+# excel_processor_dynamic (pandas, requests, bs4, openpyxl) and PIL are imported lazily:
+# the processing modules in a background thread once the window is shown, PIL only
+# when the resized logo is not cached yet.
+
+APP_DIR = os.path.join(os.path.expanduser("~"), ".nitec_monitoring")
+LOGO_PATH = "nitec.png"  # Use your company logo file here
+LOGO_SIZE = (200, 120)
+STARTUP_LOG = os.path.join(APP_DIR, "startup.log")
+
+# Lines kept in the log window; older lines are dropped
+MAX_LOG_LINES = 2000
+# How often the Tk main loop drains the worker output, in milliseconds
+POLL_INTERVAL_MS = 100
+# Rows/sec is measured over this many seconds
+RATE_WINDOW = 10.0
+
 
 class RedirectText:
-    def __init__(self, text_widget):
-        self.output = text_widget
+    """
+    File-like stdout/stderr replacement. Worker threads only put text on a queue;
+    the Tk main loop inserts it into the log widget (see App.poll).
+    """
+
+    def __init__(self, events):
+        self.events = events
 
     def write(self, string):
-        self.output.insert(tk.END, string)
-        self.output.see(tk.END)
+        if string:
+            self.events.put(('log', string))
 
     def flush(self):
         pass
 
-def process_file_in_thread(file_path, output_path, button):
+
+def load_logo():
+    """
+    Return the logo resized to LOGO_SIZE as a Tk image. The resized copy is cached as
+    a PNG in APP_DIR, which Tk reads itself, so PIL is only needed when the logo changes.
+    """
+    stat = os.stat(LOGO_PATH)
+    cached_path = os.path.join(APP_DIR, f"logo_{LOGO_SIZE[0]}x{LOGO_SIZE[1]}_{stat.st_size}_{int(stat.st_mtime)}.png")
+    if os.path.exists(cached_path):
+        return tk.PhotoImage(file=cached_path)
+
+    from PIL import Image, ImageTk
+
+    logo_img = Image.open(LOGO_PATH)
+    logo_img = logo_img.resize(LOGO_SIZE, Image.Resampling.BILINEAR)
     try:
-        process_excel_with_dynamic_fetch(file_path, output_path)
-        messagebox.showinfo("Готово", f"Файл обработан успешно.\nРезультат: {output_path}")
-    except Exception as e:
-        messagebox.showerror("Ошибка", f"Что-то пошло не так:\n{e}")
-    finally:
-        button.config(state=tk.NORMAL)
-
-def select_file(button):
-    file_path = filedialog.askopenfilename(
-        title="Выберите Excel файл",
-        filetypes=[("Excel Files", "*.xlsx")]
-    )
-    if file_path:
-        # Ask user for confirmation before overwriting
-        confirm = messagebox.askyesno(
-            "Подтверждение",
-            f"Вы действительно хотите перезаписать файл?\n{file_path}"
-        )
-        if not confirm:
+        os.makedirs(APP_DIR, exist_ok=True)
+        temp_path = cached_path + ".tmp"
+        logo_img.save(temp_path, format="PNG")
+        os.replace(temp_path, cached_path)
+    except OSError as e:
+        print("Не удалось сохранить уменьшенный логотип:", e)
+    return ImageTk.PhotoImage(logo_img)
+
+
+def record_startup(window_ms, modules_ms):
+    """
+    Append one line per launch to STARTUP_LOG: date, ms until the window was
+    interactive, ms until the processing modules were loaded.
+    """
+    try:
+        os.makedirs(APP_DIR, exist_ok=True)
+        with open(STARTUP_LOG, "a", encoding="utf-8") as file:
+            file.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')}\t{window_ms:.0f}\t{modules_ms:.0f}\n")
+    except OSError:
+        pass
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+class App:
+    """
+    The main window. Processing runs in a background thread that reports through
+    the events queue: log text, progress and the final result. Only the Tk thread
+    touches widgets.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.events = queue.Queue()
+        self.stop_event = None
+        self.progress_samples = deque()
+        self.window_ms = None
+
+        # ======== Logo ========
+        try:
+            logo = load_logo()
+            logo_label = tk.Label(root, image=logo, bg="#f4f4f4")
+            logo_label.image = logo
+            logo_label.pack(pady=10)
+        except Exception as e:
+            print("Логотип не найден или поврежден:", e)
+
+        # ======== Header ========
+        label = tk.Label(root, text="Nitec Monitoring", font=("Arial", 14, "bold"), bg="#f4f4f4")
+        label.pack(pady=10)
+
+        # ======== Buttons ========
+        buttons = tk.Frame(root, bg="#f4f4f4")
+        buttons.pack(pady=5)
+        self.process_button = tk.Button(buttons, text="📂 Выбрать Excel файл", font=("Arial", 12), bg="#4CAF50",
+                                        fg="white", padx=10, pady=5, command=self.select_file)
+        self.process_button.pack(side=tk.LEFT, padx=5)
+        self.cancel_button = tk.Button(buttons, text="⏹ Остановить", font=("Arial", 12), padx=10, pady=5,
+                                       state=tk.DISABLED, command=self.cancel)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+
+        # ======== Progress ========
+        self.progress_bar = ttk.Progressbar(root, orient=tk.HORIZONTAL, length=600, mode='determinate')
+        self.progress_bar.pack(pady=(10, 0), padx=10)
+        self.progress_label = tk.Label(root, text="", font=("Arial", 10), bg="#f4f4f4")
+        self.progress_label.pack()
+
+        # ======== Log Output ========
+        self.log_box = scrolledtext.ScrolledText(root, height=15, width=80, font=("Courier New", 10))
+        self.log_box.pack(pady=10, padx=10)
+
+    def on_window_ready(self):
+        """
+        Runs from the main loop once the window is drawn: record the startup time and
+        load the processing modules in the background.
+        """
+        self.root.update_idletasks()
+        self.window_ms = (time.perf_counter() - STARTED) * 1000
+        print(f"Окно готово за {self.window_ms:.0f} мс")
+        threading.Thread(target=self.preload_modules, daemon=True).start()
+
+    def preload_modules(self):
+        try:
+            import excel_processor_dynamic
+        except Exception as e:
+            print("Ошибка загрузки модулей обработки:", e)
             return
+        modules_ms = (time.perf_counter() - STARTED) * 1000
+        print(f"Модули обработки загружены за {modules_ms:.0f} мс")
+        record_startup(self.window_ms, modules_ms)
+
+    def select_file(self):
+        file_path = filedialog.askopenfilename(
+            title="Выберите Excel файл",
+            filetypes=[("Excel Files", "*.xlsx")]
+        )
+        if file_path:
+            # Ask user for confirmation before overwriting
+            confirm = messagebox.askyesno(
+                "Подтверждение",
+                f"Вы действительно хотите перезаписать файл?\n{file_path}"
+            )
+            if not confirm:
+                return
+
+            output_path = file_path  # Overwrite the same file
+            self.stop_event = threading.Event()
+            self.progress_samples.clear()
+            self.progress_bar['value'] = 0
+            self.progress_label.config(text="Подготовка...")
+            self.process_button.config(state=tk.DISABLED)
+            self.cancel_button.config(state=tk.NORMAL, text="⏹ Остановить")
+
+            thread = threading.Thread(target=self.process_file_in_thread, args=(file_path, output_path),
+                                      daemon=True)
+            thread.start()
+
+    def cancel(self):
+        if self.stop_event is not None:
+            self.stop_event.set()
+            self.cancel_button.config(state=tk.DISABLED, text="Остановка...")
+            print("Остановка: текущие заявки будут завершены, результат сохранен")
+
+    def process_file_in_thread(self, file_path, output_path):
+        stop_event = self.stop_event
+        try:
+            # Usually already loaded by preload_modules; otherwise this waits for it
+            from excel_processor_dynamic import process_excel_with_dynamic_fetch
+
+            process_excel_with_dynamic_fetch(file_path, output_path, progress=self.report_progress,
+                                             stop_event=stop_event)
+            if stop_event.is_set():
+                self.events.put(('done', ('info', "Остановлено",
+                                          f"Обработка остановлена, частичный результат сохранен.\n"
+                                          f"Результат: {output_path}")))
+            else:
+                self.events.put(('done', ('info', "Готово", f"Файл обработан успешно.\nРезультат: {output_path}")))
+        except Exception as e:
+            self.events.put(('done', ('error', "Ошибка", f"Что-то пошло не так:\n{e}")))
+
+    def report_progress(self, done, total):
+        # Called from the processing thread; only the latest value matters
+        self.events.put(('progress', (done, total)))
+
+    def poll(self):
+        """
+        Drain the events queue on the Tk thread: one insert for all new log text,
+        one update of the progress bar.
+        """
+        chunks = []
+        latest_progress = None
+        finished = None
+        try:
+            while True:
+                kind, payload = self.events.get_nowait()
+                if kind == 'log':
+                    chunks.append(payload)
+                elif kind == 'progress':
+                    latest_progress = payload
+                elif kind == 'done':
+                    finished = payload
+        except queue.Empty:
+            pass
+
+        if chunks:
+            self.append_log(''.join(chunks))
+        if latest_progress is not None:
+            self.show_progress(*latest_progress)
+        if finished is not None:
+            self.process_button.config(state=tk.NORMAL)
+            self.cancel_button.config(state=tk.DISABLED, text="⏹ Остановить")
+            level, title, message = finished
+            if level == 'error':
+                messagebox.showerror(title, message)
+            else:
+                messagebox.showinfo(title, message)
+
+        self.root.after(POLL_INTERVAL_MS, self.poll)
+
+    def append_log(self, text):
+        self.log_box.insert(tk.END, text)
+        # Ring buffer: keep only the last MAX_LOG_LINES lines
+        line_count = int(self.log_box.index('end-1c').split('.')[0])
+        if line_count > MAX_LOG_LINES:
+            self.log_box.delete('1.0', f'{line_count - MAX_LOG_LINES + 1}.0')
+        self.log_box.see(tk.END)
+
+    def show_progress(self, done, total):
+        now = time.monotonic()
+        self.progress_samples.append((now, done))
+        while len(self.progress_samples) > 2 and now - self.progress_samples[0][0] > RATE_WINDOW:
+            self.progress_samples.popleft()
+
+        first_time, first_done = self.progress_samples[0]
+        rate = (done - first_done) / (now - first_time) if now > first_time else 0.0
+
+        self.progress_bar['maximum'] = max(total, 1)
+        self.progress_bar['value'] = done
+        text = f"{done}/{total} строк"
+        if rate > 0:
+            text += f" · {rate:.1f} строк/с"
+            if total > done:
+                text += f" · осталось ~{format_duration((total - done) / rate)}"
+        self.progress_label.config(text=text)
 
-        output_path = file_path  # Overwrite the same file
-        button.config(state=tk.DISABLED)
 
-        thread = threading.Thread(target=process_file_in_thread, args=(file_path, output_path, button))
-        thread.start()
 def main():
     root = tk.Tk()
     root.title("Excel Обработчик")
-    root.geometry("640x500")
+    root.geometry("640x560")
     root.configure(bg="#f4f4f4")
 
-    # ======== Logo ========
-    try:
-        logo_img = Image.open("nitec.png")  # Use your company logo file here
-        logo_img = logo_img.resize((200, 120), Image.Resampling.BILINEAR)
-        logo = ImageTk.PhotoImage(logo_img)
-        logo_label = tk.Label(root, image=logo, bg="#f4f4f4")
-        logo_label.image = logo
-        logo_label.pack(pady=10)
-    except Exception as e:
-        print("Логотип не найден или поврежден:", e)
-
-    # ======== Header ========
-    label = tk.Label(root, text="Nitec Monitoring", font=("Arial", 14, "bold"), bg="#f4f4f4")
-    label.pack(pady=10)
-
-    # ======== Button ========
-    process_button = tk.Button(root, text="📂 Выбрать Excel файл", font=("Arial", 12), bg="#4CAF50", fg="white", padx=10, pady=5)
-    process_button.config(command=lambda: select_file(process_button))
-    process_button.pack(pady=5)
-
-    # ======== Log Output ========
-    log_box = scrolledtext.ScrolledText(root, height=15, width=80, font=("Courier New", 10))
-    log_box.pack(pady=10, padx=10)
+    app = App(root)
 
     # ======== Redirect Output ========
-    sys.stdout = sys.stderr = RedirectText(log_box)
+    sys.stdout = sys.stderr = RedirectText(app.events)
+    app.poll()
+    root.after(0, app.on_window_ready)
 
     root.mainloop()
 
 if __name__ == "__main__":
+    # Needed for the analysis process pool in a frozen Windows build
+    multiprocessing.freeze_support()
     main()
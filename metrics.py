@@ -0,0 +1,216 @@
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+PROMETHEUS_PREFIX = 'nitec_'
+
+
+def conclusion_category(conclusion):
+    """
+    Group a conclusion by its basic part: without the appended technical errors and
+    without the status sequence or error text after a colon.
+    """
+    if conclusion is None:
+        return 'Нет данных'
+    category = conclusion.split('. Однако', 1)[0]
+    category = category.split('. Рассмотреть', 1)[0]
+    return category.split(':', 1)[0].strip()
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram with count, sum, min and max.
+    """
+
+    def __init__(self, buckets=SECONDS_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def quantile(self, fraction):
+        """
+        Estimate a quantile as the upper bound of the bucket it falls into.
+        """
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.sum / self.count if self.count else None,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': {str(bound): count for bound, count in zip(self.buckets + ('+Inf',), self.counts)},
+        }
+
+
+def _labels_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape_label(value)}"' for key, value in pairs) + '}'
+
+
+def _write_atomic(path, text):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix='.~', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            file.write(text)
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class RunMetrics:
+    """
+    Thread-safe counters and histograms of one run, labelled by keyword arguments
+    (e.g. category=conclusion_category(conclusion)), exportable as a JSON report
+    and in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self.started_at = datetime.now()
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def count(self, name, amount=1, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, buckets=SECONDS_BUCKETS, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def total(self, name):
+        """
+        Sum of a histogram over all its labels: (count, sum of values).
+        """
+        with self._lock:
+            histograms = [histogram for (metric, _), histogram in self._histograms.items() if metric == name]
+            return sum(h.count for h in histograms), sum(h.sum for h in histograms)
+
+    def to_dict(self):
+        with self._lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self._counters.items())]
+            histograms = [dict({'name': name, 'labels': dict(labels)}, **histogram.to_dict())
+                          for (name, labels), histogram in sorted(self._histograms.items())]
+        return {
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'duration_seconds': time.monotonic() - self._started,
+            'counters': counters,
+            'histograms': histograms,
+        }
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            described = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                metric = PROMETHEUS_PREFIX + name
+                if metric not in described:
+                    lines.append(f'# TYPE {metric} counter')
+                    described.add(metric)
+                lines.append(f'{metric}{_format_labels(labels)} {value}')
+
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                metric = PROMETHEUS_PREFIX + name
+                if metric not in described:
+                    lines.append(f'# TYPE {metric} histogram')
+                    described.add(metric)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{_format_labels(labels, [("le", str(bound))])} {cumulative}')
+                lines.append(f'{metric}_sum{_format_labels(labels)} {histogram.sum}')
+                lines.append(f'{metric}_count{_format_labels(labels)} {histogram.count}')
+
+        metric = PROMETHEUS_PREFIX + 'run_duration_seconds'
+        lines.append(f'# TYPE {metric} gauge')
+        lines.append(f'{metric} {time.monotonic() - self._started}')
+        return '\n'.join(lines) + '\n'
+
+    def write_json(self, path):
+        _write_atomic(path, json.dumps(self.to_dict(), ensure_ascii=False, indent=2))
+
+    def write_prometheus(self, path):
+        _write_atomic(path, self.to_prometheus())
+
+    def write_reports(self, path_prefix):
+        """
+        Write path_prefix.json and path_prefix.prom (for the node_exporter textfile collector).
+        """
+        self.write_json(path_prefix + '.json')
+        self.write_prometheus(path_prefix + '.prom')
+
+    def summary(self):
+        """
+        One line per timed stage: count, total and mean time.
+        """
+        lines = []
+        with self._lock:
+            names = sorted({name for name, _ in self._histograms})
+        for name in names:
+            count, total = self.total(name)
+            if name.endswith('_seconds') and count:
+                lines.append(f"{name}: {count} раз, всего {total:.2f} с, в среднем {total / count * 1000:.1f} мс")
+        return lines
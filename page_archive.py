@@ -0,0 +1,110 @@
+import gzip
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+
+# Seconds a connection waits for another process's write lock before giving up
+BUSY_TIMEOUT = 30.0
+
+
+class PageArchive:
+    """
+    Archive of every raw About.cls page fetched from the server.
+
+    Pages are stored content-addressed, one gzip blob per distinct page under
+    pages/<first two hex digits>/<sha256>.html.gz, so an unchanged page fetched again
+    costs only an index row. The SQLite index records which page each appId had at
+    each fetch time, which lets analysis be re-run later without the server.
+
+    Several processes may share the archive: each index row is committed at once,
+    and a busy index is waited for up to BUSY_TIMEOUT seconds.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.pages_dir = os.path.join(directory, 'pages')
+        os.makedirs(self.pages_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, 'index.sqlite3'), timeout=BUSY_TIMEOUT,
+                                     check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fetches ("
+            " app_id TEXT NOT NULL,"
+            " fetched_at REAL NOT NULL,"
+            " digest TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS fetches_app ON fetches (app_id, fetched_at)")
+        self._conn.commit()
+
+    def _blob_path(self, digest):
+        return os.path.join(self.pages_dir, digest[:2], digest + '.html.gz')
+
+    def put(self, app_id, html, fetched_at=None):
+        """
+        Store a fetched page and record it in the index. Returns the page digest.
+        """
+        data = html.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+
+        if not os.path.exists(path):
+            directory = os.path.dirname(path)
+            os.makedirs(directory, exist_ok=True)
+            # Written under a temp name and renamed, so a blob is either whole or absent
+            fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=directory)
+            try:
+                with os.fdopen(fd, 'wb') as file:
+                    file.write(gzip.compress(data, compresslevel=6, mtime=0))
+                os.replace(temp_path, path)
+            except Exception:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+
+        with self._lock, self._conn:
+            self._conn.execute("INSERT INTO fetches (app_id, fetched_at, digest) VALUES (?, ?, ?)",
+                               (app_id, fetched_at if fetched_at is not None else time.time(), digest))
+        return digest
+
+    def latest_digest(self, app_id, as_of=None):
+        """
+        Digest of the last page fetched for app_id (no later than the as_of timestamp), or None.
+        """
+        with self._lock:
+            if as_of is None:
+                row = self._conn.execute(
+                    "SELECT digest FROM fetches WHERE app_id = ? ORDER BY fetched_at DESC LIMIT 1", (app_id,)
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT digest FROM fetches WHERE app_id = ? AND fetched_at <= ?"
+                    " ORDER BY fetched_at DESC LIMIT 1", (app_id, as_of)
+                ).fetchone()
+        return row[0] if row else None
+
+    def read(self, digest):
+        with open(self._blob_path(digest), 'rb') as file:
+            return gzip.decompress(file.read()).decode('utf-8')
+
+    def get_html(self, app_id, as_of=None):
+        """
+        The archived page for app_id as it was last fetched (before as_of), or None.
+        """
+        digest = self.latest_digest(app_id, as_of)
+        if digest is None:
+            return None
+        try:
+            return self.read(digest)
+        except OSError:
+            return None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,343 @@
+import bisect
+import re
+import time
+from collections import namedtuple
+from html import unescape
+
+import helpers
+import status_rules
+
+
+# Compact result of reading one isc.util.About.cls page
+ApplicationRecord = namedtuple('ApplicationRecord', [
+    'table_count',   # number of <table> elements on the page
+    'statuses',      # newStatus values from the history table, in order
+    'status_dates',  # createDate of each status
+    'deadline',      # deadline from "Основные свойства заявки", or None
+    'queue_errors',  # LastError texts of MsgQueue rows with QueueType 2 or 4
+])
+
+MAIN_TABLE_MARKER = 'Основные свойства заявки'
+ERRORS_TABLE_MARKER = 'Очередь уведомлений isc.kzcon.ens.MsgQueue'
+
+# Index of the status history table among all tables on the page
+HISTORY_TABLE_INDEX = 4
+
+# Inside of a tag up to its closing '>', which may also appear in quoted attribute values
+_ATTRS = r'[^\'">]*(?:(?:"[^"]*"|\'[^\']*\')[^\'">]*)*'
+
+# Every tag, as html.parser sees it; comments, CDATA sections and script/style bodies are skipped whole
+_TOKEN_RE = re.compile(
+    r'<!--.*?-->|<!\[CDATA\[.*?\]\s*\]\s*>|<(script|style)\b' + _ATTRS + r'>.*?</\1\s*>'
+    r'|<(/?)([a-zA-Z][a-zA-Z0-9]*)\b' + _ATTRS + '>',
+    re.IGNORECASE | re.DOTALL,
+)
+# Markup within an element's text; group 1 is the content of a CDATA section, which counts as text
+_ANY_TAG_RE = re.compile(
+    r'<!--.*?-->|<!\[CDATA\[(.*?)\]\s*\]\s*>|<(script|style)\b' + _ATTRS + r'>.*?</\2\s*>'
+    r'|<[a-zA-Z/!?]' + _ATTRS + '>',
+    re.IGNORECASE | re.DOTALL,
+)
+
+# Elements whose end is handled by more than the fast path of the tag loop
+_CLOSE_TAGS = frozenset(('table', 'b', 'strong'))
+
+# Tags that never have content (BeautifulSoup's empty-element tags)
+_VOID_TAGS = frozenset((
+    'area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed', 'frame', 'hr', 'image', 'img',
+    'input', 'isindex', 'keygen', 'link', 'menuitem', 'meta', 'nextid', 'param', 'source', 'spacer', 'track',
+    'wbr',
+))
+
+
+def _text(fragment, strip=True):
+    """
+    Text of an HTML fragment, matching BeautifulSoup's get_text(strip=True), or
+    get_text() without strip.
+    """
+    if '<' not in fragment and '&' not in fragment:
+        return fragment.strip() if strip else fragment
+
+    pieces = []
+    position = 0
+    for match in _ANY_TAG_RE.finditer(fragment):
+        pieces.append(unescape(fragment[position:match.start()]))
+        if match.group(1) is not None:
+            pieces.append(match.group(1))
+        position = match.end()
+    pieces.append(unescape(fragment[position:]))
+    if strip:
+        pieces = [piece.strip() for piece in pieces]
+    return ''.join(pieces)
+
+
+# Fields of an open element, kept in a list for speed
+_NAME, _PARENT, _BEGIN, _START, _DATA, _AFTER_BR = range(6)
+
+
+def extract_application_record(html):
+    """
+    Read the history table, the deadline and the MsgQueue error table from an
+    About.cls page in a single pass over its tags, without building a DOM.
+
+    The result is the one helpers.analyzeFullApplication gets with BeautifulSoup's
+    html.parser: only the element nesting is tracked (an end tag closes the nearest
+    open element of its name, stray end tags are ignored, nothing is closed
+    implicitly, <x/> is an empty element unless x is a void tag), and a table's
+    rows and a row's cells include those of nested tables, like find_all().
+    CDATA sections count as text, script and style bodies do not. The tables are the fifth table on the page, the first
+    table after the "Основные свойства заявки" <b> header, and the MsgQueue table:
+    the first table following the parent of the first <b>/<strong> that contains
+    "Очередь уведомлений isc.kzcon.ens.MsgQueue", or else the first table after a
+    <br> directly followed by that header.
+    """
+    if isinstance(html, bytes):
+        html = html.decode('utf-8', errors='replace')
+
+    # An element is [name, parent, start tag position, content position, data, <br> before it]:
+    # data is the rows of a table, the cells of a row or the [tag, start, end] of a cell
+    root = [None, None, 0, 0, None, None]
+    stack = [root]   # open elements
+    open_tables = []
+    open_rows = []
+    tables = []      # rows of every table in document order
+    table_starts = []
+    markers = {}     # first <b> with each table header: {'main': position, 'errors': position}
+    # [grandparent of the MsgQueue header <b>, index of its first child table after the header's parent]
+    errors_parent = [None, None]
+    br_hits = []     # <br> positions directly followed by the MsgQueue header
+    pending_br = None  # (position, end) of a <br> whose next sibling is not known yet
+
+    def close(element, end):
+        name = element[_NAME]
+        if name == 'td' or name == 'th':
+            element[_DATA][2] = end
+        elif name == 'tr':
+            open_rows.pop()
+        elif name == 'table':
+            open_tables.pop()
+        elif name == 'b' or name == 'strong':
+            begin = element[_BEGIN]
+            text = _text(html[element[_START]:end], strip=False)
+            # A <b> inside another one closes first; the outer one comes first in the document
+            if name == 'b' and MAIN_TABLE_MARKER in text and begin < markers.get('main', begin + 1):
+                markers['main'] = begin
+            if ERRORS_TABLE_MARKER in text and begin < markers.get('errors', begin + 1):
+                markers['errors'] = begin
+                parent = element[_PARENT]
+                errors_parent[:] = [parent[_PARENT] if parent is not root else None, None]
+        if element[_AFTER_BR] is not None and ERRORS_TABLE_MARKER in unescape(html[element[_BEGIN]:end]):
+            br_hits.append(element[_AFTER_BR])
+
+    for match in _TOKEN_RE.finditer(html):
+        begin = match.start()
+        closing, name = match.group(2, 3)
+        follows_br = None
+
+        if pending_br is not None:
+            # What directly follows a <br>: text, a comment or script, or an element
+            br_begin, br_end = pending_br
+            pending_br = None
+            if begin > br_end:
+                if ERRORS_TABLE_MARKER in unescape(html[br_end:begin]):
+                    br_hits.append(br_begin)
+            elif name is None:
+                if ERRORS_TABLE_MARKER in match.group(0):
+                    br_hits.append(br_begin)
+            elif not closing and name.lower() not in _VOID_TAGS:
+                # Decided when the element closes
+                follows_br = br_begin
+
+        if name is None:
+            continue
+        name = name.lower()
+
+        if closing:
+            top = stack[-1]
+            if top[_NAME] == name and name not in _CLOSE_TAGS and top[_AFTER_BR] is None:
+                # The common case, a cell, row or inline element closing itself
+                stack.pop()
+                if name == 'td' or name == 'th':
+                    top[_DATA][2] = begin
+                elif name == 'tr':
+                    open_rows.pop()
+                continue
+            for depth in range(len(stack) - 1, 0, -1):
+                if stack[depth][_NAME] == name:
+                    while len(stack) > depth:
+                        close(stack.pop(), begin)
+                    break
+            continue
+
+        end = match.end()
+        if name in _VOID_TAGS:
+            if name == 'br':
+                pending_br = (begin, end)
+            continue
+
+        parent = stack[-1]
+        if name == 'td' or name == 'th':
+            cell = [name, end, len(html)]
+            for row in open_rows:
+                row[_DATA].append(cell)
+            stack.append([name, parent, begin, end, cell, follows_br])
+        elif name == 'tr':
+            row = [name, parent, begin, end, [], follows_br]
+            for table in open_tables:
+                table[_DATA].append(row[_DATA])
+            open_rows.append(row)
+            stack.append(row)
+        elif name == 'table':
+            if parent is errors_parent[0] and errors_parent[1] is None:
+                errors_parent[1] = len(tables)
+            table = [name, parent, begin, end, [], follows_br]
+            tables.append(table[_DATA])
+            table_starts.append(begin)
+            open_tables.append(table)
+            stack.append(table)
+        else:
+            stack.append([name, parent, begin, end, None, follows_br])
+
+        if html[end - 2] == '/':
+            # html.parser ends any other <x/> at once: an element with no content
+            close(stack.pop(), end)
+
+    if pending_br is not None:
+        if ERRORS_TABLE_MARKER in unescape(html[pending_br[1]:]):
+            br_hits.append(pending_br[0])
+
+    # Elements still open at the end of the page close there, like in BeautifulSoup
+    while len(stack) > 1:
+        close(stack.pop(), len(html))
+
+    statuses = []
+    status_dates = []
+    if len(tables) > HISTORY_TABLE_INDEX:
+        for row in tables[HISTORY_TABLE_INDEX][1:]:  # Skip header row
+            tds = [(start, end) for cell_tag, start, end in row if cell_tag == 'td']
+            if len(tds) > 6:
+                status = _text(html[tds[6][0]:tds[6][1]])
+                if status:
+                    statuses.append(status)
+                    status_dates.append(_text(html[tds[2][0]:tds[2][1]]))
+
+    deadline = None
+    if 'main' in markers:
+        main_table_index = bisect.bisect_right(table_starts, markers['main'])
+        if main_table_index < len(tables):
+            deadline = _deadline_from_rows(_table_text(html, tables[main_table_index][:2]))
+
+    errors_table_index = errors_parent[1]
+    if errors_table_index is None and br_hits:
+        # The header may also follow a <br>, as plain text or in an element
+        errors_table_index = bisect.bisect_right(table_starts, min(br_hits))
+        if errors_table_index == len(tables):
+            errors_table_index = None
+
+    queue_errors = []
+    if errors_table_index is not None:
+        queue_errors = _queue_errors_from_rows(_table_text(html, tables[errors_table_index]))
+
+    return ApplicationRecord(len(tables), statuses, status_dates, deadline, queue_errors)
+
+
+def _table_text(html, rows):
+    return [[_text(html[start:end]) for _, start, end in row] for row in rows]
+
+
+def _deadline_from_rows(rows):
+    if len(rows) < 2:
+        return None
+
+    header_cells, data_cells = rows[0], rows[1]
+    for i, header in enumerate(header_cells):
+        if 'deadline' in header.lower():
+            if i < len(data_cells) and data_cells[i]:
+                return data_cells[i]
+            return None
+    return None
+
+
+def _queue_errors_from_rows(rows):
+    if len(rows) < 2:
+        return []
+
+    queue_type_index = -1
+    last_error_index = -1
+    for i, header in enumerate(rows[0]):
+        if 'QueueType' in header:
+            queue_type_index = i
+        elif 'LastError' in header:
+            last_error_index = i
+
+    if queue_type_index == -1 or last_error_index == -1:
+        return []
+
+    errors = []
+    for row in rows[1:]:
+        if len(row) > max(queue_type_index, last_error_index):
+            queue_type = row[queue_type_index]
+            last_error = row[last_error_index]
+            if queue_type in ('2', '4') and last_error:
+                errors.append(last_error)
+    return errors
+
+
+# Raise when extraction or the conclusion text changes in a way the rule tables do not show
+ANALYSIS_VERSION = 3
+
+# Error owner matcher used by analyze_page in this process, see set_error_owners
+_error_owners = None
+
+
+def set_error_owners(matcher):
+    global _error_owners
+    _error_owners = matcher
+
+
+def analysis_version():
+    """
+    Version of the conclusions analyze_page gives in this process: the extraction,
+    the status rules and the error owner mapping. Cached conclusions of another
+    version are stale.
+    """
+    owners = _error_owners.version if _error_owners is not None else '-'
+    return f"{ANALYSIS_VERSION}:{status_rules.DEFAULT_RULES.version}:{owners}"
+
+
+def load_error_owners(mapping_path):
+    """
+    Process pool initializer: load the error owner matcher once per worker process.
+    """
+    import error_owners
+    set_error_owners(error_owners.load_error_owner_matcher(mapping_path))
+
+
+def analyze_page(html):
+    """
+    Extract and analyze one page, returning only the conclusion string.
+    Kept at module level with light imports so it can run in a process pool worker.
+    """
+    try:
+        return helpers.analyzeRecord(extract_application_record(html), owners=_error_owners)
+    except Exception as e:
+        return f"Ошибка анализа: {str(e)}"
+
+
+def analyze_page_timed(html):
+    """
+    analyze_page that also measures its two steps and returns the extracted record.
+    Returns (conclusion, parse seconds, analysis seconds, ApplicationRecord or None).
+    """
+    started = time.perf_counter()
+    try:
+        record = extract_application_record(html)
+    except Exception as e:
+        return f"Ошибка анализа: {str(e)}", time.perf_counter() - started, 0.0, None
+
+    parsed = time.perf_counter()
+    try:
+        conclusion = helpers.analyzeRecord(record, owners=_error_owners)
+    except Exception as e:
+        conclusion = f"Ошибка анализа: {str(e)}"
+    return conclusion, parsed - started, time.perf_counter() - parsed, record
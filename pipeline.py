@@ -0,0 +1,185 @@
+import queue
+import threading
+import time
+
+
+_DONE = object()
+
+
+def _put(target, item, abort):
+    # Block while the queue is full (backpressure), but give up if the run is aborted
+    while not abort.is_set():
+        try:
+            target.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(source, abort):
+    while not abort.is_set():
+        try:
+            return source.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+class BudgetEvent(threading.Event):
+    """
+    Stop event for a run with a time budget: set like a threading.Event, when the
+    parent event is set (e.g. by a cancel button), or by itself once seconds have
+    passed. expired tells whether it was the budget that ran out.
+    Only is_set() looks at the clock, which is all the pipeline checks; expire()
+    ends the budget early, when what is left of it is known to be too short.
+    """
+
+    def __init__(self, seconds, parent=None):
+        super().__init__()
+        self.deadline = time.monotonic() + seconds
+        self.parent = parent
+        self.expired = False
+        self._check_lock = threading.Lock()
+
+    def is_set(self):
+        if super().is_set():
+            return True
+        if self.parent is not None and self.parent.is_set():
+            self.set()
+        elif time.monotonic() >= self.deadline:
+            self.expire()
+        return super().is_set()
+
+    def expire(self):
+        with self._check_lock:
+            if super().is_set():
+                return
+            self.expired = True
+            print("Время запуска истекло: новые заявки не берутся, текущие завершаются")
+            self.set()
+
+    def remaining(self):
+        return max(0.0, self.deadline - time.monotonic())
+
+
+def run_pipeline(tasks, fetch, analyze, fetch_workers=8, analysis_workers=1, queue_size=64,
+                 report_interval=10.0, stop_event=None):
+    """
+    Run tasks through fetch -> analyze stages connected by bounded queues and
+    yield (task, conclusion) pairs as they come out of the last stage.
+
+    fetch(task) returns (page, conclusion): a ready conclusion (e.g. from the cache)
+    skips analysis, a page goes on to analyze(task, page), and (None, None) means the
+    fetch failed and is yielded with conclusion None.
+    The caller consumes the results in a single thread, which makes it the writer stage.
+    Full queues block the stage in front of them, so memory stays flat however many
+    tasks there are. Queue depths are printed every report_interval seconds.
+    Setting stop_event stops taking new tasks; work already in flight is still yielded.
+    """
+    stop = stop_event if stop_event is not None else threading.Event()
+    abort = threading.Event()
+    finished = threading.Event()
+
+    task_iter = iter(tasks)
+    task_lock = threading.Lock()
+    pages = queue.Queue(maxsize=queue_size)
+    results = queue.Queue(maxsize=queue_size)
+
+    state_lock = threading.Lock()
+    remaining = {'fetch': fetch_workers, 'analysis': analysis_workers}
+    counts = {'fetched': 0, 'analyzed': 0, 'written': 0}
+
+    def next_task():
+        with task_lock:
+            return next(task_iter, _DONE)
+
+    def fetch_worker():
+        try:
+            while not stop.is_set() and not abort.is_set():
+                task = next_task()
+                if task is _DONE:
+                    break
+
+                try:
+                    page, conclusion = fetch(task)
+                except Exception as e:
+                    print(f"Ошибка загрузки: {e}")
+                    page, conclusion = None, None
+
+                with state_lock:
+                    counts['fetched'] += 1
+
+                if conclusion is None and page is not None:
+                    _put(pages, (task, page), abort)
+                else:
+                    _put(results, (task, conclusion), abort)
+        finally:
+            with state_lock:
+                remaining['fetch'] -= 1
+                last = remaining['fetch'] == 0
+            if last:
+                for _ in range(analysis_workers):
+                    _put(pages, _DONE, abort)
+
+    def analysis_worker():
+        try:
+            while True:
+                item = _get(pages, abort)
+                if item is _DONE:
+                    break
+
+                task, page = item
+                try:
+                    conclusion = analyze(task, page)
+                except Exception as e:
+                    conclusion = f"Ошибка анализа: {str(e)}"
+
+                with state_lock:
+                    counts['analyzed'] += 1
+
+                _put(results, (task, conclusion), abort)
+        finally:
+            with state_lock:
+                remaining['analysis'] -= 1
+                last = remaining['analysis'] == 0
+            if last:
+                _put(results, _DONE, abort)
+
+    def reporter():
+        while not finished.wait(report_interval):
+            with state_lock:
+                fetching = remaining['fetch']
+                fetched, analyzed, written = counts['fetched'], counts['analyzed'], counts['written']
+            print(f"Очереди: страниц {pages.qsize()}/{queue_size}, результатов {results.qsize()}/{queue_size}; "
+                  f"загружено {fetched}, проанализировано {analyzed}, записано {written}, "
+                  f"активных загрузчиков {fetching}")
+
+    threads = [threading.Thread(target=fetch_worker, daemon=True) for _ in range(fetch_workers)]
+    threads += [threading.Thread(target=analysis_worker, daemon=True) for _ in range(analysis_workers)]
+    if report_interval:
+        threads.append(threading.Thread(target=reporter, daemon=True))
+    for thread in threads:
+        thread.start()
+
+    started = time.monotonic()
+    try:
+        while True:
+            item = _get(results, abort)
+            if item is _DONE:
+                break
+            with state_lock:
+                counts['written'] += 1
+            yield item
+    finally:
+        # Unblock every stage if the consumer stopped early
+        abort.set()
+        finished.set()
+        for thread in threads:
+            thread.join()
+
+    with state_lock:
+        written = counts['written']
+    elapsed = time.monotonic() - started
+    if written and elapsed > 0:
+        print(f"Конвейер: {written} результатов за {elapsed:.1f} с ({written / elapsed:.1f} строк/с)")
@@ -0,0 +1,185 @@
+import cProfile
+import functools
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+
+
+# Set to a directory to profile a run without changing how it is launched (e.g. from the GUI)
+PROFILE_ENV = 'NITEC_PROFILE'
+
+
+def profile_dir_from_env(profile_dir=None):
+    """
+    The explicit profile_dir, else the NITEC_PROFILE environment variable, else None.
+    """
+    return profile_dir or os.environ.get(PROFILE_ENV) or None
+
+
+class Profiler:
+    """
+    Per-stage profiler for a processing run.
+
+    Functions are wrapped into named stages (patch / wrap) only while profiling, so
+    a run without the profiler executes the original functions untouched.
+    Each stage gets its own cProfile data, merged over threads; a nested stage
+    pauses the stage around it, so stage times are exclusive. A sampling thread
+    also records the stack of every thread inside a stage every sample_interval
+    seconds, prefixed with the stage name.
+
+    stop() writes <stage>.pstats and stacks.collapsed (for flamegraph.pl or
+    speedscope) to output_dir and restores the patched functions.
+    """
+
+    def __init__(self, output_dir, sample_interval=0.005):
+        self.output_dir = output_dir
+        self.sample_interval = sample_interval
+        self.stage_seconds = {}
+        self.stage_calls = {}
+
+        self._lock = threading.Lock()
+        self._profiles = {}  # (stage, thread id) -> cProfile.Profile
+        self._stacks = {}    # thread id -> [(stage, profile or None)]
+        self._samples = {}   # collapsed stack -> count
+        self._patches = []
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def _profile_for(self, stage, thread_id):
+        key = (stage, thread_id)
+        profile = self._profiles.get(key)
+        if profile is None:
+            profile = cProfile.Profile()
+            with self._lock:
+                self._profiles[key] = profile
+        return profile
+
+    def _enter(self, stage):
+        thread_id = threading.get_ident()
+        stack = self._stacks.setdefault(thread_id, [])
+        if stack and stack[-1][1] is not None:
+            stack[-1][1].disable()
+
+        profile = self._profile_for(stage, thread_id)
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is active in this process; keep the sampler and timings only
+            profile = None
+        stack.append((stage, profile))
+        return stack
+
+    def _exit(self, stack):
+        stage, profile = stack.pop()
+        if profile is not None:
+            profile.disable()
+        if stack and stack[-1][1] is not None:
+            try:
+                stack[-1][1].enable()
+            except ValueError:
+                pass
+
+    def wrap(self, stage, func):
+        """
+        Return func wrapped so that its calls are profiled as stage.
+        """
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            stack = self._enter(stage)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                self._exit(stack)
+                with self._lock:
+                    self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + elapsed
+                    self.stage_calls[stage] = self.stage_calls.get(stage, 0) + 1
+        return wrapper
+
+    def patch(self, owner, name, stage):
+        """
+        Replace owner.name (a module or object attribute) with its wrapped version until stop().
+        """
+        original = getattr(owner, name)
+        self._patches.append((owner, name, original))
+        setattr(owner, name, self.wrap(stage, original))
+
+    def _sample(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.sample_interval):
+            frames = sys._current_frames()
+            for thread_id, stack in list(self._stacks.items()):
+                if thread_id == me:
+                    continue
+                # The thread may leave its last stage at any moment, so read it once and tolerate that
+                try:
+                    stage = stack[-1][0]
+                except IndexError:
+                    continue
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                names.append(stage)
+                key = ';'.join(reversed(names))
+                self._samples[key] = self._samples.get(key, 0) + 1
+
+    def start(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+        print(f"Профилирование включено, результаты: {self.output_dir}")
+        return self
+
+    def stop(self):
+        """
+        Restore the patched functions and write the profiles.
+        """
+        for owner, name, original in reversed(self._patches):
+            setattr(owner, name, original)
+        self._patches = []
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+
+        by_stage = {}
+        with self._lock:
+            for (stage, _), profile in self._profiles.items():
+                by_stage.setdefault(stage, []).append(profile)
+
+        for stage, profiles in sorted(by_stage.items()):
+            stats = None
+            for profile in profiles:
+                try:
+                    if stats is None:
+                        stats = pstats.Stats(profile)
+                    else:
+                        stats.add(profile)
+                except TypeError:
+                    # The profile never collected anything
+                    continue
+            if stats is None:
+                continue
+            path = os.path.join(self.output_dir, f"{stage}.pstats")
+            stats.dump_stats(path)
+
+            report = io.StringIO()
+            stats.stream = report
+            stats.sort_stats('cumulative').print_stats(8)
+            print(f"\n--- {stage}: {self.stage_calls.get(stage, 0)} вызовов, "
+                  f"{self.stage_seconds.get(stage, 0.0):.2f} с ({path}) ---")
+            print(report.getvalue().strip())
+
+        collapsed_path = os.path.join(self.output_dir, 'stacks.collapsed')
+        with open(collapsed_path, 'w', encoding='utf-8') as file:
+            for stack, count in sorted(self._samples.items()):
+                file.write(f"{stack} {count}\n")
+        print(f"Свернутые стеки для flamegraph: {collapsed_path} ({sum(self._samples.values())} выборок)")
@@ -0,0 +1,272 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from metrics import conclusion_category
+
+
+# Seconds a connection waits for another process's write lock before giving up
+BUSY_TIMEOUT = 30.0
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS runs ("
+    " run_id INTEGER PRIMARY KEY AUTOINCREMENT,"
+    " started_at REAL NOT NULL,"
+    " source TEXT)",
+    "CREATE TABLE IF NOT EXISTS results ("
+    " run_id INTEGER NOT NULL,"
+    " app_id TEXT NOT NULL,"
+    " checked_at REAL NOT NULL,"
+    " region TEXT,"
+    " conclusion TEXT NOT NULL,"
+    " category TEXT NOT NULL,"
+    " deadline TEXT,"
+    " last_status TEXT,"
+    " last_status_at TEXT,"
+    " statuses TEXT NOT NULL,"      # JSON list of newStatus values
+    " status_dates TEXT NOT NULL,"  # JSON list of their createDate
+    " queue_errors TEXT NOT NULL)",  # JSON list of MsgQueue LastError texts
+    "CREATE INDEX IF NOT EXISTS results_app ON results (app_id, checked_at)",
+    "CREATE INDEX IF NOT EXISTS results_category ON results (category, checked_at)",
+    "CREATE INDEX IF NOT EXISTS results_region ON results (region, checked_at)",
+    "CREATE INDEX IF NOT EXISTS results_checked ON results (checked_at)",
+)
+
+COLUMNS = ('app_id', 'checked_at', 'region', 'conclusion', 'category', 'deadline', 'last_status',
+           'last_status_at', 'statuses', 'status_dates', 'queue_errors', 'run_id')
+
+
+def _timestamp(value):
+    """
+    Accept None, an epoch timestamp, a datetime or a "YYYY-MM-DD[ HH:MM[:SS]]" string.
+    """
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return datetime.fromisoformat(value).timestamp()
+
+
+def _row_dict(row):
+    result = dict(zip(COLUMNS, row))
+    for key in ('statuses', 'status_dates', 'queue_errors'):
+        result[key] = json.loads(result[key])
+    result['checked_at'] = datetime.fromtimestamp(result['checked_at'])
+    return result
+
+
+class ResultStore:
+    """
+    Local SQLite history of analysis results: every analyzed application is stored
+    per run with its statuses and their dates, deadline, MsgQueue errors and
+    conclusion, indexed by appId, conclusion category, region and check time.
+
+    Inserts are buffered and written with executemany every commit_every results,
+    each batch in its own short transaction; a store locked by another writer (a
+    concurrent run, the report CLI) is waited for up to BUSY_TIMEOUT seconds.
+    Opening the store starts a new run labelled source, unless start_run is False
+    (for reading only).
+    """
+
+    def __init__(self, path, source=None, commit_every=500, start_run=True):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.commit_every = commit_every
+        self._lock = threading.Lock()
+        self._pending = []
+        self._conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in SCHEMA:
+            self._conn.execute(statement)
+        self.run_id = None
+        if start_run:
+            self.run_id = self._conn.execute("INSERT INTO runs (started_at, source) VALUES (?, ?)",
+                                             (time.time(), source)).lastrowid
+        self._conn.commit()
+
+    def add(self, app_id, record, conclusion, region=None, checked_at=None):
+        """
+        Buffer the result for one application; record is a page_extractor.ApplicationRecord.
+        """
+        statuses = list(record.statuses)
+        status_dates = list(record.status_dates)
+        row = (
+            self.run_id, app_id, checked_at if checked_at is not None else time.time(), region,
+            conclusion, conclusion_category(conclusion), record.deadline,
+            statuses[-1] if statuses else None, status_dates[-1] if status_dates else None,
+            json.dumps(statuses, ensure_ascii=False), json.dumps(status_dates, ensure_ascii=False),
+            json.dumps(list(record.queue_errors), ensure_ascii=False),
+        )
+        with self._lock:
+            self._pending.append(row)
+            if len(self._pending) >= self.commit_every:
+                self._flush()
+
+    def _flush(self):
+        # Callers hold self._lock
+        if self._pending:
+            self._conn.executemany(
+                "INSERT INTO results (run_id, app_id, checked_at, region, conclusion, category, deadline,"
+                " last_status, last_status_at, statuses, status_dates, queue_errors)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", self._pending)
+            self._conn.commit()
+            self._pending = []
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _select(self, sql, params):
+        with self._lock:
+            self._flush()
+            return [_row_dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def history(self, app_id):
+        """
+        All results of one application, oldest first.
+        """
+        return self._select(f"SELECT {', '.join(COLUMNS)} FROM results WHERE app_id = ? ORDER BY checked_at",
+                            (app_id,))
+
+    def query(self, region=None, category=None, since=None, until=None, app_ids=None, latest_only=False):
+        """
+        Results filtered by region, conclusion category and check time [since, until).
+        With latest_only, only the latest result of each application (within the
+        time range) is returned. app_ids limits the query to those applications.
+        """
+        conditions = []
+        params = []
+        if since is not None:
+            conditions.append("checked_at >= ?")
+            params.append(_timestamp(since))
+        if until is not None:
+            conditions.append("checked_at < ?")
+            params.append(_timestamp(until))
+        if app_ids is not None:
+            app_ids = list(app_ids)
+            conditions.append("app_id IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(app_ids))
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        if latest_only:
+            source = (f"(SELECT *, ROW_NUMBER() OVER (PARTITION BY app_id ORDER BY checked_at DESC) AS position"
+                      f" FROM results {where})")
+            outer = ["position = 1"]
+        else:
+            source = f"(SELECT * FROM results {where})"
+            outer = []
+        outer_params = []
+        if region is not None:
+            outer.append("region = ?")
+            outer_params.append(region)
+        if category is not None:
+            outer.append("category = ?")
+            outer_params.append(category)
+
+        outer_where = f"WHERE {' AND '.join(outer)}" if outer else ""
+        return self._select(f"SELECT {', '.join(COLUMNS)} FROM {source} {outer_where} ORDER BY app_id, checked_at",
+                            params + outer_params)
+
+    def transitions(self, from_category, to_category, since=None, until=None, region=None):
+        """
+        Applications whose conclusion category changed from from_category to
+        to_category between two consecutive results, the later one checked in
+        [since, until). Returns (app_id, region, previous check, check time, conclusion) tuples.
+        """
+        conditions = ["previous_category = ?", "category = ?"]
+        params = [from_category, to_category]
+        if since is not None:
+            conditions.append("checked_at >= ?")
+            params.append(_timestamp(since))
+        if until is not None:
+            conditions.append("checked_at < ?")
+            params.append(_timestamp(until))
+        if region is not None:
+            conditions.append("region = ?")
+            params.append(region)
+
+        sql = ("SELECT app_id, region, previous_checked_at, checked_at, conclusion FROM ("
+               " SELECT app_id, region, checked_at, conclusion, category,"
+               "  LAG(category) OVER (PARTITION BY app_id ORDER BY checked_at) AS previous_category,"
+               "  LAG(checked_at) OVER (PARTITION BY app_id ORDER BY checked_at) AS previous_checked_at"
+               " FROM results)"
+               f" WHERE {' AND '.join(conditions)} ORDER BY checked_at")
+        with self._lock:
+            self._flush()
+            rows = self._conn.execute(sql, params).fetchall()
+        return [(app_id, row_region, datetime.fromtimestamp(previous), datetime.fromtimestamp(checked), conclusion)
+                for app_id, row_region, previous, checked, conclusion in rows]
+
+    def latest_conclusions(self, app_ids):
+        """
+        {app_id: latest conclusion} for the given applications that are in the store.
+        """
+        return {row['app_id']: row['conclusion'] for row in self.query(app_ids=app_ids, latest_only=True)}
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._conn.close()
+
+
+def export_results(rows, output_file):
+    """
+    Write query() results to a new workbook, one row per result.
+    """
+    from openpyxl import Workbook
+
+    from workbook_io import save_workbook_atomic
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Результаты')
+    ws.append(['Идентификатор заявки', 'Регион', 'Проверено', 'Заключение', 'Последний статус',
+               'Дата статуса', 'Deadline', 'Ошибки очереди'])
+    for row in rows:
+        ws.append([row['app_id'], row['region'], row['checked_at'], row['conclusion'], row['last_status'],
+                   row['last_status_at'], row['deadline'], '; '.join(row['queue_errors'])])
+    save_workbook_atomic(wb, output_file)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Отчеты по сохраненным результатам проверки заявок")
+    parser.add_argument('store', help="файл results.sqlite3")
+    parser.add_argument('--region')
+    parser.add_argument('--category', help="заключение без подробностей, например \"ГУ на исполнении\"")
+    parser.add_argument('--since', help="YYYY-MM-DD")
+    parser.add_argument('--until', help="YYYY-MM-DD")
+    parser.add_argument('--all', action='store_true', help="все проверки, а не только последние")
+    parser.add_argument('--app-id', help="история одной заявки")
+    parser.add_argument('--transition', nargs=2, metavar=('FROM', 'TO'), help="заявки, перешедшие из FROM в TO")
+    parser.add_argument('--export', metavar='XLSX', help="выгрузить результат в Excel")
+    args = parser.parse_args()
+
+    store = ResultStore(args.store, start_run=False)
+    try:
+        if args.transition:
+            for app_id, region, previous, checked, conclusion in store.transitions(
+                    args.transition[0], args.transition[1], args.since, args.until, args.region):
+                print(f"{app_id}\t{region or ''}\t{previous:%Y-%m-%d %H:%M} -> {checked:%Y-%m-%d %H:%M}\t{conclusion}")
+        else:
+            if args.app_id:
+                rows = store.history(args.app_id)
+            else:
+                rows = store.query(region=args.region, category=args.category, since=args.since, until=args.until,
+                                   latest_only=not args.all)
+            if args.export:
+                export_results(rows, args.export)
+                print(f"Выгружено {len(rows)} строк в {args.export}")
+            else:
+                for row in rows:
+                    print(f"{row['app_id']}\t{row['region'] or ''}\t{row['checked_at']:%Y-%m-%d %H:%M}\t"
+                          f"{row['conclusion']}")
+    finally:
+        store.close()
@@ -0,0 +1,225 @@
+import hmac
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+
+class ShardCoordinator:
+    """
+    Hands out shards of application IDs to workers and collects their conclusions.
+
+    A claimed shard is leased to its worker for lease_timeout seconds and the worker
+    keeps the lease alive with heartbeats. A shard whose lease runs out (the worker
+    died or lost the network) goes back to the front of the queue for another worker.
+    Only the worker holding a shard's lease can complete it; results from a worker
+    whose lease ran out, or from anyone else, are refused.
+    Completed shards are put on the completed queue as (shard, worker, results).
+    idle_seconds tells how long no worker has been in touch.
+    """
+
+    def __init__(self, app_ids, shard_size=500, lease_timeout=60):
+        app_ids = list(app_ids)
+        self.shards = [app_ids[i:i + shard_size] for i in range(0, len(app_ids), shard_size)]
+        self.lease_timeout = lease_timeout
+        self.completed = deque()
+
+        self._lock = threading.Lock()
+        self._pending = deque(range(len(self.shards)))
+        self._leases = {}  # shard -> (worker, lease deadline)
+        self._done = set()
+        self._last_contact = time.monotonic()
+
+    @property
+    def idle_seconds(self):
+        with self._lock:
+            return time.monotonic() - self._last_contact
+
+    @property
+    def finished(self):
+        with self._lock:
+            return len(self._done) == len(self.shards)
+
+    def status(self):
+        with self._lock:
+            self._expire()
+            return {'shards': len(self.shards), 'pending': len(self._pending),
+                    'leased': len(self._leases), 'done': len(self._done)}
+
+    def claim(self, worker):
+        """
+        Lease the next shard to worker. The reply has shard and app_ids, or wait when
+        every remaining shard is leased to someone else, or done when all are complete.
+        """
+        with self._lock:
+            self._last_contact = time.monotonic()
+            self._expire()
+            if self._pending:
+                shard = self._pending.popleft()
+                self._leases[shard] = (worker, time.monotonic() + self.lease_timeout)
+                print(f"Шард {shard + 1}/{len(self.shards)} выдан исполнителю {worker}")
+                return {'shard': shard, 'app_ids': self.shards[shard], 'lease_timeout': self.lease_timeout}
+            if self._leases:
+                return {'wait': True}
+            return {'done': True}
+
+    def heartbeat(self, shard, worker):
+        with self._lock:
+            self._last_contact = time.monotonic()
+            lease = self._leases.get(shard)
+            if lease is None or lease[0] != worker:
+                return {'ok': False}
+            self._leases[shard] = (worker, time.monotonic() + self.lease_timeout)
+            return {'ok': True}
+
+    def complete(self, shard, worker, results):
+        with self._lock:
+            self._last_contact = time.monotonic()
+            self._expire()
+            lease = self._leases.get(shard)
+            if lease is None or lease[0] != worker:
+                return {'ok': False}
+            # Only the shard's own applications, and only text conclusions, reach the workbook
+            shard_results = {}
+            for app_id in self.shards[shard]:
+                conclusion = results.get(app_id)
+                shard_results[app_id] = conclusion if isinstance(conclusion, str) else None
+            self._done.add(shard)
+            del self._leases[shard]
+            self.completed.append((shard, worker, shard_results))
+            return {'ok': True}
+
+    def _expire(self):
+        # Callers hold self._lock
+        now = time.monotonic()
+        for shard, (worker, deadline) in list(self._leases.items()):
+            if now > deadline:
+                del self._leases[shard]
+                self._pending.appendleft(shard)
+                print(f"Шард {shard + 1}: исполнитель {worker} не отвечает, шард возвращен в очередь")
+
+
+# Header carrying the shared token of a sharded run
+TOKEN_HEADER = 'X-Shard-Token'
+
+
+def serve_coordinator(coordinator, token, host='127.0.0.1', port=8770):
+    """
+    Serve the coordinator over HTTP/JSON from a background thread and return the server.
+    Workers POST to /claim, /heartbeat and /complete; GET /status shows progress.
+    Every request must carry the shared token in the X-Shard-Token header.
+    The default host only accepts workers on this machine; bind to "0.0.0.0" or an
+    address of the host to let other machines in.
+    """
+    if not token:
+        raise ValueError("The coordinator needs a shared token")
+
+    class Handler(BaseHTTPRequestHandler):
+        def _authorized(self):
+            if hmac.compare_digest(self.headers.get(TOKEN_HEADER, ''), token):
+                return True
+            self._reply({'error': 'forbidden'}, 403)
+            return False
+
+        def _reply(self, payload, code=200):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if not self._authorized():
+                return
+            if self.path == '/status':
+                self._reply(coordinator.status())
+            else:
+                self._reply({'error': 'not found'}, 404)
+
+        def do_POST(self):
+            if not self._authorized():
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                request = json.loads(self.rfile.read(length) or b'{}')
+                if self.path == '/claim':
+                    self._reply(coordinator.claim(request['worker']))
+                elif self.path == '/heartbeat':
+                    self._reply(coordinator.heartbeat(request['shard'], request['worker']))
+                elif self.path == '/complete':
+                    self._reply(coordinator.complete(request['shard'], request['worker'], request['results']))
+                else:
+                    self._reply({'error': 'not found'}, 404)
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                self._reply({'error': str(e)}, 400)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class CoordinatorClient:
+    """
+    Worker side of the coordinator protocol.
+    """
+
+    def __init__(self, url, token, timeout=30):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers[TOKEN_HEADER] = token
+
+    def _post(self, path, payload):
+        response = self.session.post(self.url + path, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def claim(self, worker):
+        return self._post('/claim', {'worker': worker})
+
+    def heartbeat(self, shard, worker):
+        return self._post('/heartbeat', {'shard': shard, 'worker': worker})
+
+    def complete(self, shard, worker, results):
+        return self._post('/complete', {'shard': shard, 'worker': worker, 'results': results})
+
+    def close(self):
+        self.session.close()
+
+
+class Heartbeat:
+    """
+    Context manager that keeps a shard lease alive from a background thread.
+    """
+
+    def __init__(self, client, shard, worker, interval):
+        self.client = client
+        self.shard = shard
+        self.worker = worker
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if not self.client.heartbeat(self.shard, self.worker).get('ok'):
+                    print(f"Аренда шарда {self.shard + 1} потеряна, результат может быть отброшен")
+            except requests.RequestException as e:
+                print(f"Координатор недоступен: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
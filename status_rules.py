@@ -0,0 +1,161 @@
+import hashlib
+import re
+from datetime import datetime
+
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+_TIMESTAMP_RE = re.compile(r'([0-9]{4})-([0-9]{2})-([0-9]{2}) ([0-9]{2}):([0-9]{2}):([0-9]{2})\.([0-9]{1,6})\Z')
+
+
+def parse_timestamp(text):
+    """
+    Parse a "%Y-%m-%d %H:%M:%S.%f" timestamp. The usual fixed-width form is sliced
+    by a regex and built directly; anything else falls back to datetime.strptime.
+    Raises ValueError for invalid timestamps, like strptime.
+    """
+    match = _TIMESTAMP_RE.match(text)
+    if match is None:
+        return datetime.strptime(text, TIMESTAMP_FORMAT)
+
+    year, month, day, hour, minute, second, fraction = match.groups()
+    return datetime(int(year), int(month), int(day), int(hour), int(minute), int(second),
+                    int(fraction.ljust(6, '0')))
+
+
+def status_before_deadline(status_create_date, deadline):
+    """
+    Check if status was created before deadline.
+    """
+    try:
+        if not status_create_date or not deadline:
+            return False
+
+        # Skip non-date entries like "currentState"
+        if _TIMESTAMP_RE.match(status_create_date) is None and \
+                not status_create_date.replace('-', '').replace(':', '').replace('.', '').replace(' ', '').isdigit():
+            return False
+
+        return parse_timestamp(status_create_date) <= parse_timestamp(deadline)
+    except Exception as e:
+        print(f"Error checking status deadline: {e}")
+        return False
+
+
+# Marks a priority status that ends the application; its conclusion depends on the deadline
+FINAL = object()
+
+# The last of these statuses in the history decides the conclusion on its own
+PRIORITY_RULES = {
+    'STARTED': "ГУ на исполнении",
+    'FINISHED': FINAL,
+    'READY': FINAL,
+    'HANDED': FINAL,
+    'CANCELED': "ГУ отменена",
+}
+
+# Conclusion for a final status, by whether the first final status met the deadline
+# (None: the deadline or the status date is missing)
+DEADLINE_RULES = {
+    True: "ГУ оказана своевременно",
+    False: "ГУ оказана несвоевременно",
+    None: "ГУ завершена (не удалось проверить сроки)",
+}
+
+# Without a priority status: patterns matched against the end of the history
+TAIL_RULES = [
+    (('ACCEPTED', 'LAUNCHED', 'ACCEPTED'), "ГУ не доставлена до исполнителя"),
+]
+
+# Statuses whose occurrences are counted, and the conclusion for each count combination
+COUNTED_STATUSES = ('ACCEPTED', 'LAUNCHED')
+COUNT_RULES = {
+    (1, 0): "ГУ принята от заявителя",
+    (2, 0): "Оператор цон не провел через накопитель Б",
+    (2, 1): "ГУ на исполнении",
+    (1, 1): "Рассмотреть на SHEP",
+}
+
+NO_STATUSES = "Нет данных о статусах"
+UNKNOWN_SEQUENCE = "Неопределенная последовательность статусов: {sequence}"
+
+
+class StatusRules:
+    """
+    The status decision table compiled into a single pass over the status history.
+
+    The tables default to the module-level rules; pass changed copies to add
+    region-specific rules, e.g. StatusRules(count_rules={**COUNT_RULES, (3, 1): "..."}).
+    version is a digest of the tables that changes whenever any rule does, so stored
+    conclusions can be told apart by the rules that produced them.
+    """
+
+    def __init__(self, priority_rules=PRIORITY_RULES, deadline_rules=DEADLINE_RULES, tail_rules=TAIL_RULES,
+                 counted_statuses=COUNTED_STATUSES, count_rules=COUNT_RULES):
+        self.priority_rules = dict(priority_rules)
+        self.deadline_rules = dict(deadline_rules)
+        self.tail_rules = [(tuple(pattern), conclusion) for pattern, conclusion in tail_rules]
+        self.counted_statuses = tuple(counted_statuses)
+        self.count_rules = {tuple(counts): conclusion for counts, conclusion in count_rules.items()}
+
+        # Compile every status into one action: count it at an index, or remember it as a priority status
+        self._actions = {status: index for index, status in enumerate(self.counted_statuses)}
+        for status, conclusion in self.priority_rules.items():
+            self._actions[status] = (status, conclusion is FINAL)
+
+        tables = (
+            [(status, 'FINAL' if conclusion is FINAL else conclusion) for status, conclusion in self.priority_rules.items()],
+            sorted(self.deadline_rules.items(), key=repr),
+            self.tail_rules,
+            self.counted_statuses,
+            sorted(self.count_rules.items()),
+            NO_STATUSES,
+            UNKNOWN_SEQUENCE,
+        )
+        self.version = hashlib.sha1(repr(tables).encode('utf-8')).hexdigest()[:12]
+
+    def evaluate(self, statuses, status_dates, deadline):
+        """
+        Return the conclusion for a chronological status history.
+        """
+        if not statuses:
+            return NO_STATUSES
+
+        actions = self._actions
+        counts = [0] * len(self.counted_statuses)
+        last_priority = None
+        first_final_index = -1
+
+        for i, status in enumerate(statuses):
+            action = actions.get(status)
+            if action is None:
+                continue
+            if action.__class__ is int:
+                counts[action] += 1
+            else:
+                last_priority = action[0]
+                if action[1] and first_final_index == -1:
+                    first_final_index = i
+
+        if last_priority is not None:
+            conclusion = self.priority_rules[last_priority]
+            if conclusion is not FINAL:
+                return conclusion
+
+            # Deadline is checked against the FIRST final status
+            status_create_date = status_dates[first_final_index] if first_final_index < len(status_dates) else ""
+            if deadline and status_create_date:
+                return self.deadline_rules[status_before_deadline(status_create_date, deadline)]
+            return self.deadline_rules[None]
+
+        for pattern, conclusion in self.tail_rules:
+            if len(statuses) >= len(pattern) and tuple(statuses[-len(pattern):]) == pattern:
+                return conclusion
+
+        conclusion = self.count_rules.get(tuple(counts))
+        if conclusion is not None:
+            return conclusion
+        return UNKNOWN_SEQUENCE.format(sequence=' -> '.join(statuses))
+
+
+DEFAULT_RULES = StatusRules()
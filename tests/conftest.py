@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# The modules live flat in the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def stub_server():
+    from benchmarks.stub_server import StubServer
+
+    with StubServer() as server:
+        yield server
@@ -0,0 +1,60 @@
+import page_extractor
+import status_rules
+from error_owners import ErrorOwnerMatcher
+
+
+def test_rules_version_follows_the_tables():
+    assert status_rules.StatusRules().version == status_rules.DEFAULT_RULES.version
+    changed = status_rules.StatusRules(count_rules={**status_rules.COUNT_RULES, (3, 1): "Новое правило"})
+    assert changed.version != status_rules.DEFAULT_RULES.version
+    renamed = status_rules.StatusRules(deadline_rules={**status_rules.DEADLINE_RULES, True: "Вовремя"})
+    assert renamed.version != status_rules.DEFAULT_RULES.version
+
+
+def test_analysis_version_follows_the_error_mapping():
+    try:
+        page_extractor.set_error_owners(None)
+        without_mapping = page_extractor.analysis_version()
+        page_extractor.set_error_owners(ErrorOwnerMatcher({'Таймаут': 'ГБД ФЛ'}))
+        first = page_extractor.analysis_version()
+        page_extractor.set_error_owners(ErrorOwnerMatcher({'Таймаут': 'ШЭП'}))
+        second = page_extractor.analysis_version()
+    finally:
+        page_extractor.set_error_owners(None)
+    assert len({without_mapping, first, second}) == 3
+
+
+def _run(stub_server, tmp_path, **options):
+    from excel_processor_dynamic import FetchEngine
+
+    engine = FetchEngine(base_url=stub_server.base_url, max_workers=4, requests_per_second=0, adaptive_rate=False,
+                         cache_path=str(tmp_path / 'cache.sqlite3'), archive_path=None, store_path=None, **options)
+    try:
+        results = dict((app_id, conclusion) for (_, app_id), conclusion in engine.run([(None, str(number))
+                                                                                        for number in range(1, 61)]))
+        return results, engine.cache.hits, engine.cache.stale
+    finally:
+        engine.close()
+        page_extractor.set_error_owners(None)
+
+
+def test_changed_mapping_reanalyzes_cached_pages(tmp_path, stub_server):
+    import helpers
+
+    first, _, _ = _run(stub_server, tmp_path)
+    final = [app_id for app_id, conclusion in first.items() if helpers.isTerminalConclusion(conclusion)]
+    assert final
+
+    again, hits, stale = _run(stub_server, tmp_path)
+    assert again == first and hits == len(first) and stale == 0
+
+    requests_before = stub_server.requests
+    mapping = tmp_path / 'mapping.txt'
+    mapping.write_text("Таймаут - Новый ответственный\n", encoding='utf-8')
+    remapped, hits, stale = _run(stub_server, tmp_path, error_mapping_path=str(mapping))
+    assert hits == 0 and stale == len(final)
+    # Final pages came from the cache, only the others were fetched
+    assert stub_server.requests - requests_before == len(first) - len(final)
+    with_errors = [app_id for app_id in final if "Однако ошибка" in first[app_id]]
+    assert with_errors
+    assert all("(ответственный: " in remapped[app_id] for app_id in with_errors)
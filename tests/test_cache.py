@@ -0,0 +1,97 @@
+import multiprocessing
+
+from cache import ResponseCache
+
+
+def _writer(path, prefix, count, errors):
+    try:
+        cache = ResponseCache(path)
+        for number in range(count):
+            cache.put(f'{prefix}{number}', '<html>page</html>', 'ГУ на исполнении')
+            cache.get_conclusion(f'{prefix}{number}')
+        cache.close()
+    except Exception as e:
+        errors.put(repr(e))
+
+
+def test_hit_does_not_write(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite3'), touch_every=10)
+    cache.put('1', '<html></html>', 'ГУ на исполнении')
+    changes = cache._conn.total_changes
+
+    assert cache.get_conclusion('1') == 'ГУ на исполнении'
+    assert cache._conn.total_changes == changes
+    assert not cache._conn.in_transaction
+    cache.close()
+
+
+def test_writes_are_committed_at_once(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = ResponseCache(path)
+    cache.put('1', '<html></html>', 'ГУ отменена', terminal=True)
+    assert not cache._conn.in_transaction
+
+    other = ResponseCache(path)
+    assert other.get_conclusion('1') == 'ГУ отменена'
+    other.close()
+    cache.close()
+
+
+def test_eviction_runs_during_the_run(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite3'), max_bytes=2000, evict_every=10)
+    for number in range(50):
+        # Random-looking pages so they do not compress to nothing
+        cache.put(str(number), ''.join(chr(0x410 + (number * 7 + i * 13) % 32) for i in range(400)),
+                  'ГУ на исполнении')
+    total = cache._conn.execute("SELECT SUM(size) FROM pages").fetchone()[0]
+    assert total <= 2000
+    cache.close()
+
+
+def test_processes_share_the_cache(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    context = multiprocessing.get_context('spawn')
+    errors = context.Queue()
+    workers = [context.Process(target=_writer, args=(path, f'w{index}-', 200, errors)) for index in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert errors.empty()
+    cache = ResponseCache(path)
+    assert cache._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0] == 600
+    cache.close()
+
+
+def test_other_version_is_not_served(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    old = ResponseCache(path, version='1')
+    old.put('1', '<html>running</html>', 'ГУ на исполнении')
+    old.put('2', '<html>served</html>', 'ГУ оказана своевременно', terminal=True)
+    old.close()
+
+    cache = ResponseCache(path, version='2')
+    # A page that can still change is fetched again, a final one is analyzed again
+    assert cache.lookup('1') == (None, None)
+    assert cache.lookup('2') == ('<html>served</html>', None)
+    cache.put('2', '<html>served</html>', 'ГУ оказана несвоевременно', terminal=True)
+    assert cache.lookup('2') == (None, 'ГУ оказана несвоевременно')
+    assert (cache.hits, cache.stale, cache.misses) == (1, 1, 1)
+    cache.close()
+
+
+def test_cache_of_an_earlier_run_is_migrated(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / 'cache.sqlite3')
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE pages (app_id TEXT PRIMARY KEY, fetched_at REAL NOT NULL, accessed_at REAL NOT NULL,"
+                 " html BLOB, size INTEGER NOT NULL DEFAULT 0, conclusion TEXT, terminal INTEGER NOT NULL DEFAULT 0)")
+    conn.execute("INSERT INTO pages VALUES ('1', 0, 0, NULL, 0, 'ГУ отменена', 1)")
+    conn.commit()
+    conn.close()
+
+    cache = ResponseCache(path, version='1')
+    assert cache.lookup('1') == (None, None)
+    cache.close()
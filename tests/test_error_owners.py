@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import pickle
+import random
+
+import pytest
+
+import error_owners
+import helpers
+from error_owners import UNKNOWN_OWNER, ErrorOwnerMatcher, load_error_owner_matcher
+
+
+def baseline_owner(error_message, error_mapping):
+    # find_error_owner of the baseline helpers.py: the first entry contained in the message wins
+    for error_text, owner in error_mapping.items():
+        if error_text in error_message:
+            return owner
+    return "Неизвестно"
+
+
+MAPPING = {
+    'Сервис ЕСЭДО недоступен': 'ЕСЭДО',
+    'недоступен': 'Сеть',
+    'Timeout': 'ШЭП',
+    'Read timed out': 'ШЭП (чтение)',
+    'ГБД ФЛ': 'ГБД ФЛ',
+    'ГБД': 'ГБД общий',
+    'abcd': 'A',
+    'bc': 'B',
+    'bcde': 'C',
+}
+
+# LastError message -> owner the baseline scan gave it
+MESSAGES = [
+    ('Сервис ЕСЭДО недоступен', 'ЕСЭДО'),
+    ('Ошибка: Сервис ЕСЭДО недоступен (код 503)', 'ЕСЭДО'),
+    ('Сервис ГБД недоступен', 'Сеть'),
+    ('Read timed out', 'ШЭП (чтение)'),
+    ('Timeout after Read timed out', 'ШЭП'),
+    ('Нет ответа от ГБД ФЛ', 'ГБД ФЛ'),
+    ('Нет ответа от ГБД ЮЛ', 'ГБД общий'),
+    ('abcde', 'A'),
+    ('xbcdex', 'B'),
+    ('abc', 'B'),
+    ('timeout', 'Неизвестно'),
+    ('', 'Неизвестно'),
+]
+
+
+@pytest.mark.parametrize('message, expected', MESSAGES)
+def test_owner_matches_baseline(message, expected):
+    assert baseline_owner(message, MAPPING) == expected
+    assert ErrorOwnerMatcher(MAPPING).find_owner(message) == expected
+    assert helpers.find_error_owner(message, ErrorOwnerMatcher(MAPPING)) == expected
+
+
+def test_random_mappings_match_baseline():
+    # Short texts over a small alphabet overlap a lot, which is where failure links go wrong
+    rng = random.Random(13)
+    for _ in range(300):
+        texts = {''.join(rng.choice('abc') for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 8))}
+        mapping = {text: f"owner-{index}" for index, text in enumerate(rng.sample(sorted(texts), len(texts)))}
+        matcher = ErrorOwnerMatcher(mapping)
+        for _ in range(20):
+            message = ''.join(rng.choice('abcd') for _ in range(rng.randint(0, 12)))
+            assert matcher.find_owner(message) == baseline_owner(message, mapping), (mapping, message)
+
+
+def test_empty_mapping_and_empty_text():
+    assert ErrorOwnerMatcher({}).find_owner('Сервис недоступен') == UNKNOWN_OWNER
+    mapping = {'': 'Все', 'недоступен': 'Сеть'}
+    assert ErrorOwnerMatcher(mapping).find_owner('Сервис недоступен') == baseline_owner('Сервис недоступен', mapping)
+
+
+def write_mapping(tmp_path):
+    mapping_path = tmp_path / 'errors.txt'
+    mapping_path.write_text(''.join(f"{text} - {owner}\n" for text, owner in MAPPING.items()), encoding='utf-8')
+    return str(mapping_path)
+
+
+def test_loaded_matcher_matches_baseline(tmp_path):
+    mapping_path = write_mapping(tmp_path)
+
+    for _ in range(2):
+        # The second load comes from the compiled automaton saved next to the mapping
+        matcher = load_error_owner_matcher(mapping_path)
+        for message, expected in MESSAGES:
+            assert matcher.find_owner(message) == expected
+    assert os.path.exists(mapping_path + '.automaton')
+
+
+def cached_digest(mapping_path):
+    with open(mapping_path + '.automaton', encoding='utf-8') as file:
+        return json.load(file)['digest']
+
+
+class Planted:
+    # Any object a pickle would rebuild by calling something; loading the cache must never do that
+    def __init__(self, path):
+        self.path = path
+
+    def __reduce__(self):
+        return (os.mkdir, (self.path,))
+
+
+@pytest.mark.parametrize('content', ['pickle', 'other_format', 'other_digest', 'broken_tables', 'garbage'])
+def test_stale_or_foreign_automaton_is_ignored(tmp_path, content):
+    mapping_path = write_mapping(tmp_path)
+    digest = hashlib.sha1(open(mapping_path, 'rb').read()).hexdigest()
+    tables = ErrorOwnerMatcher({'Timeout': 'Чужой'}).to_tables()
+    planted_dir = str(tmp_path / 'planted')
+
+    if content == 'pickle':
+        data = pickle.dumps((digest, Planted(planted_dir)))
+    else:
+        cached = {
+            'other_format': {'format': error_owners.AUTOMATON_FORMAT + 1, 'digest': digest, 'tables': tables},
+            'other_digest': {'format': error_owners.AUTOMATON_FORMAT, 'digest': '0' * 40, 'tables': tables},
+            'broken_tables': {'format': error_owners.AUTOMATON_FORMAT, 'digest': digest,
+                              'tables': dict(tables, fail=[99] * len(tables['fail']))},
+            'garbage': None,
+        }[content]
+        data = b'\x00not json' if cached is None else json.dumps(cached).encode('utf-8')
+    with open(mapping_path + '.automaton', 'wb') as file:
+        file.write(data)
+
+    matcher = load_error_owner_matcher(mapping_path)
+    for message, expected in MESSAGES:
+        assert matcher.find_owner(message) == expected
+    assert not os.path.exists(planted_dir)
+    # The file is replaced by the automaton of the current mapping
+    assert cached_digest(mapping_path) == digest
+    assert load_error_owner_matcher(mapping_path).to_tables() == matcher.to_tables()
@@ -0,0 +1,66 @@
+import time
+
+import pytest
+
+from benchmarks.stub_server import StubServer
+from fetcher import DEFAULT_MAX_RATE, AdaptiveRateLimiter, Fetcher, RateLimiter
+
+
+@pytest.mark.parametrize('requests_per_second, max_rate, expected', [
+    (5, None, DEFAULT_MAX_RATE),
+    (DEFAULT_MAX_RATE, None, DEFAULT_MAX_RATE),
+    (200, None, 200),
+    (200, 80, 80),
+])
+def test_max_rate(requests_per_second, max_rate, expected):
+    assert AdaptiveRateLimiter(requests_per_second, max_rate=max_rate).max_rate == expected
+
+
+def test_fast_start_is_not_clamped():
+    limiter = AdaptiveRateLimiter(200, adjust_interval=0)
+    time.sleep(0.01)
+    limiter.observe(0.01)
+    assert limiter.requests_per_second == 200
+
+    limiter.observe(None, failed=True)
+    assert limiter.requests_per_second == 100
+
+
+class RecordingLimiter(AdaptiveRateLimiter):
+    def __init__(self, requests_per_second):
+        super().__init__(requests_per_second, adjust_interval=3600)
+        self.observed = []
+        self.slots = 0
+
+    def acquire(self, deadline=None):
+        self.slots += 1
+        return super().acquire(deadline)
+
+    def observe(self, latency, failed=False):
+        self.observed.append((latency, failed))
+
+
+def test_hedge_is_skipped_without_a_rate_limiter_slot():
+    # At 1 request per second the next slot comes after the first request has timed out
+    with StubServer(latency=0.3) as server:
+        fetcher = Fetcher(limiter=RateLimiter(1), hedge_after=0.05, timeout=0.5)
+        try:
+            assert fetcher.fetch(server.base_url + '1') == server.page('1').decode('utf-8')
+        finally:
+            fetcher.close()
+        assert server.requests == 1
+
+
+def test_hedge_takes_a_slot_and_is_observed():
+    with StubServer(latency=0.3) as server:
+        limiter = RecordingLimiter(20)
+        fetcher = Fetcher(limiter=limiter, hedge_after=0.05, timeout=2)
+        try:
+            assert fetcher.fetch(server.base_url + '1') == server.page('1').decode('utf-8')
+            time.sleep(0.5)
+        finally:
+            fetcher.close()
+        assert server.requests == 2
+        # A slot and a sample for the first request and for the hedge
+        assert limiter.slots == 2
+        assert len(limiter.observed) == 2
@@ -0,0 +1,58 @@
+import math
+
+import pandas as pd
+import pytest
+
+from excel_processor_dynamic import get_id_with_leading_zeros, normalize_identifiers
+
+
+def baseline_app_id(raw):
+    # The row loop of the baseline process_excel_with_dynamic_fetch: skip empty cells, else normalize one by one
+    if pd.isna(raw) or str(raw).strip() == '' or str(raw).strip() == 'nan':
+        return None
+    return get_id_with_leading_zeros(raw)
+
+
+# Raw identifier cell -> app_id the baseline produced for it
+IDENTIFIERS = [
+    ('002270000001', '002270000001'),
+    ('  002270000001 ', '002270000001'),
+    ('2270000001', '2270000001'),
+    (2270000001, '2270000001'),
+    (2270000001.0, '2270000001'),
+    ('123456.0', '123456'),
+    ('123456.50', '123456.50'),
+    (123456.5, '123456.5'),
+    ('2.27E+09', '2270000000'),
+    ('2.27e+09', '2270000000'),
+    ('1.5e+3', '1500'),
+    ('1e+3', '1000'),
+    ('E+5', 'E+5'),
+    ('+7', '+7'),
+    ('1.0e+400', '1.0e+400'),
+    ('12.34.56', '12.34.56'),
+    ('abc', 'abc'),
+    ('NaN', 'NaN'),
+    ('nan', None),
+    (' nan ', None),
+    ('', None),
+    ('   ', None),
+    (None, None),
+    (math.nan, None),
+]
+
+
+@pytest.mark.parametrize('raw, expected', IDENTIFIERS, ids=[repr(raw) for raw, _ in IDENTIFIERS])
+def test_identifier_matches_baseline(raw, expected):
+    assert baseline_app_id(raw) == expected
+    assert normalize_identifiers([raw]) == [expected]
+
+
+def test_mixed_column_matches_baseline():
+    # Vectorized over one column, whose mix of types must not change any single value
+    column = [raw for raw, _ in IDENTIFIERS] * 3
+    assert normalize_identifiers(column) == [baseline_app_id(raw) for raw in column]
+
+
+def test_empty_column():
+    assert normalize_identifiers([]) == []
@@ -0,0 +1,37 @@
+import json
+
+from journal import ProgressJournal
+
+
+def test_resume_from_a_truncated_journal(tmp_path):
+    path = str(tmp_path / 'output.xlsx.journal')
+    first = ProgressJournal(path)
+    for row in (2, 3, 4):
+        first.record(row, f"00{row}", "ГУ на исполнении")
+    first.close()
+    # A crash in the middle of the next line
+    line = json.dumps({'row': 5, 'app_id': '005', 'conclusion': "ГУ отменена"}, ensure_ascii=False)
+    with open(path, 'a', encoding='utf-8') as file:
+        file.write(line[:len(line) // 2])
+
+    resumed = ProgressJournal(path)
+    done = resumed.load()
+    assert sorted(done) == [2, 3, 4]
+    for row in (5, 6):
+        resumed.record(row, f"00{row}", "ГУ отменена")
+    resumed.close()
+
+    # The rows journaled after the restart survive the next restart too
+    done = ProgressJournal(path).load()
+    assert sorted(done) == [2, 3, 4, 5, 6]
+    assert done[5] == ('005', "ГУ отменена")
+
+
+def test_intact_journal_gets_no_blank_lines(tmp_path):
+    path = str(tmp_path / 'output.xlsx.journal')
+    for row in (2, 3):
+        journal = ProgressJournal(path)
+        journal.record(row, f"00{row}", "ГУ на исполнении")
+        journal.close()
+    with open(path, encoding='utf-8') as file:
+        assert [json.loads(line)['row'] for line in file] == [2, 3]
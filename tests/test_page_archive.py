@@ -0,0 +1,42 @@
+import multiprocessing
+
+from page_archive import PageArchive
+
+
+def _writer(directory, prefix, count, errors):
+    try:
+        archive = PageArchive(directory)
+        for number in range(count):
+            archive.put(f'{prefix}{number}', f'<html>{prefix}{number}</html>')
+        archive.close()
+    except Exception as e:
+        errors.put(repr(e))
+
+
+def test_put_is_visible_to_another_reader(tmp_path):
+    archive = PageArchive(str(tmp_path))
+    archive.put('1', '<html>one</html>', fetched_at=100.0)
+    archive.put('1', '<html>two</html>', fetched_at=200.0)
+    assert not archive._conn.in_transaction
+
+    other = PageArchive(str(tmp_path))
+    assert other.get_html('1') == '<html>two</html>'
+    assert other.get_html('1', as_of=150.0) == '<html>one</html>'
+    other.close()
+    archive.close()
+
+
+def test_processes_share_the_archive(tmp_path):
+    context = multiprocessing.get_context('spawn')
+    errors = context.Queue()
+    workers = [context.Process(target=_writer, args=(str(tmp_path), f'w{index}-', 200, errors))
+               for index in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert errors.empty()
+    archive = PageArchive(str(tmp_path))
+    assert archive._conn.execute("SELECT COUNT(*) FROM fetches").fetchone()[0] == 600
+    archive.close()
@@ -0,0 +1,120 @@
+import pytest
+from bs4 import BeautifulSoup
+
+import helpers
+from benchmarks.synthetic import make_page
+from page_extractor import ERRORS_TABLE_MARKER, MAIN_TABLE_MARKER, extract_application_record
+
+HISTORY_HEADER = ('<tr><th>#</th><th>appId</th><th>createDate</th><th>user</th><th>code</th>'
+                  '<th>oldStatus</th><th>newStatus</th><th>comment</th></tr>')
+ERRORS = ('<table><tr><th>ID</th><th>QueueType</th><th>LastError</th></tr>'
+          '<tr><td>1</td><td>2</td><td>Сервис ЕСЭДО недоступен</td></tr></table>')
+
+
+def history_row(number, status, date, extra=''):
+    return (f'<tr><td>{number}</td><td>1</td><td>{date}</td><td>u</td><td>1</td><td></td>'
+            f'<td>{status}</td><td>{extra}</td></tr>')
+
+
+def page(errors_header=f'<br><b>{ERRORS_TABLE_MARKER}</b>', history=None):
+    if history is None:
+        history = (history_row(1, 'ACCEPTED', '2025-04-01 10:00:00.100')
+                   + history_row(2, 'FINISHED', '2025-04-02 10:00:00.200'))
+    filler = '<table><tr><td>a</td></tr></table>\n'
+    return ('<html><body>\n' + filler
+            + f'<b>{MAIN_TABLE_MARKER}</b><table><tr><th>appId</th><th>Deadline</th></tr>'
+              '<tr><td>1</td><td>2025-04-05 00:00:00.000</td></tr></table>\n'
+            + filler + filler + '<table>' + HISTORY_HEADER + history + '</table>\n'
+            + errors_header + ERRORS + '\n</body></html>')
+
+
+def old_conclusion(html):
+    return helpers.analyzeFullApplication(BeautifulSoup(html, 'html.parser'))
+
+
+def new_conclusion(html):
+    return helpers.analyzeRecord(extract_application_record(html))
+
+
+NESTED_TABLE = '<table><tr><td>x</td><td>y</td></tr></table>'
+
+SELF_CLOSING_HISTORY = (
+    '<tr><td>1</td><td>1</td><td>2025-04-01 10:00:00.100</td><td/><td>1</td><td></td><td>ACCEPTED</td><td/></tr>'
+    + history_row(2, 'LAUNCHED', '2025-04-02 10:00:00.200'))
+
+PARITY_PAGES = {
+    'br_then_bold_header': page(),
+    # The header <b> is a child of <body>, which has no following table: the old path finds no errors
+    'bare_bold_header': page(errors_header=f'<b>{ERRORS_TABLE_MARKER}</b>'),
+    'whitespace_after_br': page(errors_header=f'<br>\n<b>{ERRORS_TABLE_MARKER}</b>'),
+    'plain_text_after_br': page(errors_header=f'<br>{ERRORS_TABLE_MARKER}'),
+    'header_in_paragraph': page(errors_header=f'<p><b>{ERRORS_TABLE_MARKER}</b></p>'),
+    'strong_header_in_div': page(errors_header=f'<div><strong>{ERRORS_TABLE_MARKER}</strong></div>'),
+    'header_in_span_after_br': page(errors_header=f'<br><span><b>{ERRORS_TABLE_MARKER}</b></span>'),
+    'unclosed_header': page(errors_header=f'<br><b>{ERRORS_TABLE_MARKER}'),
+    # Rows and cells of a nested table count for the history table too, like find_all()
+    'nested_table_in_history_row': page(history=(
+        history_row(1, 'ACCEPTED', '2025-04-01 10:00:00.100', extra=NESTED_TABLE)
+        + history_row(2, 'FINISHED', '2025-04-02 10:00:00.200'))),
+    'nested_table_before_status': page(history=(
+        '<tr><td>1</td><td>1</td><td>2025-04-01 10:00:00.100</td><td>' + NESTED_TABLE + '</td><td>1</td>'
+        '<td></td><td>ACCEPTED</td><td>STARTED</td></tr>'
+        + history_row(2, 'LAUNCHED', '2025-04-06 10:00:00.200'))),
+    'unclosed_cells': page(history=(
+        '<tr><td>1<td>1<td>2025-04-01 10:00:00.100<td>u<td>1<td><td>ACCEPTED<td></tr>'
+        + history_row(2, 'CANCELED', '2025-04-02 10:00:00.200'))),
+    'stray_end_tags': page(errors_header=f'</div></b><br><b>{ERRORS_TABLE_MARKER}</b>'),
+    # html.parser opens an empty element for <x/> unless x is a void tag
+    'self_closing_cell': page(history=SELF_CLOSING_HISTORY),
+    'self_closing_tables': page(history='<tr/>' + history_row(1, 'ACCEPTED', '2025-04-01 10:00:00.100'),
+                                errors_header=f'<table/><br><b>{ERRORS_TABLE_MARKER}</b>'),
+    'self_closing_header_after_br': page(errors_header=f'<br><b/>{ERRORS_TABLE_MARKER}'),
+    # A '>' in a quoted attribute value does not end the tag
+    'quoted_gt_in_attribute': page(history=(
+        '<tr><td>1</td><td>1</td><td>2025-04-01 10:00:00.100</td><td title="a>b">u</td><td>1</td><td></td>'
+        "<td title=\"a>b\" data-x='c>d'>ACCEPTED</td><td></td></tr>"
+        + history_row(2, 'LAUNCHED', '2025-04-02 10:00:00.200')),
+        errors_header=f'<br><b class="x>y">{ERRORS_TABLE_MARKER}</b>'),
+    # CDATA content is text, even when it looks like markup
+    'cdata_in_cell': page(history=(
+        history_row(1, 'ACCEPTED', '2025-04-01 10:00:00.100', extra='<![CDATA[<td>x</td>]]>')
+        + '<tr><td>2</td><td>1</td><td>2025-04-02 10:00:00.200</td><td>u</td><td>1</td><td></td>'
+          '<td><![CDATA[LAUN]]>CHED</td><td></td></tr>')),
+    # Script and style bodies are not markup and not part of the cell text
+    'script_and_style_in_cells': page(history=(
+        '<tr><td>1</td><td>1</td><td>2025-04-01 10:00:00.100</td><td><script>if (a<b) s="</td><td>";</script>u</td>'
+        '<td>1</td><td></td><td><style>td > p { }</style>ACCEPTED</td><td></td></tr>'
+        + history_row(2, 'LAUNCHED', '2025-04-02 10:00:00.200'))),
+}
+
+
+@pytest.mark.parametrize('name', sorted(PARITY_PAGES))
+def test_matches_beautifulsoup(name):
+    html = PARITY_PAGES[name]
+    assert new_conclusion(html) == old_conclusion(html)
+
+
+def test_bare_bold_header_has_no_errors_table():
+    assert extract_application_record(PARITY_PAGES['bare_bold_header']).queue_errors == []
+    assert extract_application_record(PARITY_PAGES['br_then_bold_header']).queue_errors == ["Сервис ЕСЭДО недоступен"]
+
+
+def test_self_closing_cell_keeps_its_column():
+    assert extract_application_record(PARITY_PAGES['self_closing_cell']).statuses == ['ACCEPTED', 'LAUNCHED']
+    assert new_conclusion(PARITY_PAGES['self_closing_cell']).startswith("Рассмотреть на SHEP")
+
+
+def test_quoted_gt_stays_in_the_tag():
+    assert extract_application_record(PARITY_PAGES['quoted_gt_in_attribute']).statuses == ['ACCEPTED', 'LAUNCHED']
+
+
+def test_nested_table_shifts_the_history_cells():
+    # The nested cells come before the status cell, so find_all("td") reads "1" as the status
+    record = extract_application_record(PARITY_PAGES['nested_table_before_status'])
+    assert record.statuses == ['1', 'LAUNCHED']
+
+
+def test_synthetic_pages_match_beautifulsoup():
+    for app_id in range(1, 41):
+        html = make_page(str(app_id))
+        assert new_conclusion(html) == old_conclusion(html), app_id
@@ -0,0 +1,39 @@
+import threading
+
+from profiling import Profiler
+
+
+class _EmptiedStack(list):
+    # Looks non-empty when checked, like a stack the thread pops right after the check
+    def __bool__(self):
+        return True
+
+
+def test_sampler_tolerates_a_stage_ending_mid_sample(tmp_path):
+    profiler = Profiler(str(tmp_path), sample_interval=0.001)
+    release = threading.Event()
+    worker = threading.Thread(target=release.wait)
+    worker.start()
+    try:
+        profiler._stacks[worker.ident] = _EmptiedStack()
+        threading.Timer(0.05, profiler._stop.set).start()
+        profiler._sample()
+    finally:
+        release.set()
+        worker.join()
+    assert profiler._samples == {}
+
+
+def test_sampler_records_the_stage(tmp_path):
+    profiler = Profiler(str(tmp_path), sample_interval=0.001)
+    release = threading.Event()
+    worker = threading.Thread(target=profiler.wrap('fetch', release.wait))
+    worker.start()
+    try:
+        threading.Timer(0.05, profiler._stop.set).start()
+        profiler._sample()
+    finally:
+        release.set()
+        worker.join()
+    assert profiler._samples
+    assert all(key.startswith('fetch;') for key in profiler._samples)
@@ -0,0 +1,38 @@
+import threading
+import time
+
+from page_extractor import ApplicationRecord
+from result_store import ResultStore
+
+
+RECORD = ApplicationRecord(5, ('ACCEPTED', 'LAUNCHED'), ('2025-04-01 10:00:00.000', '2025-04-02 10:00:00.000'),
+                           '2025-04-10 18:00:00.000', ())
+
+
+def test_waits_for_another_writer(tmp_path):
+    path = str(tmp_path / 'results.sqlite3')
+    first = ResultStore(path, source='first')
+    second = ResultStore(path, source='second')
+
+    # Another writer holds the write lock for a moment
+    first._conn.execute("BEGIN IMMEDIATE")
+    first._conn.execute("INSERT INTO runs (started_at, source) VALUES (?, ?)", (time.time(), 'lock'))
+    threading.Timer(0.5, first._conn.commit).start()
+
+    second.add('1', RECORD, "ГУ на исполнении")
+    second.flush()
+
+    assert [row['app_id'] for row in first.history('1')] == ['1']
+    first.close()
+    second.close()
+
+
+def test_latest_conclusions(tmp_path):
+    store = ResultStore(str(tmp_path / 'results.sqlite3'))
+    store.add('1', RECORD, "ГУ принята от заявителя", checked_at=100.0)
+    store.add('1', RECORD, "ГУ на исполнении", checked_at=200.0)
+    store.add('2', RECORD, "ГУ отменена", checked_at=150.0)
+
+    assert store.latest_conclusions(['1', '2', '3']) == {'1': "ГУ на исполнении", '2': "ГУ отменена"}
+    assert store.transitions("ГУ принята от заявителя", "ГУ на исполнении")[0][0] == '1'
+    store.close()
@@ -0,0 +1,80 @@
+import time
+
+import pytest
+import requests
+
+import excel_processor_dynamic
+from benchmarks.synthetic import make_workbook
+from sharding import CoordinatorClient, ShardCoordinator, serve_coordinator
+from workbook_io import CommentWorkbook
+
+
+def test_complete_needs_the_lease():
+    coordinator = ShardCoordinator(['1', '2', '3'], shard_size=2, lease_timeout=60)
+    shard = coordinator.claim('a')['shard']
+
+    assert coordinator.complete(shard, 'b', {'1': 'чужой'}) == {'ok': False}
+    assert coordinator.complete(shard + 1, 'a', {'3': 'не выдан'}) == {'ok': False}
+    assert coordinator.complete(shard, 'a', {'1': 'ГУ отменена', '2': 'ГУ отменена', '9': 'лишний'}) == {'ok': True}
+    assert coordinator.completed.popleft() == (shard, 'a', {'1': 'ГУ отменена', '2': 'ГУ отменена'})
+    assert coordinator.complete(shard, 'a', {'1': 'повтор'}) == {'ok': False}
+
+
+def test_expired_lease_cannot_complete():
+    coordinator = ShardCoordinator(['1'], shard_size=1, lease_timeout=0.1)
+    shard = coordinator.claim('a')['shard']
+    time.sleep(0.2)
+
+    assert coordinator.complete(shard, 'a', {'1': 'поздно'}) == {'ok': False}
+    assert coordinator.claim('b')['shard'] == shard
+    assert coordinator.complete(shard, 'b', {'1': 'ГУ отменена'}) == {'ok': True}
+
+
+def test_requests_need_the_token():
+    coordinator = ShardCoordinator(['1'], shard_size=1)
+    server = serve_coordinator(coordinator, 'secret', port=0)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        assert server.server_address[0] == '127.0.0.1'
+        with pytest.raises(requests.HTTPError):
+            CoordinatorClient(url, 'wrong').claim('intruder')
+        assert requests.get(url + '/status', timeout=5).status_code == 403
+        assert CoordinatorClient(url, 'secret').claim('a')['shard'] == 0
+    finally:
+        server.shutdown()
+
+
+def _engine_options(tmp_path, base_url):
+    return dict(base_url=base_url, max_workers=4, requests_per_second=0, adaptive_rate=False,
+                cache_path=str(tmp_path / 'cache.sqlite3'), archive_path=str(tmp_path / 'archive'),
+                store_path=str(tmp_path / 'results.sqlite3'))
+
+
+def test_local_workers_share_the_stores(tmp_path, stub_server):
+    excel_file = str(tmp_path / 'input.xlsx')
+    output_file = str(tmp_path / 'output.xlsx')
+    make_workbook(excel_file, 266)
+
+    started = time.monotonic()
+    assert excel_processor_dynamic.process_excel_sharded(
+        excel_file, output_file, port=0, shard_size=20, local_workers=3, resume=False,
+        **_engine_options(tmp_path, stub_server.base_url))
+    assert time.monotonic() - started < 60
+
+    workbook = CommentWorkbook(output_file)
+    comments = [workbook.get_comment(row_number) for row_number, app_id in workbook.iter_identifiers() if app_id]
+    assert comments and all(comments)
+    assert not [comment for comment in comments if comment.startswith("Ошибка")]
+
+
+def test_gives_up_when_local_workers_die(tmp_path, stub_server):
+    excel_file = str(tmp_path / 'input.xlsx')
+    make_workbook(excel_file, 20)
+    # Replay without an archive makes FetchEngine fail, so both workers exit at once
+    options = dict(_engine_options(tmp_path, stub_server.base_url), replay=True, archive_path=None)
+
+    started = time.monotonic()
+    assert not excel_processor_dynamic.process_excel_sharded(
+        excel_file, str(tmp_path / 'output.xlsx'), port=0, shard_size=5, lease_timeout=1, local_workers=2,
+        resume=False, **options)
+    assert time.monotonic() - started < 30
@@ -0,0 +1,187 @@
+import itertools
+from datetime import datetime
+
+import pytest
+
+import helpers
+import status_rules
+from status_rules import StatusRules, parse_timestamp, status_before_deadline
+
+
+def baseline_before_deadline(status_create_date, deadline):
+    # checkStatusDeadline of the baseline helpers.py
+    try:
+        if not status_create_date or not deadline:
+            return False
+        if not status_create_date.replace('-', '').replace(':', '').replace('.', '').replace(' ', '').isdigit():
+            return False
+        status_date = datetime.strptime(status_create_date, "%Y-%m-%d %H:%M:%S.%f")
+        deadline_date = datetime.strptime(deadline, "%Y-%m-%d %H:%M:%S.%f")
+        return status_date <= deadline_date
+    except Exception:
+        return False
+
+
+def baseline_conclusion(statuses, status_dates, deadline):
+    # The decisions of the baseline analyzeStatusSequence, after the statuses were read from the page
+    if not statuses:
+        return "Нет данных о статусах"
+
+    accepted_count = statuses.count('ACCEPTED')
+    launched_count = statuses.count('LAUNCHED')
+
+    for status in reversed(statuses):
+        if status in ['STARTED', 'FINISHED', 'READY', 'HANDED', 'CANCELED']:
+            if status == 'STARTED':
+                return "ГУ на исполнении"
+            elif status in ['FINISHED', 'READY', 'HANDED']:
+                first_final_index = -1
+                for i, s in enumerate(statuses):
+                    if s in ['FINISHED', 'READY', 'HANDED']:
+                        first_final_index = i
+                        break
+                if first_final_index != -1:
+                    status_create_date = status_dates[first_final_index] if first_final_index < len(
+                        status_dates) else ""
+                    if deadline and status_create_date:
+                        if baseline_before_deadline(status_create_date, deadline):
+                            return "ГУ оказана своевременно"
+                        else:
+                            return "ГУ оказана несвоевременно"
+                    else:
+                        return "ГУ завершена (не удалось проверить сроки)"
+                else:
+                    return "ГУ завершена"
+            elif status == 'CANCELED':
+                return "ГУ отменена"
+            break
+
+    if len(statuses) >= 3 and statuses[-3:] == ['ACCEPTED', 'LAUNCHED', 'ACCEPTED']:
+        return "ГУ не доставлена до исполнителя"
+
+    if accepted_count == 1 and launched_count == 0:
+        return "ГУ принята от заявителя"
+    elif accepted_count == 2 and launched_count == 0:
+        return "Оператор цон не провел через накопитель Б"
+    elif accepted_count == 2 and launched_count == 1:
+        return "ГУ на исполнении"
+    elif accepted_count == 1 and launched_count == 1:
+        return "Рассмотреть на SHEP"
+    else:
+        return f"Неопределенная последовательность статусов: {' -> '.join(statuses)}"
+
+
+BEFORE = '2025-04-01 10:00:00.100'
+DEADLINE = '2025-04-05 00:00:00.000'
+AFTER = '2025-04-06 10:00:00.200'
+
+# (statuses, their create dates, deadline) -> conclusion of the baseline
+CONCLUSIONS = [
+    ([], [], DEADLINE, "Нет данных о статусах"),
+    (['ACCEPTED'], [BEFORE], DEADLINE, "ГУ принята от заявителя"),
+    (['ACCEPTED', 'ACCEPTED'], [BEFORE, BEFORE], DEADLINE, "Оператор цон не провел через накопитель Б"),
+    (['ACCEPTED', 'ACCEPTED', 'LAUNCHED'], [BEFORE] * 3, DEADLINE, "ГУ на исполнении"),
+    (['ACCEPTED', 'LAUNCHED'], [BEFORE] * 2, DEADLINE, "Рассмотреть на SHEP"),
+    (['LAUNCHED', 'ACCEPTED'], [BEFORE] * 2, DEADLINE, "Рассмотреть на SHEP"),
+    (['ACCEPTED', 'LAUNCHED', 'ACCEPTED'], [BEFORE] * 3, DEADLINE, "ГУ не доставлена до исполнителя"),
+    (['ACCEPTED', 'ACCEPTED', 'LAUNCHED', 'ACCEPTED'], [BEFORE] * 4, DEADLINE, "ГУ не доставлена до исполнителя"),
+    (['LAUNCHED'], [BEFORE], DEADLINE, "Неопределенная последовательность статусов: LAUNCHED"),
+    (['ACCEPTED', 'REJECTED'], [BEFORE] * 2, DEADLINE, "ГУ принята от заявителя"),
+    (['REJECTED'], [BEFORE], DEADLINE, "Неопределенная последовательность статусов: REJECTED"),
+    (['ACCEPTED', 'STARTED'], [BEFORE] * 2, DEADLINE, "ГУ на исполнении"),
+    (['ACCEPTED', 'CANCELED'], [BEFORE] * 2, DEADLINE, "ГУ отменена"),
+    (['CANCELED', 'STARTED'], [BEFORE] * 2, DEADLINE, "ГУ на исполнении"),
+    (['STARTED', 'CANCELED', 'ACCEPTED'], [BEFORE] * 3, DEADLINE, "ГУ отменена"),
+    (['ACCEPTED', 'FINISHED'], [BEFORE, BEFORE], DEADLINE, "ГУ оказана своевременно"),
+    (['ACCEPTED', 'FINISHED'], [BEFORE, AFTER], DEADLINE, "ГУ оказана несвоевременно"),
+    (['ACCEPTED', 'FINISHED'], [BEFORE, DEADLINE], DEADLINE, "ГУ оказана своевременно"),
+    (['ACCEPTED', 'READY', 'HANDED'], [BEFORE, BEFORE, AFTER], DEADLINE, "ГУ оказана своевременно"),
+    (['ACCEPTED', 'READY', 'HANDED'], [BEFORE, AFTER, BEFORE], DEADLINE, "ГУ оказана несвоевременно"),
+    (['HANDED', 'STARTED'], [AFTER, BEFORE], DEADLINE, "ГУ на исполнении"),
+    (['FINISHED', 'CANCELED', 'READY'], [AFTER, BEFORE, BEFORE], DEADLINE, "ГУ оказана несвоевременно"),
+    (['ACCEPTED', 'FINISHED'], [BEFORE, BEFORE], None, "ГУ завершена (не удалось проверить сроки)"),
+    (['ACCEPTED', 'FINISHED'], [BEFORE, ''], DEADLINE, "ГУ завершена (не удалось проверить сроки)"),
+    (['ACCEPTED', 'FINISHED'], [BEFORE], DEADLINE, "ГУ завершена (не удалось проверить сроки)"),
+    (['ACCEPTED', 'FINISHED'], [BEFORE, 'currentState'], DEADLINE, "ГУ оказана несвоевременно"),
+    (['ACCEPTED', 'FINISHED'], [BEFORE, '2025-04-01 10:00:00'], DEADLINE, "ГУ оказана несвоевременно"),
+    (['ACCEPTED', 'FINISHED'], [BEFORE, BEFORE], 'завтра', "ГУ оказана несвоевременно"),
+]
+
+
+@pytest.mark.parametrize('statuses, status_dates, deadline, expected', CONCLUSIONS)
+def test_conclusion_matches_baseline(statuses, status_dates, deadline, expected):
+    assert baseline_conclusion(statuses, status_dates, deadline) == expected
+    assert helpers.conclusionFromStatuses(statuses, status_dates, deadline) == expected
+
+
+def test_every_short_history_matches_baseline():
+    # Every history of up to four statuses, with the final ones made on time, late or on an unusable date
+    alphabet = ['ACCEPTED', 'LAUNCHED', 'STARTED', 'FINISHED', 'READY', 'HANDED', 'CANCELED', 'REJECTED']
+    date_cycles = [[BEFORE], [AFTER], [BEFORE, AFTER], [AFTER, ''], ['currentState']]
+    rules = StatusRules()
+    checked = 0
+    for length in range(5):
+        for statuses in itertools.product(alphabet, repeat=length):
+            statuses = list(statuses)
+            for cycle, deadline in itertools.product(date_cycles, (DEADLINE, None)):
+                status_dates = list(itertools.islice(itertools.cycle(cycle), length))
+                assert rules.evaluate(statuses, status_dates, deadline) == \
+                    baseline_conclusion(statuses, status_dates, deadline), (statuses, status_dates, deadline)
+                checked += 1
+    assert checked == 10 * sum(len(alphabet) ** length for length in range(5))
+
+
+def test_copied_tables_keep_the_default_decisions():
+    rules = StatusRules(priority_rules=dict(status_rules.PRIORITY_RULES), count_rules=dict(status_rules.COUNT_RULES))
+    assert rules.version == status_rules.DEFAULT_RULES.version
+    for statuses, status_dates, deadline, expected in CONCLUSIONS:
+        assert rules.evaluate(statuses, status_dates, deadline) == expected
+
+
+# Timestamps from the history and main tables, valid or not; parse_timestamp must agree with strptime on all
+TIMESTAMPS = [
+    '2025-04-01 10:00:00.100',
+    '2025-04-01 10:00:00.1',
+    '2025-04-01 10:00:00.123456',
+    '2025-04-01 10:00:00.000001',
+    '2024-02-29 23:59:59.999999',
+    '2025-12-31 00:00:00.0',
+    '2025-4-1 10:00:00.100',
+    '2025-04-01 7:05:09.5',
+    '2025-04-01 10:00:00.1234567',
+    '2025-04-01 10:00:00',
+    '2025-04-01T10:00:00.100',
+    '2025-02-29 10:00:00.100',
+    '2025-13-01 10:00:00.100',
+    '2025-04-01 24:00:00.100',
+    '2025-04-01 10:60:00.100',
+    '2025-04-01 10:00:61.100',
+    ' 2025-04-01 10:00:00.100',
+    '2025-04-01 10:00:00.100 ',
+    '2025-04-01 10:00:00.100\n',
+    '２０２５-04-01 10:00:00.100',
+    'currentState',
+    '',
+]
+
+
+def strptime_or_error(text):
+    try:
+        return datetime.strptime(text, status_rules.TIMESTAMP_FORMAT)
+    except ValueError:
+        return ValueError
+
+
+@pytest.mark.parametrize('text', TIMESTAMPS)
+def test_parse_timestamp_matches_strptime(text):
+    try:
+        parsed = parse_timestamp(text)
+    except ValueError:
+        parsed = ValueError
+    assert parsed == strptime_or_error(text)
+
+
+@pytest.mark.parametrize('text', TIMESTAMPS)
+def test_deadline_check_matches_baseline(text):
+    for status_date, deadline in ((text, DEADLINE), (BEFORE, text), (text, text)):
+        assert status_before_deadline(status_date, deadline) == baseline_before_deadline(status_date, deadline)
@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+import excel_processor_dynamic
+from benchmarks.stub_server import StubServer
+from benchmarks.synthetic import make_workbook
+from fetcher import BudgetExpired, CircuitBreaker, Fetcher, RateLimiter, RetryPolicy
+from workbook_io import CommentWorkbook
+
+REQUEST_TIMEOUT = 5
+
+
+@pytest.fixture
+def silent_server():
+    # Answers long after any request has timed out
+    with StubServer(latency=120) as server:
+        yield server
+
+
+def test_fetch_gives_up_at_the_deadline(silent_server):
+    fetcher = Fetcher(retry_policy=RetryPolicy(max_retries=5), breaker=CircuitBreaker(failure_threshold=1),
+                      limiter=RateLimiter(1), timeout=0.5)
+    started = time.monotonic()
+    with pytest.raises(BudgetExpired):
+        fetcher.fetch(silent_server.base_url + '1', deadline=started + 1.0)
+    # Without the deadline: 0.5 s, then retries with growing timeouts and a 30 s breaker pause
+    assert time.monotonic() - started < 1.0 + 0.5 + 0.5
+
+
+def test_breaker_wait_stops_at_the_deadline():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    started = time.monotonic()
+    assert not breaker.wait(deadline=started + 0.2)
+    assert time.monotonic() - started < 1
+
+
+def test_budget_caps_the_whole_run(tmp_path, silent_server):
+    excel_file = str(tmp_path / 'input.xlsx')
+    output_file = str(tmp_path / 'output.xlsx')
+    make_workbook(excel_file, 30)
+    budget = 2
+
+    started = time.monotonic()
+    excel_processor_dynamic.process_excel_with_dynamic_fetch(
+        excel_file, output_file, base_url=silent_server.base_url, max_workers=4, requests_per_second=0,
+        adaptive_rate=False, cache_path=None, archive_path=None, store_path=None, resume=False,
+        time_budget=budget)
+    elapsed = time.monotonic() - started
+    assert elapsed <= budget + REQUEST_TIMEOUT + 1
+
+    workbook = CommentWorkbook(output_file)
+    comments = [workbook.get_comment(row_number) for row_number, app_id in workbook.iter_identifiers() if app_id]
+    assert comments
+    assert all(comment == excel_processor_dynamic.UNPROCESSED_COMMENT for comment in comments)
+
+
+def test_requests_refused_for_the_budget_are_left_unprocessed(tmp_path, stub_server, capsys):
+    # A fast server, but the rate limit leaves room for only a few requests within the budget
+    excel_file = str(tmp_path / 'input.xlsx')
+    output_file = str(tmp_path / 'output.xlsx')
+    make_workbook(excel_file, 40)
+    workbook = CommentWorkbook(excel_file)
+    if workbook.comment_col is None:
+        workbook.add_comment_column()
+    prior = {row_number: f"ГУ на исполнении ({row_number})"
+             for row_number, app_id in workbook.iter_identifiers() if app_id}
+    workbook.set_comments(prior)
+    workbook.save(excel_file)
+
+    excel_processor_dynamic.process_excel_with_dynamic_fetch(
+        excel_file, output_file, base_url=stub_server.base_url, max_workers=4, requests_per_second=10,
+        adaptive_rate=False, cache_path=None, archive_path=None, store_path=None, resume=False,
+        time_budget=0.3)
+    assert "Время запуска истекло: готово" in capsys.readouterr().out
+
+    workbook = CommentWorkbook(output_file)
+    comments = {row_number: workbook.get_comment(row_number) for row_number in prior}
+    assert excel_processor_dynamic.FETCH_FAILED_COMMENT not in comments.values()
+    # Each row has a new conclusion or keeps its earlier one behind the unprocessed mark
+    stale = [row_number for row_number, comment in comments.items()
+             if comment == excel_processor_dynamic.STALE_PREFIX + prior[row_number]]
+    fresh = [row_number for row_number, comment in comments.items()
+             if row_number not in stale and comment != prior[row_number]]
+    assert stale and fresh
+    assert len(stale) + len(fresh) == len(prior)
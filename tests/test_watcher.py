@@ -0,0 +1,22 @@
+import threading
+
+from excel_processor_dynamic import FetchEngine
+from watcher import RepollPolicy, WatchSchedule, poll
+
+
+def test_deadlines_do_not_need_the_store(tmp_path, stub_server):
+    engine = FetchEngine(base_url=stub_server.base_url, max_workers=4, requests_per_second=0, adaptive_rate=False,
+                         cache_path=None, archive_path=None, store_path=None)
+    schedule = WatchSchedule(str(tmp_path / 'watch.sqlite3'))
+    app_ids = [str(number) for number in range(1, 11)]
+    try:
+        schedule.track(app_ids)
+        poll(engine, schedule, RepollPolicy(), app_ids, threading.Event())
+        deadlines = [schedule.get(app_id)[1] for app_id in app_ids]
+    finally:
+        schedule.close()
+        engine.close()
+
+    # Every synthetic page has a deadline in its main properties table
+    assert all(deadlines)
+    assert engine.deadlines == {}
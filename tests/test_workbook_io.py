@@ -0,0 +1,34 @@
+import os
+import stat
+
+import pytest
+from openpyxl import Workbook
+
+from workbook_io import save_workbook_atomic
+
+
+def mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+@pytest.fixture
+def umask_022():
+    previous = os.umask(0o022)
+    yield
+    os.umask(previous)
+
+
+def test_new_workbook_gets_the_umask_mode(tmp_path, umask_022):
+    output_file = str(tmp_path / 'output.xlsx')
+    save_workbook_atomic(Workbook(), output_file)
+    assert mode(output_file) == 0o644
+
+
+def test_replaced_workbook_keeps_its_mode(tmp_path, umask_022):
+    output_file = str(tmp_path / 'output.xlsx')
+    save_workbook_atomic(Workbook(), output_file)
+    os.chmod(output_file, 0o664)
+    save_workbook_atomic(Workbook(), output_file)
+    assert mode(output_file) == 0o664
+    # No temp file is left next to it
+    assert os.listdir(tmp_path) == ['output.xlsx']
@@ -0,0 +1,351 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import helpers
+from excel_processor_dynamic import (FetchEngine, collect_tasks, find_workbooks, output_path_for, region_from_path,
+                                     DEFAULT_STORE_PATH)
+from metrics import conclusion_category
+from status_rules import parse_timestamp
+from workbook_io import CommentWorkbook
+
+
+DEFAULT_WATCH_PATH = os.path.join(os.path.expanduser('~'), '.nitec_monitoring', 'watch.sqlite3')
+# At most this many applications are polled per cycle, so workbooks are updated regularly
+DEFAULT_BATCH_SIZE = 1000
+# Workbooks are checked for new rows at least this often, in seconds
+DEFAULT_RESCAN_INTERVAL = 60
+
+STUCK_CONCLUSION = "ГУ не доставлена до исполнителя"
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS watch ("
+    " app_id TEXT PRIMARY KEY,"
+    " next_poll REAL,"            # NULL once the application reached a final status
+    " conclusion TEXT,"
+    " deadline TEXT,"
+    " unchanged INTEGER NOT NULL DEFAULT 0,"  # polls in a row with the same conclusion
+    " failures INTEGER NOT NULL DEFAULT 0,"   # failed fetches in a row
+    " checked_at REAL)",
+    "CREATE INDEX IF NOT EXISTS watch_next_poll ON watch (next_poll)",
+)
+
+
+class RepollPolicy:
+    """
+    When to poll an application again, from its latest conclusion and deadline.
+
+    Final conclusions (helpers.isTerminalConclusion) are not polled again. Open
+    applications are polled every open_interval seconds, growing by growth_factor
+    for every poll that changed nothing, up to max_interval, but never past the
+    start of the near_deadline window; inside it they are polled every
+    near_deadline_interval, after the deadline every overdue_interval. Stuck
+    applications (STUCK_CONCLUSION) back off from stuck_interval, doubling up to
+    stuck_max_interval. Failed fetches are retried after failure_interval, doubling.
+    """
+
+    def __init__(self, open_interval=2 * 3600, max_interval=8 * 3600, growth_factor=1.5,
+                 near_deadline_window=24 * 3600, near_deadline_interval=15 * 60, overdue_interval=3600,
+                 stuck_interval=3600, stuck_max_interval=24 * 3600, failure_interval=5 * 60):
+        self.open_interval = open_interval
+        self.max_interval = max_interval
+        self.growth_factor = growth_factor
+        self.near_deadline_window = near_deadline_window
+        self.near_deadline_interval = near_deadline_interval
+        self.overdue_interval = overdue_interval
+        self.stuck_interval = stuck_interval
+        self.stuck_max_interval = stuck_max_interval
+        self.failure_interval = failure_interval
+
+    def next_interval(self, conclusion, deadline=None, unchanged=0, failures=0, now=None):
+        """
+        Seconds until the next poll, or None when the application needs no more polls.
+        conclusion is None after a failed fetch; deadline is a datetime or None.
+        """
+        if conclusion is None:
+            return min(self.failure_interval * 2 ** max(failures - 1, 0), self.open_interval)
+        if helpers.isTerminalConclusion(conclusion):
+            return None
+        if conclusion_category(conclusion) == STUCK_CONCLUSION:
+            return min(self.stuck_interval * 2 ** unchanged, self.stuck_max_interval)
+
+        interval = min(self.open_interval * self.growth_factor ** unchanged, self.max_interval)
+        if deadline is not None:
+            remaining = deadline.timestamp() - (now if now is not None else time.time())
+            if remaining <= 0:
+                return self.overdue_interval
+            if remaining <= self.near_deadline_window:
+                return self.near_deadline_interval
+            interval = min(interval, max(remaining - self.near_deadline_window, self.near_deadline_interval))
+        return interval
+
+
+def parse_deadline(text):
+    if not text:
+        return None
+    try:
+        return parse_timestamp(text.strip())
+    except ValueError:
+        return None
+
+
+class WatchSchedule:
+    """
+    Persistent re-poll schedule: for every tracked application its next poll time,
+    latest conclusion and deadline, so a restarted watcher continues where it stopped.
+    """
+
+    def __init__(self, path=DEFAULT_WATCH_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        for statement in SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+
+    def track(self, app_ids):
+        """
+        Add applications not seen before, due at once. Returns how many were added.
+        """
+        before = self._conn.total_changes
+        self._conn.executemany("INSERT OR IGNORE INTO watch (app_id, next_poll) VALUES (?, 0)",
+                               [(app_id,) for app_id in app_ids])
+        self._conn.commit()
+        return self._conn.total_changes - before
+
+    def due(self, app_ids, now, limit):
+        """
+        Up to limit of the given applications whose poll time has come, most overdue first.
+        """
+        rows = self._conn.execute(
+            "SELECT app_id FROM watch WHERE next_poll <= ? AND app_id IN (SELECT value FROM json_each(?))"
+            " ORDER BY next_poll LIMIT ?", (now, json.dumps(list(app_ids)), limit)).fetchall()
+        return [app_id for app_id, in rows]
+
+    def next_due(self, app_ids):
+        """
+        The earliest next poll time of the given applications, None when all are final.
+        """
+        return self._conn.execute(
+            "SELECT MIN(next_poll) FROM watch WHERE app_id IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(app_ids)),)).fetchone()[0]
+
+    def get(self, app_id):
+        row = self._conn.execute("SELECT conclusion, deadline, unchanged, failures FROM watch WHERE app_id = ?",
+                                 (app_id,)).fetchone()
+        return row if row is not None else (None, None, 0, 0)
+
+    def update(self, app_id, conclusion, deadline, next_poll, unchanged, failures, checked_at):
+        self._conn.execute(
+            "UPDATE watch SET conclusion = ?, deadline = ?, next_poll = ?, unchanged = ?, failures = ?,"
+            " checked_at = ? WHERE app_id = ?",
+            (conclusion, deadline, next_poll, unchanged, failures, checked_at, app_id))
+
+    def commit(self):
+        self._conn.commit()
+
+    def conclusions(self, app_ids):
+        """
+        {app_id: latest conclusion} for the given applications polled at least once.
+        """
+        rows = self._conn.execute(
+            "SELECT app_id, conclusion FROM watch WHERE conclusion IS NOT NULL"
+            " AND app_id IN (SELECT value FROM json_each(?))", (json.dumps(list(app_ids)),)).fetchall()
+        return dict(rows)
+
+    def counts(self, app_ids):
+        """
+        (open, final) numbers of the given applications.
+        """
+        return self._conn.execute(
+            "SELECT SUM(next_poll IS NOT NULL), SUM(next_poll IS NULL) FROM watch"
+            " WHERE app_id IN (SELECT value FROM json_each(?))", (json.dumps(list(app_ids)),)).fetchone()
+
+    def close(self):
+        self._conn.close()
+
+
+class _WatchedWorkbook:
+    """
+    One watched workbook: its (row_numbers, app_id) tasks, read again whenever the file changes.
+    """
+
+    def __init__(self, path, output_file_path):
+        self.path = path
+        self.output_file_path = output_file_path
+        self.mtime = None
+        self.tasks = []
+
+    def reload(self):
+        """
+        Re-read the identifiers if the file changed; returns True when it did.
+        """
+        mtime = os.path.getmtime(self.path)
+        if mtime == self.mtime:
+            return False
+        workbook = CommentWorkbook(self.path)
+        if workbook.identifier_col is None:
+            raise ValueError("не найден столбец с идентификатором заявки")
+        self.tasks, _ = collect_tasks(workbook.iter_identifiers())
+        self.mtime = mtime
+        return True
+
+    def write(self, conclusions):
+        """
+        Save a copy of the workbook with the latest conclusions to the output file.
+        """
+        workbook = CommentWorkbook(self.path)
+        if workbook.comment_col is None:
+            workbook.add_comment_column()
+        comments = {}
+        for row_numbers, app_id in self.tasks:
+            conclusion = conclusions.get(app_id)
+            if conclusion is not None:
+                for row_number in row_numbers:
+                    comments[row_number] = conclusion
+        workbook.set_comments(comments)
+        workbook.save(self.output_file_path)
+
+
+def format_interval(seconds):
+    if seconds < 60:
+        return f"{seconds:.0f} с"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f} мин"
+    return f"{seconds / 3600:.1f} ч"
+
+
+def watch_workbooks(inputs, output_dir=None, policy=None, schedule_path=DEFAULT_WATCH_PATH,
+                    batch_size=DEFAULT_BATCH_SIZE, rescan_interval=DEFAULT_RESCAN_INTERVAL, stop_event=None,
+                    max_cycles=None, **engine_options):
+    """
+    Keep the conclusions of the given workbooks (files, directories or patterns, see
+    find_workbooks) fresh until stop_event is set or max_cycles polling cycles ran.
+
+    Instead of refreshing every row, each application is polled on its own schedule
+    (see RepollPolicy): final applications are not fetched again, those near their
+    deadline often, stuck ones with a growing backoff. The schedule is kept in
+    schedule_path, so a restart continues it. Whenever conclusions change, the
+    workbooks that reference them are saved to output_dir (default: next to them,
+    as *_processed.xlsx). New rows are picked up when a workbook file changes.
+
+    engine_options go to FetchEngine; the response cache is always off, since a
+    cached page would hide the change the poll is looking for. Deadlines come from
+    the analyzed pages, so scheduling does not depend on the result store.
+    """
+    policy = policy or RepollPolicy()
+    stop_event = stop_event or threading.Event()
+    engine_options['cache_path'] = None
+    engine_options.setdefault('store_path', DEFAULT_STORE_PATH)
+    if engine_options.get('replay'):
+        raise ValueError("Режим наблюдения не работает с повторным анализом из архива")
+
+    watched = {}
+    for path in find_workbooks(inputs):
+        watched[path] = _WatchedWorkbook(path, output_path_for(path, output_dir))
+    if not watched:
+        print("Не найдено ни одной книги Excel для наблюдения")
+        return
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    engine = FetchEngine(**engine_options)
+    engine.deadlines = {}
+    schedule = WatchSchedule(schedule_path)
+    print(f"Наблюдение за книгами: {len(watched)}, расписание: {schedule_path}")
+
+    tracked = set()
+    last_scan = None
+    cycle = 0
+    try:
+        while not stop_event.is_set() and (max_cycles is None or cycle < max_cycles):
+            if last_scan is None or time.monotonic() - last_scan >= rescan_interval:
+                tracked = set()
+                for item in watched.values():
+                    try:
+                        if item.reload():
+                            region = region_from_path(item.path)
+                            engine.regions.update((app_id, region) for _, app_id in item.tasks)
+                            added = schedule.track(app_id for _, app_id in item.tasks)
+                            print(f"{os.path.basename(item.path)}: заявок {len(item.tasks)}, новых {added}")
+                    except Exception as e:
+                        print(f"Ошибка чтения {item.path}: {e}")
+                    tracked.update(app_id for _, app_id in item.tasks)
+                last_scan = time.monotonic()
+
+            due = schedule.due(tracked, time.time(), batch_size)
+            if not due:
+                next_poll = schedule.next_due(tracked)
+                if next_poll is None:
+                    print("Все заявки завершены, проверять больше нечего")
+                    break
+                wait = min(max(next_poll - time.time(), 1), rescan_interval)
+                stop_event.wait(wait)
+                continue
+
+            cycle += 1
+            changed = poll(engine, schedule, policy, due, stop_event)
+
+            if changed:
+                conclusions = schedule.conclusions(tracked)
+                for item in watched.values():
+                    if any(app_id in changed for _, app_id in item.tasks):
+                        try:
+                            with engine.metrics.timer('save_seconds'):
+                                item.write(conclusions)
+                            print(f"Обновлено: {item.output_file_path}")
+                        except Exception as e:
+                            print(f"Ошибка сохранения файла {item.output_file_path}: {e}")
+
+            open_count, final_count = schedule.counts(tracked)
+            next_poll = schedule.next_due(tracked)
+            wait = f", следующая проверка через {format_interval(max(next_poll - time.time(), 0))}" \
+                if next_poll is not None else ""
+            print(f"Цикл {cycle}: проверено {len(due)}, изменилось {len(changed)}; "
+                  f"отслеживается {open_count or 0}, завершено {final_count or 0}{wait}")
+    finally:
+        schedule.close()
+        engine.close()
+
+
+def poll(engine, schedule, policy, app_ids, stop_event):
+    """
+    Fetch the given applications once and reschedule them.
+    Returns the app_ids whose conclusion changed.
+    """
+    results = {}
+    if engine.deadlines is None:
+        engine.deadlines = {}
+    for (_, app_id), conclusion in engine.run([(None, app_id) for app_id in app_ids], requeue_failed=False,
+                                              stop_event=stop_event):
+        results[app_id] = conclusion
+
+    # Deadlines of the pages analyzed in this poll, taken so the dict does not grow
+    deadlines = {app_id: engine.deadlines.pop(app_id) for app_id in results if app_id in engine.deadlines}
+
+    changed = set()
+    now = time.time()
+    for app_id, conclusion in results.items():
+        previous, deadline, unchanged, failures = schedule.get(app_id)
+        if conclusion is None:
+            failures += 1
+            conclusion = previous
+            interval = policy.next_interval(None, failures=failures)
+        else:
+            failures = 0
+            deadline = deadlines.get(app_id) or deadline
+            if conclusion == previous:
+                unchanged += 1
+            else:
+                unchanged = 0
+                changed.add(app_id)
+            interval = policy.next_interval(conclusion, parse_deadline(deadline), unchanged, now=now)
+        schedule.update(app_id, conclusion, deadline, None if interval is None else now + interval, unchanged,
+                        failures, now)
+    schedule.commit()
+    return changed
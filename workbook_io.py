@@ -0,0 +1,118 @@
+import copy
+import os
+import stat
+import tempfile
+
+from openpyxl import load_workbook
+
+
+COMMENT_HEADER = 'Комментарий АО НИТ'
+
+
+def find_columns(headers):
+    """
+    Find the identifier and comment columns among the header values.
+    Returns 1-based column numbers (identifier_col, comment_col), None when not found.
+    """
+    identifier_col = None
+    comment_col = None
+
+    for col_idx, header in enumerate(headers, 1):
+        if header is None:
+            continue
+        if 'Идентификатор заявки' in str(header) or 'Идентификатор' in str(header):
+            identifier_col = col_idx
+        elif COMMENT_HEADER in str(header):
+            comment_col = col_idx
+
+    return identifier_col, comment_col
+
+
+def file_mode(path):
+    """
+    Permission bits the file at path should have: its own if it exists,
+    otherwise what a plain open() would give a new file under the current umask.
+    """
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+def save_workbook_atomic(wb, output_file):
+    """
+    Save the workbook to a temp file next to output_file and rename it into place,
+    so an interrupted save never leaves a half-written workbook behind.
+    The temp file (created 0600) gets the mode of the file it replaces.
+    """
+    directory = os.path.dirname(os.path.abspath(output_file))
+    fd, temp_path = tempfile.mkstemp(suffix='.xlsx', prefix='.~', dir=directory)
+    os.close(fd)
+    try:
+        wb.save(temp_path)
+        os.chmod(temp_path, file_mode(output_file))
+        os.replace(temp_path, output_file)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class CommentWorkbook:
+    """
+    The input workbook, loaded once with openpyxl and kept in memory for the whole run.
+    Identifiers are read straight from the first sheet and conclusions are written into
+    its comment column, so all original formatting is kept when it is saved.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.wb = load_workbook(path)
+        # Always work with the first sheet (index 0)
+        self.ws = self.wb.worksheets[0]
+        self.headers = [cell.value for cell in self.ws[1]]
+        self.identifier_col, self.comment_col = find_columns(self.headers)
+
+    @property
+    def row_count(self):
+        return max(0, self.ws.max_row - 1)
+
+    def add_comment_column(self):
+        """
+        Append a comment column after the last header, styled like the header next to it.
+        """
+        self.comment_col = len(self.headers) + 1
+        header_cell = self.ws.cell(row=1, column=self.comment_col)
+        header_cell.value = COMMENT_HEADER
+        if self.headers:
+            header_cell._style = copy.copy(self.ws.cell(row=1, column=self.comment_col - 1)._style)
+        self.headers.append(COMMENT_HEADER)
+
+    def iter_identifiers(self):
+        """
+        Yield (row_number, raw identifier value) for every data row.
+        """
+        rows = self.ws.iter_rows(min_row=2, min_col=self.identifier_col, max_col=self.identifier_col,
+                                 values_only=True)
+        for row_number, (value,) in enumerate(rows, 2):
+            yield row_number, value
+
+    def get_comment(self, row_number):
+        return self.ws.cell(row=row_number, column=self.comment_col).value
+
+    def set_comment(self, row_number, value):
+        self.ws.cell(row=row_number, column=self.comment_col).value = value
+
+    def set_comments(self, comments):
+        """
+        Write many {row_number: value} comments at once.
+        """
+        column = self.comment_col
+        for row_number, value in comments.items():
+            if value:
+                self.ws.cell(row=row_number, column=column).value = value
+
+    def save(self, output_file):
+        save_workbook_atomic(self.wb, output_file)